@@ -1,61 +1,259 @@
 import pygame
+import os
 import sys
 import random
 import math
+import json
+import csv
+import hashlib
+import struct
+import time
+import threading
+import argparse
+import heapq
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import numpy as np
 
-pygame.init()
 WIDTH, HEIGHT = 1200, 750
-SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("🌳 NeoTerra: A Sustainable Future City Simulation")
-FONT = pygame.font.SysFont("Segoe UI Emoji", 15)
-FONT_BOLD = pygame.font.SysFont("Segoe UI Emoji", 15, bold=True)
-BIGFONT = pygame.font.SysFont("Segoe UI Emoji", 32, bold=True)
-MEDFONT = pygame.font.SysFont("Segoe UI Emoji", 20)
-CLOCK = pygame.time.Clock()
 FPS = 60
 
-class Particle:
-    def __init__(self, x, y, color, vx=0, vy=0):
-        self.x = x
-        self.y = y
-        self.color = color
-        self.vx = vx + random.uniform(-0.5, 0.5)
-        self.vy = vy + random.uniform(-2, -0.5)
-        self.life = 30
-        self.size = random.randint(2, 5)
-    
+# Simulasi berjalan dengan langkah tetap SIM_HZ tick per detik, terlepas dari FPS render.
+# Semua gerak (px/tick) dan timer (tick) mengacu ke langkah ini.
+SIM_HZ = 60
+SIM_STEP = 1.0 / SIM_HZ
+MAX_FRAME_DT = 0.25      # jeda frame lebih lama (mis. window diseret) dipotong
+MAX_FRAME_TICKS = 1000   # batas tick per frame; sisa waktu dibuang agar tidak menumpuk
+TIME_SCALES = (1, 10, 100)
+
+# Window, font dan clock baru dibuat lewat init_display(); mode headless tidak menyentuhnya
+SCREEN = None
+FONT = FONT_BOLD = BIGFONT = MEDFONT = None
+CLOCK = None
+
+FONT_NAME = "Segoe UI Emoji"
+# Hasil pencarian file font disimpan di sini agar start berikutnya tidak memindai
+# seluruh direktori font sistem lagi
+FONT_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "neoterra", "fonts.json")
+# Direktori font umum (Windows, macOS, Linux); font yang baru dipasang mengubah mtime-nya
+FONT_DIRS = [path for path in (
+    os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts"),
+    os.path.join(os.environ["LOCALAPPDATA"], "Microsoft", "Windows", "Fonts") if "LOCALAPPDATA" in os.environ else None,
+    "/Library/Fonts", "/System/Library/Fonts", os.path.expanduser("~/Library/Fonts"),
+    "/usr/share/fonts", "/usr/local/share/fonts",
+    os.path.expanduser("~/.fonts"), os.path.expanduser("~/.local/share/fonts")) if path]
+
+def fonts_mtime():
+    """mtime terbaru dari direktori font beserta seluruh subdirektorinya; font baru
+    di direktori bersarang (mis. truetype/<keluarga>/) hanya mengubah mtime direktori itu"""
+    newest = 0.0
+    for root in FONT_DIRS:
+        for path, _, _ in os.walk(root):
+            try:
+                newest = max(newest, os.stat(path).st_mtime)
+            except OSError:
+                pass
+    return newest
+
+def resolve_font(name):
+    """(file reguler, file bold) untuk font `name`; None = font bawaan pygame"""
+    try:
+        with open(FONT_CACHE) as f:
+            cache = json.load(f)
+        if not isinstance(cache, dict):
+            cache = {}
+    except (OSError, ValueError):
+        cache = {}
+    entry = cache.get(name)
+    if isinstance(entry, dict):
+        paths = entry.get("paths")
+        if paths and all(p is None or os.path.exists(p) for p in paths):
+            # Font yang tidak ditemukan dicari lagi jika direktori font berubah sejak itu
+            if any(p is not None for p in paths) or entry.get("fonts_mtime") == fonts_mtime():
+                return tuple(paths)
+    paths = (pygame.font.match_font(name), pygame.font.match_font(name, bold=True))
+    cache[name] = {"paths": paths, "fonts_mtime": fonts_mtime()}
+    try:
+        os.makedirs(os.path.dirname(FONT_CACHE), exist_ok=True)
+        with open(FONT_CACHE, "w") as f:
+            json.dump(cache, f)
+    except OSError:
+        pass
+    return paths
+
+def load_font(paths, size, bold=False):
+    """Sama seperti SysFont: pakai file bold jika ada, selain itu bold tiruan"""
+    regular, bold_path = paths
+    font = pygame.font.Font(bold_path if bold else regular, size)
+    if bold and (bold_path is None or bold_path == regular):
+        font.set_bold(True)
+    return font
+
+def init_fonts():
+    """Muat font HUD (cukup pygame.font, tanpa window); file font dicari sekali"""
+    global FONT, FONT_BOLD, BIGFONT, MEDFONT
+    if FONT is None:
+        pygame.font.init()
+        paths = resolve_font(FONT_NAME)
+        FONT = load_font(paths, 15)
+        FONT_BOLD = load_font(paths, 15, bold=True)
+        BIGFONT = load_font(paths, 32, bold=True)
+        MEDFONT = load_font(paths, 20)
+
+def init_display():
+    """Buka window utama, font dan clock untuk mode interaktif"""
+    global SCREEN, CLOCK
+    if SCREEN is None:
+        pygame.init()
+        SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("🌳 NeoTerra: A Sustainable Future City Simulation")
+        CLOCK = pygame.time.Clock()
+    init_fonts()
+    return SCREEN
+
+class ParticleSystem:
+    """Pool partikel berkapasitas tetap: posisi, kecepatan, umur, ukuran dan warna
+    disimpan dalam array NumPy, slot kosong dipakai ulang lewat free-list.
+
+    update() menggerakkan semua partikel sekaligus; draw() memakai sprite
+    per (ukuran, warna, umur) yang dirender sekali lalu di-blit dalam satu
+    panggilan Surface.blits. Partikel baru diabaikan jika pool penuh.
+    Jitter partikel memakai generator NumPy sendiri (ber-seed jika `seed` diberikan).
+    """
+    LIFE = 30
+
+    def __init__(self, capacity=4096, seed=None):
+        self.capacity = capacity
+        self.pos = np.zeros((capacity, 2), dtype=np.float64)
+        self.vel = np.zeros((capacity, 2), dtype=np.float64)
+        self.life = np.zeros(capacity, dtype=np.int16)
+        self.size = np.zeros(capacity, dtype=np.int16)
+        self.color = np.zeros(capacity, dtype=np.int16)
+        self.free = list(range(capacity - 1, -1, -1))
+        self.high = 0
+        self.palette = []
+        self.palette_ids = {}
+        self.sprites = {}
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.capacity - len(self.free)
+
+    def emit(self, x, y, color, vx=0, vy=0, count=1):
+        """Tambah `count` partikel; vx/vy boleh angka atau rentang (lo, hi) per partikel"""
+        xs = np.full(count, x, dtype=np.float64)
+        ys = np.full(count, y, dtype=np.float64)
+        self.emit_many(xs, ys, color, vx, vy)
+
+    def emit_many(self, xs, ys, color, vx=0, vy=0):
+        count = min(len(xs), len(self.free))
+        if count <= 0:
+            return
+        slots = np.array([self.free.pop() for _ in range(count)], dtype=np.intp)
+        rng = self.rng
+        vx = rng.uniform(*vx, count) if isinstance(vx, tuple) else np.full(count, float(vx))
+        vy = rng.uniform(*vy, count) if isinstance(vy, tuple) else np.full(count, float(vy))
+        self.pos[slots, 0] = xs[:count]
+        self.pos[slots, 1] = ys[:count]
+        self.vel[slots, 0] = vx + rng.uniform(-0.5, 0.5, count)
+        self.vel[slots, 1] = vy + rng.uniform(-2, -0.5, count)
+        self.life[slots] = self.LIFE
+        self.size[slots] = rng.integers(2, 6, count)
+        self.color[slots] = self._color_id(color)
+        self.high = max(self.high, int(slots.max()) + 1)
+
     def update(self):
-        self.x += self.vx
-        self.y += self.vy
-        self.vy += 0.1
-        self.life -= 1
-        
-    def draw(self, surf):
-        alpha = int(255 * (self.life / 30))
-        if alpha > 0:
-            s = pygame.Surface((self.size*2, self.size*2))
-            s.set_alpha(alpha)
-            s.fill(self.color)
-            surf.blit(s, (int(self.x), int(self.y)))
+        h = self.high
+        if h == 0:
+            return
+        alive = self.life[:h] > 0
+        self.pos[:h][alive] += self.vel[:h][alive]
+        self.vel[:h, 1][alive] += 0.1
+        self.life[:h][alive] -= 1
+        dead = np.flatnonzero(alive & (self.life[:h] == 0))
+        if len(dead):
+            self.free.extend(dead[::-1].tolist())
+            still = np.flatnonzero(self.life[:h] > 0)
+            self.high = int(still[-1]) + 1 if len(still) else 0
+
+    def draw(self, surf, alpha=1.0, view=None):
+        """Gambar partikel hidup; dengan `view` (Rect dunia) hanya yang ada di dalamnya,
+        digeser sehingga pojok kiri atas view berada di (0, 0) surf"""
+        h = self.high
+        if h == 0:
+            return
+        idx = np.flatnonzero(self.life[:h] > 0)
+        pos = self.pos[idx]
+        if alpha < 1.0:
+            # Mundurkan ke posisi antara tick sebelumnya dan sekarang
+            pos = pos - self.vel[idx] * (1.0 - alpha)
+        if view is not None:
+            inside = ((pos[:, 0] > view.left - 10) & (pos[:, 0] < view.right) &
+                      (pos[:, 1] > view.top - 10) & (pos[:, 1] < view.bottom))
+            idx, pos = idx[inside], pos[inside] - view.topleft
+        xs = pos[:, 0].astype(np.int64).tolist()
+        ys = pos[:, 1].astype(np.int64).tolist()
+        keys = zip(self.size[idx].tolist(), self.color[idx].tolist(), self.life[idx].tolist())
+        sprite = self._sprite
+        surf.blits([(sprite(key), (x, y)) for key, x, y in zip(keys, xs, ys)], doreturn=False)
+        if xs:
+            # Satu kotak pembatas untuk semua partikel (sprite maks 10 px)
+            x0, y0 = min(xs), min(ys)
+            DIRTY.add((x0, y0, max(xs) - x0 + 10, max(ys) - y0 + 10))
+
+    def clear(self):
+        self.life[:] = 0
+        self.free = list(range(self.capacity - 1, -1, -1))
+        self.high = 0
+
+    def _color_id(self, color):
+        i = self.palette_ids.get(color)
+        if i is None:
+            i = self.palette_ids[color] = len(self.palette)
+            self.palette.append(color)
+        return i
+
+    def _sprite(self, key):
+        s = self.sprites.get(key)
+        if s is None:
+            size, color, life = key
+            s = pygame.Surface((size*2, size*2))
+            s.set_alpha(int(255 * (life / self.LIFE)))
+            s.fill(self.palette[color])
+            self.sprites[key] = s
+        return s
 
 class Cloud:
-    def __init__(self):
-        self.x = random.randint(-100, WIDTH)
+    SNAPSHOT = {"x": "n", "prev_x": "n", "y": "n", "speed": "f", "size": "i"}
+
+    def __init__(self, rng=random, world_w=WIDTH):
+        self.rng = rng
+        # Awan melintas dan muncul lagi di sepanjang lebar dunia
+        self.world_w = world_w
+        self.x = rng.randint(-100, world_w)
+        self.prev_x = self.x
         self.y = 140 
-        self.speed = random.uniform(0.2, 0.5)
-        self.size = random.randint(50, 100)
+        self.speed = rng.uniform(0.2, 0.5)
+        self.size = rng.randint(50, 100)
         
     def update(self):
         self.x += self.speed
-        if self.x > WIDTH + 100:
+        if self.x > self.world_w + 100:
             self.x = -100
-            self.y = random.randint(30, 100)
+            self.y = self.rng.randint(30, 100)
     
-    def draw(self, surf):
+    def draw(self, surf, offset=(0, 0)):
         color = (255, 255, 255, 180)
-        pygame.draw.ellipse(surf, color, (self.x, self.y, self.size * 2, self.size//2))
-        pygame.draw.ellipse(surf, color, (self.x+30, self.y-10, self.size*1.5, self.size//2))
-        pygame.draw.ellipse(surf, color, (self.x+70, self.y, self.size*1.2, self.size//2))
+        x, y = self.x + offset[0], self.y + offset[1]
+        pygame.draw.ellipse(surf, color, (x, y, self.size * 2, self.size//2))
+        pygame.draw.ellipse(surf, color, (x+30, y-10, self.size*1.5, self.size//2))
+        pygame.draw.ellipse(surf, color, (x+70, y, self.size*1.2, self.size//2))
+
+    def bounds(self):
+        w = max(self.size * 2, 30 + self.size * 1.5, 70 + self.size * 1.2)
+        return pygame.Rect(int(self.x) - 1, int(self.y) - 11, int(w) + 3, self.size//2 + 12)
 
 class Button:
     def __init__(self, rect, text, callback=None, bg=(200,200,200), fg=(0,0,0), hover_bg=(220,220,220)):
@@ -79,48 +277,139 @@ class Button:
         pygame.draw.rect(surf, color, self.rect, border_radius=8)
         pygame.draw.rect(surf, (80,80,80), self.rect, 2, border_radius=8)
         
-        r = FONT_BOLD.render(self.text, True, self.fg)
+        r = TEXT.render(FONT_BOLD, self.text, self.fg)
         surf.blit(r, (self.rect.centerx - r.get_width()//2, self.rect.centery - r.get_height()//2))
         
     def click(self):
         if self.callback:
             self.callback()
 
+class Scheduler:
+    """Jam simulasi (tick) dengan antrian event berbasis heap.
+
+    Komponen mendaftarkan "jalankan callback pada tick T" lewat at()/after()
+    alih-alih menghitung mundur timer sendiri setiap tick. advance() hanya
+    menjalankan event yang jatuh tempo, jadi entitas yang sedang menunggu
+    tidak memakan biaya per tick. Event pada tick yang sama dijalankan
+    menurut `order`, lalu menurut urutan pendaftaran.
+    """
+    def __init__(self):
+        self.tick = 0
+        self.queue = []
+        self.seq = 0
+
+    def at(self, tick, callback, *args, order=0):
+        event = [tick, order, self.seq, callback, args]
+        self.seq += 1
+        heapq.heappush(self.queue, event)
+        return event
+
+    def after(self, delay, callback, *args, order=0):
+        return self.at(self.tick + delay, callback, *args, order=order)
+
+    @staticmethod
+    def cancel(event):
+        """Batalkan event dari at()/after(); dibuang saat sampai di puncak heap"""
+        if event is not None:
+            event[3] = None
+
+    def reset(self, tick=0):
+        """Kosongkan antrian dan pasang jam, misalnya sebelum restore snapshot"""
+        self.tick = tick
+        self.queue.clear()
+
+    def advance(self):
+        """Maju satu tick lalu jalankan semua event yang jatuh tempo"""
+        self.tick += 1
+        queue = self.queue
+        while queue and queue[0][0] <= self.tick:
+            event = heapq.heappop(queue)
+            if event[3] is not None:
+                event[3](*event[4])
+
+    def __len__(self):
+        return len(self.queue)
+
 class TrafficLight:
-    def __init__(self, x, y):
+    def __init__(self, x, y, scheduler):
         self.x = x
         self.y = y
         self.pole_height = 120
         self.state = "GREEN"
-        self.timer = 0
-        self.durations = {"GREEN": 5*FPS, "YELLOW": 2*FPS, "RED": 5*FPS}
-        self.glow = 0
+        self.durations = {"GREEN": 5*SIM_HZ, "YELLOW": 2*SIM_HZ, "RED": 5*SIM_HZ}
+        # Fase berganti lewat event scheduler; timer dan glow diturunkan dari jam
+        self.scheduler = scheduler
+        self.changed_at = scheduler.tick
+        self.started_at = scheduler.tick
+        self.event = None
+        self.schedule()
+
+    @property
+    def timer(self):
+        """Tick sejak fase sekarang dimulai"""
+        return self.scheduler.tick - self.changed_at
+
+    @property
+    def glow(self):
+        return (3 * (self.scheduler.tick - self.started_at)) % 360
     
     @property
     def depth_y(self):
         return self.y + self.pole_height
+
+    def sprite_blit(self):
+        # Cahaya lampu beranimasi tiap frame, jadi selalu digambar primitif
+        return None
+
+    def bounds(self):
+        return pygame.Rect(self.x - 25, self.y - 100, 52, self.pole_height + 110)
         
-    def update(self):
-        self.timer += 1
-        self.glow = (self.glow + 3) % 360
-        if self.timer > self.durations[self.state]:
-            self.timer = 0
-            if self.state == "GREEN":
-                self.state = "YELLOW"
-            elif self.state == "YELLOW":
-                self.state = "RED"
-            else:
-                self.state = "GREEN"
+    PHASES = ("GREEN", "YELLOW", "RED")
+
+    def set_phase(self, ticks):
+        """Atur lampu seolah sudah berjalan `ticks` tick sejak mulai hijau"""
+        t = ticks % sum(self.durations[state] + 1 for state in self.PHASES)
+        for state in self.PHASES:
+            span = self.durations[state] + 1
+            if t < span:
+                self.set_state(state, t, 3 * ticks)
+                break
+            t -= span
+
+    def set_state(self, state, timer, glow=0):
+        """Pasang fase dan umurnya (tick), lalu jadwalkan ulang pergantian berikutnya"""
+        tick = self.scheduler.tick
+        self.state = state
+        self.changed_at = tick - timer
+        self.started_at = tick - (glow % 360) // 3
+        self.schedule()
+
+    def set_durations(self, durations):
+        self.durations = dict(durations)
+        self.schedule()
+
+    def schedule(self):
+        # Fase berlangsung durations + 1 tick (timer 0..durations) lalu berganti
+        Scheduler.cancel(self.event)
+        due = max(self.changed_at + self.durations[self.state] + 1, self.scheduler.tick + 1)
+        self.event = self.scheduler.at(due, self.switch)
+
+    def switch(self):
+        self.state = self.PHASES[(self.PHASES.index(self.state) + 1) % len(self.PHASES)]
+        self.changed_at = self.scheduler.tick
+        self.event = None
+        self.schedule()
                 
-    def draw(self, surf):
-        base_y = self.y + self.pole_height
-        pygame.draw.rect(surf, (40,40,40), (self.x-8, base_y-5, 16, 10))
-        pygame.draw.rect(surf, (50,50,50), (self.x-4, self.y, 8, self.pole_height), border_radius=3)
-        pygame.draw.rect(surf, (30,30,30), (self.x-4, self.y, 8, self.pole_height), 1, border_radius=3)
+    def draw(self, surf, offset=(0, 0)):
+        x, y = self.x + offset[0], self.y + offset[1]
+        base_y = y + self.pole_height
+        pygame.draw.rect(surf, (40,40,40), (x-8, base_y-5, 16, 10))
+        pygame.draw.rect(surf, (50,50,50), (x-4, y, 8, self.pole_height), border_radius=3)
+        pygame.draw.rect(surf, (30,30,30), (x-4, y, 8, self.pole_height), 1, border_radius=3)
         
         box_width, box_height = 40, 95
-        box_x = self.x - box_width//2
-        box_y = self.y - box_height
+        box_x = x - box_width//2
+        box_y = y - box_height
         
         pygame.draw.rect(surf, (0,0,0,60), (box_x+3, box_y+3, box_width, box_height), border_radius=8)
         pygame.draw.rect(surf, (40,40,40), (box_x, box_y, box_width, box_height), border_radius=8)
@@ -141,35 +430,675 @@ class TrafficLight:
                 glow_surf = pygame.Surface((30, 30), pygame.SRCALPHA)
                 glow_alpha = int(100 + 50 * math.sin(math.radians(self.glow)))
                 pygame.draw.circle(glow_surf, (*color, glow_alpha), (15, 15), 12)
-                surf.blit(glow_surf, (self.x - glow_surf.get_width()//2, y_pos - glow_surf.get_height()//2))
+                surf.blit(glow_surf, (x - glow_surf.get_width()//2, y_pos - glow_surf.get_height()//2))
             
-            pygame.draw.circle(surf, color, (self.x, y_pos), 10)
-            pygame.draw.circle(surf, (200,200,200), (self.x, y_pos), 10, 1)
+            pygame.draw.circle(surf, color, (x, y_pos), 10)
+            pygame.draw.circle(surf, (200,200,200), (x, y_pos), 10, 1)
+
+class RoadNetwork:
+    """Jaringan jalan kota cerdas: ruas jalan horizontal (masing-masing dengan
+    beberapa lajur) dan persimpangan, setiap persimpangan punya TrafficLight sendiri.
+
+    Kendaraan melaju ke kanan di lajurnya (kunci: y). Untuk setiap lajur,
+    garis berhenti (x lampu) disimpan terurut, jadi lampu berikutnya di depan
+    sebuah kendaraan dicari dengan bisect, bukan dengan memeriksa semua lampu.
+    Jalan silang di persimpangan hanya dimodelkan lewat lampunya. Lampu
+    berganti fase lewat `scheduler` jaringan, yang dipakai juga oleh simulasi.
+    """
+    def __init__(self):
+        self.scheduler = Scheduler()
+        self.roads = []          # dict: y, lanes (offset y), x0, length
+        self.intersections = []  # dict: road, x, phase
+        self.lights = []
+        self.stops = {}          # y lajur -> ([x garis berhenti terurut], [lampu])
+        self.lane_ys = []
+        self.version = 0
+
+    @classmethod
+    def single(cls, road_y=340, light_x=950):
+        """Tata letak bawaan: satu jalan dua lajur dengan satu lampu"""
+        net = cls()
+        road = net.add_road(road_y)
+        net.add_intersection(road, light_x)
+        return net
+
+    @classmethod
+    def grid(cls, rows, cols, top=340, spacing_y=120, spacing_x=150, lanes=(-15, 15), green_wave=0):
+        """rows jalan sejajar x cols jalan silang; lampu di persimpangan ke-c mulai
+        terlambat c * green_wave tick (gelombang hijau sepanjang jalan)"""
+        net = cls()
+        length = spacing_x * (cols + 1)
+        for r in range(rows):
+            road = net.add_road(top + r * spacing_y, lanes, length=length)
+            for c in range(cols):
+                net.add_intersection(road, spacing_x * (c + 1), phase=c * green_wave)
+        return net
+
+    @classmethod
+    def from_spec(cls, spec):
+        net = cls()
+        for road in spec["roads"]:
+            net.add_road(road["y"], road["lanes"], road["x0"], road["length"])
+        for inter in spec["intersections"]:
+            net.add_intersection(inter["road"], inter["x"], inter["phase"])
+        return net
+
+    def spec(self):
+        """Tata letak jaringan sebagai dict JSON (tanpa state lampu)"""
+        return {"roads": self.roads, "intersections": self.intersections}
+
+    def add_road(self, y, lanes=(-15, 15), x0=0, length=WIDTH):
+        self.roads.append({"y": y, "lanes": list(lanes), "x0": x0, "length": length})
+        for offset in lanes:
+            if y + offset not in self.stops:
+                self.stops[y + offset] = ([], [])
+                self.lane_ys.append(y + offset)
+        self.version += 1
+        return len(self.roads) - 1
+
+    def add_intersection(self, road, x, phase=0):
+        # Tiang lampu 40 px di atas garis tengah jalan, seperti lampu bawaan (950, 300)
+        r = self.roads[road]
+        light = TrafficLight(x, r["y"] - 40, self.scheduler)
+        if phase:
+            light.set_phase(phase)
+        self.intersections.append({"road": road, "x": x, "phase": phase})
+        self.lights.append(light)
+        for offset in r["lanes"]:
+            xs, lights = self.stops[r["y"] + offset]
+            i = bisect_right(xs, x)
+            xs.insert(i, x)
+            lights.insert(i, light)
+        self.version += 1
+        return light
+
+    @property
+    def x_max(self):
+        """Ujung kanan jalan terjauh; kendaraan lewat dari sini keluar dari jaringan"""
+        return max((r["x0"] + r["length"] for r in self.roads), default=WIDTH)
+
+    @property
+    def y_max(self):
+        """Batas bawah dunia: jalan terbawah plus trotoar, minimal setinggi layar"""
+        return max([HEIGHT] + [r["y"] + max(r["lanes"]) + 100 for r in self.roads])
+
+    def light_ahead(self, y, x):
+        """Lampu pertama dengan garis berhenti di depan x pada lajur y, atau None"""
+        stop = self.stops.get(y)
+        if stop is None:
+            return None
+        i = bisect_right(stop[0], x)
+        return stop[1][i] if i < len(stop[1]) else None
+
+    def stop_table(self, lane_y):
+        """Garis berhenti untuk lajur VehicleArrays (id lajur -> y) sebagai array
+        terurut (id lajur, x): kunci, id lajur, x dan indeks lampu"""
+        light_index = {id(light): i for i, light in enumerate(self.lights)}
+        lanes, xs, idx = [], [], []
+        for lane, y in enumerate(lane_y):
+            stop_xs, lights = self.stops.get(y, ((), ()))
+            lanes.extend([lane] * len(stop_xs))
+            xs.extend(stop_xs)
+            idx.extend(light_index[id(light)] for light in lights)
+        lanes = np.array(lanes, dtype=np.int64)
+        xs = np.array(xs, dtype=np.float64)
+        return lanes * VehicleArrays.LANE_SPAN + xs, lanes, xs, np.array(idx, dtype=np.intp)
+
+    def red_mask(self):
+        return np.fromiter((light.state == "RED" for light in self.lights), dtype=bool, count=len(self.lights))
+
+class SpriteAtlas:
+    """Cache sprite entitas (kendaraan, pohon, pejalan kaki, pesepeda) dengan batas LRU.
+
+    Setiap varian (jenis, warna, skala, tahap, frame animasi) dirender sekali
+    saat pertama dipakai ke Surface ber-colorkey, sehingga hasilnya sama
+    persis dengan menggambar primitif langsung ke layar, lalu cukup satu blit.
+    Jika `enabled` False, entitas kembali ke jalur primitif.
+    """
+    COLORKEY = (255, 0, 255)
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.enabled = True
+        self.sprites = OrderedDict()
+
+    def get(self, key, size, render):
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            return sprite
+        sprite = pygame.Surface(size)
+        sprite.fill(self.COLORKEY)
+        render(sprite)
+        sprite.set_colorkey(self.COLORKEY, pygame.RLEACCEL)
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.capacity:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    def clear(self):
+        self.sprites.clear()
+
+SPRITES = SpriteAtlas()
+
+class TextCache:
+    """Cache hasil font.render() dengan batas LRU, dikunci (font, teks, warna, antialias).
+
+    Teks statis cukup dirender sekali; teks berisi angka dirender ulang hanya
+    saat nilainya berubah. Surface hasil render() dipakai bersama, jadi jangan
+    diubah; untuk transparansi pakai blit(..., alpha=...) yang memasang alpha
+    sementara selama blit. size() juga dimemo untuk perhitungan tata letak.
+    """
+    def __init__(self, capacity=512):
+        self.capacity = capacity
+        self.surfaces = OrderedDict()
+        self.sizes = {}
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, color, antialias)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            return surf
+        surf = font.render(text, antialias, color)
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def blit(self, dest, font, text, color, pos, alpha=None, antialias=True):
+        surf = self.render(font, text, color, antialias)
+        if alpha is None:
+            return dest.blit(surf, pos)
+        # Kembalikan alpha asli (255) agar blending per-piksel tetap berlaku bagi pemakai lain
+        original = surf.get_alpha()
+        surf.set_alpha(alpha)
+        rect = dest.blit(surf, pos)
+        surf.set_alpha(original)
+        return rect
+
+    def size(self, font, text):
+        key = (font, text)
+        size = self.sizes.get(key)
+        if size is None:
+            if len(self.sizes) >= 4 * self.capacity:
+                self.sizes.clear()
+            size = self.sizes[key] = font.size(text)
+        return size
+
+    def clear(self):
+        self.surfaces.clear()
+        self.sizes.clear()
+
+TEXT = TextCache()
+
+class DirtyRects:
+    """Catat area layar yang berubah tiap frame lalu kirim hanya area itu ke display.
+
+    present() memanggil pygame.display.update() dengan area frame ini dan
+    frame sebelumnya (posisi lama entitas), atau flip() penuh jika ada
+    mark_full() di frame ini/sebelumnya, area terlalu banyak, atau `enabled`
+    dimatikan (mis. lewat --full-flip).
+    """
+    MAX_RECTS = 400
+
+    def __init__(self):
+        self.enabled = True
+        self.rects = []
+        self.prev = []
+        self.full = True
+        self.prev_full = True
+
+    def add(self, rect):
+        if self.enabled and not self.full:
+            self.rects.append(pygame.Rect(rect))
+
+    def add_all(self, rects):
+        if self.enabled and not self.full:
+            self.rects.extend(rects)
+
+    def mark_full(self):
+        self.full = True
+        self.rects = []
+
+    def present(self):
+        full = not self.enabled or self.full or self.prev_full
+        if full or len(self.rects) + len(self.prev) > self.MAX_RECTS:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.prev + self.rects)
+        self.prev_full = self.full
+        self.prev = self.rects
+        self.rects = []
+        self.full = False
+
+DIRTY = DirtyRects()
+
+class Profiler:
+    """Pengukur waktu per fase frame dengan persentil bergulir.
+
+    Setiap fase diukur lewat pasangan start()/stop(name, t) atau span(name);
+    waktu fase yang sama dalam satu frame dijumlahkan. end_frame() menutup
+    frame: total waktu frame, waktu tiap fase dan selisih sys.getallocatedblocks()
+    disimpan ke jendela `window` frame terakhir. Saat `enabled` False,
+    start() mengembalikan None dan stop() tidak melakukan apa-apa.
+    """
+    def __init__(self, window=600):
+        self.enabled = False
+        self.overlay = False
+        self.export_path = None
+        self.window = window
+        self.samples = {}
+        self.frame_spans = {}
+        self.allocs = deque(maxlen=window)
+        self.last_frame = None
+        self.last_blocks = None
+
+    def start(self):
+        return time.perf_counter() if self.enabled else None
+
+    def stop(self, name, t):
+        if t is not None:
+            self.add(name, time.perf_counter() - t)
+
+    def lap(self, name, t):
+        """stop(name, t) lalu mulai pengukuran fase berikutnya"""
+        if t is None:
+            return None
+        now = time.perf_counter()
+        self.add(name, now - t)
+        return now
+
+    def add(self, name, seconds):
+        self.frame_spans[name] = self.frame_spans.get(name, 0.0) + seconds
+
+    @contextmanager
+    def span(self, name):
+        t = self.start()
+        try:
+            yield
+        finally:
+            self.stop(name, t)
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        blocks = sys.getallocatedblocks()
+        if self.last_frame is not None:
+            self._push("frame", now - self.last_frame)
+            self.allocs.append(blocks - self.last_blocks)
+        for name, seconds in self.frame_spans.items():
+            self._push(name, seconds)
+        self.frame_spans = {}
+        self.last_frame, self.last_blocks = now, blocks
+
+    def _push(self, name, seconds):
+        series = self.samples.get(name)
+        if series is None:
+            series = self.samples[name] = deque(maxlen=self.window)
+        series.append(seconds * 1000.0)
+
+    def reset(self):
+        self.samples.clear()
+        self.frame_spans = {}
+        self.allocs.clear()
+        self.last_frame = self.last_blocks = None
+
+    def summary(self):
+        """{fase: {frames, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}}, plus 'alloc_blocks'"""
+        out = {}
+        for name, series in sorted(self.samples.items()):
+            values = np.fromiter(series, dtype=np.float64)
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            out[name] = {"frames": len(values), "mean_ms": float(values.mean()),
+                         "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+                         "max_ms": float(values.max())}
+        if self.allocs:
+            values = np.fromiter(self.allocs, dtype=np.float64)
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            out["alloc_blocks"] = {"frames": len(values), "mean": float(values.mean()),
+                                   "p50": float(p50), "p95": float(p95), "p99": float(p99),
+                                   "max": float(values.max())}
+        return out
+
+    def export(self, path):
+        """Tulis summary() ke CSV (jika path berakhiran .csv) atau JSON"""
+        summary = self.summary()
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["name", "frames", "mean", "p50", "p95", "p99", "max"])
+                for name, row in summary.items():
+                    writer.writerow([name] + [round(v, 4) for v in row.values()])
+        else:
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=2)
+
+    def draw_overlay(self, surf):
+        summary = self.summary()
+        frame = summary.get("frame")
+        if frame is None:
+            return
+        # Fase dengan p95 terbesar (selain total frame) di bawah ringkasan
+        phases = sorted((row["p95_ms"], name) for name, row in summary.items()
+                        if name not in ("frame", "alloc_blocks"))[::-1][:10]
+        lines = [f"frame p50 {frame['p50_ms']:.1f}  p95 {frame['p95_ms']:.1f}  p99 {frame['p99_ms']:.1f} ms"]
+        if "alloc_blocks" in summary:
+            lines.append(f"alloc/frame p50 {summary['alloc_blocks']['p50']:+.0f}  p95 {summary['alloc_blocks']['p95']:+.0f}")
+        lines += [f"{name:<18} p95 {p95:6.2f} ms" for p95, name in phases]
+        box = pygame.Rect(10, 110, 360, 12 + 20 * len(lines))
+        panel = pygame.Surface(box.size, pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 190))
+        surf.blit(panel, box.topleft)
+        # Angka overlay berubah tiap frame; dirender langsung agar tidak menggusur isi TEXT
+        for i, line in enumerate(lines):
+            surf.blit(FONT.render(line, True, (120, 255, 120) if i == 0 else (230, 230, 230)),
+                      (box.x + 8, box.y + 6 + 20 * i))
+        DIRTY.add(box)
+
+PROFILER = Profiler()
+
+def draw_entities(surf, entities, offset=(0, 0)):
+    """Gambar entitas sesuai urutan; sprite yang berurutan dikirim dalam satu
+    Surface.blits, entitas lain digambar primitif. Area tiap entitas dicatat ke DIRTY.
+    `offset` menggeser koordinat dunia ke koordinat surf (kamera)."""
+    if PROFILER.enabled:
+        return draw_entities_profiled(surf, entities, offset)
+    ox, oy = offset
+    batch = []
+    for e in entities:
+        item = e.sprite_blit()
+        if item is not None:
+            if ox or oy:
+                item = (item[0], (item[1][0] + ox, item[1][1] + oy))
+            batch.append(item)
+            continue
+        if batch:
+            DIRTY.add_all(surf.blits(batch))
+            batch = []
+        e.draw(surf, offset)
+        DIRTY.add(e.bounds().move(ox, oy))
+    if batch:
+        DIRTY.add_all(surf.blits(batch))
+
+def draw_entities_profiled(surf, entities, offset=(0, 0)):
+    """Sama dengan draw_entities, tetapi waktu dicatat per kelas entitas (draw.<Kelas>)
+    dan untuk Surface.blits (draw.blits)"""
+    perf = time.perf_counter
+    ox, oy = offset
+    batch = []
+    for e in entities:
+        t = perf()
+        item = e.sprite_blit()
+        if item is None:
+            if batch:
+                t_blits = perf()
+                DIRTY.add_all(surf.blits(batch))
+                PROFILER.add("draw.blits", perf() - t_blits)
+                batch = []
+                t = perf()
+            e.draw(surf, offset)
+            DIRTY.add(e.bounds().move(ox, oy))
+        else:
+            if ox or oy:
+                item = (item[0], (item[1][0] + ox, item[1][1] + oy))
+            batch.append(item)
+        PROFILER.add("draw." + type(e).__name__, perf() - t)
+    if batch:
+        t = perf()
+        DIRTY.add_all(surf.blits(batch))
+        PROFILER.add("draw.blits", perf() - t)
+
+def sim_rngs(seed=None):
+    """(seed, rng simulasi, rng kosmetik) untuk satu simulasi.
+
+    rng simulasi dipakai semua keputusan yang memengaruhi state per tick;
+    rng kosmetik hanya untuk jalur render (tekstur, asap) dan seed partikel,
+    sehingga jumlah frame yang digambar tidak mengubah hasil simulasi.
+    Tanpa seed dipilih seed acak, yang disimpan sim agar run bisa diulang.
+    """
+    if seed is None:
+        seed = random.randrange(2**32)
+    return seed, random.Random(seed), random.Random(f"fx-{seed}")
+
+def state_digest(*parts):
+    """Hash pendek dari bagian-bagian state (array NumPy atau nilai Python biasa).
+    repr() float bersifat eksak, jadi digest sama berarti state sama bit per bit."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            h.update(part.tobytes())
+        else:
+            h.update(repr(part).encode())
+    return h.hexdigest()[:16]
+
+# Lompatan posisi lebih jauh dari ini dianggap teleport (wrap ke sisi lain layar), tidak diinterpolasi
+MAX_LERP = 50
+
+def snapshot_positions(entities):
+    """Simpan x sebelum tick sebagai prev_x, dipanggil sim di awal update()"""
+    for e in entities:
+        e.prev_x = e.x
+
+@contextmanager
+def interpolated(entities, alpha):
+    """Selama blok, geser x entitas ke prev_x + (x - prev_x) * alpha lalu kembalikan"""
+    saved = [e.x for e in entities]
+    if alpha < 1.0:
+        for e in entities:
+            dx = e.x - e.prev_x
+            if abs(dx) <= MAX_LERP:
+                e.x = e.prev_x + dx * alpha
+    try:
+        yield
+    finally:
+        for e, x in zip(entities, saved):
+            e.x = x
+
+# ========== Snapshot ==========
+SNAPSHOT_MAGIC = b"NTSNAP"
+SNAPSHOT_VERSION = 5
+_SNAP_HEADER = struct.Struct("<6sHH")   # magic, versi, panjang nama jenis sim
+_SNAP_PART = struct.Struct("<HBQ")      # panjang nama, jenis isi (0 JSON, 1 array), panjang isi
+
+class SnapshotWriter:
+    """Menyusun snapshot biner satu simulasi.
+
+    Isinya header (magic, versi, jenis sim) lalu bagian-bagian bernama:
+    nilai kecil sebagai JSON, daftar entitas sebagai tabel kolom (satu array
+    NumPy per atribut). Tipe kolom: "f" float, "i" int, "b" bool, "s" teks,
+    "c" warna RGB, "n" angka yang bisa int atau float (tipe aslinya ikut
+    disimpan agar digest sama persis setelah restore).
+    """
+    def __init__(self, kind):
+        self.kind = kind
+        self.parts = []
+
+    def value(self, name, value):
+        self.parts.append((name, 0, json.dumps(value).encode()))
+
+    def array(self, name, arr):
+        arr = np.ascontiguousarray(arr)
+        dtype = arr.dtype.str.encode()
+        head = struct.pack(f"<B{len(dtype)}sB{arr.ndim}Q", len(dtype), dtype, arr.ndim, *arr.shape)
+        self.parts.append((name, 1, head + arr.tobytes()))
+
+    def rng(self, name, rng):
+        version, words, gauss = rng.getstate()
+        self.array(name, np.array(words, dtype=np.uint32))
+        self.value(name + ".gauss", gauss)
+
+    def table(self, name, items, fields, get=getattr):
+        """Simpan atribut `fields` ({atribut: tipe}) dari setiap item sebagai kolom"""
+        self.value(name, len(items))
+        for field, kind in fields.items():
+            values = [get(item, field) for item in items]
+            key = f"{name}.{field}"
+            if kind == "s":
+                labels = sorted(set(values))
+                self.value(key + ".labels", labels)
+                codes = {label: i for i, label in enumerate(labels)}
+                self.array(key, np.array([codes[v] for v in values], dtype=np.int32))
+            elif kind == "c":
+                self.array(key, np.array(values, dtype=np.uint8).reshape(len(values), 3))
+            elif kind == "n":
+                self.array(key, np.array(values, dtype=np.float64))
+                self.array(key + ".int", np.array([type(v) is int for v in values], dtype=bool))
+            else:
+                self.array(key, np.array(values, dtype={"f": np.float64, "i": np.int64, "b": bool}[kind]))
+
+    def tobytes(self):
+        kind = self.kind.encode()
+        out = [_SNAP_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(kind)), kind]
+        for name, code, payload in self.parts:
+            key = name.encode()
+            out += [_SNAP_PART.pack(len(key), code, len(payload)), key, payload]
+        return b"".join(out)
+
+class SnapshotReader:
+    """Membaca snapshot dari SnapshotWriter; array dibaca tanpa parsing per elemen"""
+    def __init__(self, data, kind=None):
+        data = memoryview(data)
+        magic, version, kind_len = _SNAP_HEADER.unpack_from(data, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("bukan file snapshot NeoTerra")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"versi snapshot {version} tidak didukung (butuh {SNAPSHOT_VERSION})")
+        offset = _SNAP_HEADER.size
+        self.kind = bytes(data[offset:offset + kind_len]).decode()
+        if kind is not None and self.kind != kind:
+            raise ValueError(f"snapshot berisi simulasi {self.kind}, bukan {kind}")
+        offset += kind_len
+        self.parts = {}
+        while offset < len(data):
+            key_len, code, size = _SNAP_PART.unpack_from(data, offset)
+            offset += _SNAP_PART.size
+            name = bytes(data[offset:offset + key_len]).decode()
+            offset += key_len
+            self.parts[name] = (code, data[offset:offset + size])
+            offset += size
+
+    def value(self, name):
+        code, payload = self.parts[name]
+        return json.loads(bytes(payload))
+
+    def array(self, name):
+        code, payload = self.parts[name]
+        dtype_len = payload[0]
+        dtype = np.dtype(bytes(payload[1:1 + dtype_len]).decode())
+        ndim = payload[1 + dtype_len]
+        start = 2 + dtype_len
+        shape = struct.unpack_from(f"<{ndim}Q", payload, start)
+        return np.frombuffer(payload, dtype=dtype, offset=start + 8 * ndim).reshape(shape).copy()
+
+    def rng(self, name, rng):
+        rng.setstate((3, tuple(self.array(name).tolist()), self.value(name + ".gauss")))
+
+    def table(self, name, fields):
+        """Kebalikan SnapshotWriter.table: daftar dict {atribut: nilai Python} per item"""
+        count = self.value(name)
+        columns = []
+        for field, kind in fields.items():
+            key = f"{name}.{field}"
+            if kind == "s":
+                labels = self.value(key + ".labels")
+                columns.append([labels[i] for i in self.array(key).tolist()])
+            elif kind == "c":
+                columns.append([tuple(c) for c in self.array(key).tolist()])
+            elif kind == "n":
+                values = self.array(key).tolist()
+                columns.append([int(v) if is_int else v
+                                for v, is_int in zip(values, self.array(key + ".int").tolist())])
+            else:
+                columns.append(self.array(key).tolist())
+        names = list(fields)
+        return [dict(zip(names, row)) for row in zip(*columns)] if columns else [{} for _ in range(count)]
+
+def restore_entities(cls, rows, **shared):
+    """Buat ulang entitas dari baris tabel snapshot tanpa memanggil __init__
+    (yang akan memakai RNG); `shared` berisi referensi bersama seperti rng/particles"""
+    out = []
+    for row in rows:
+        e = cls.__new__(cls)
+        e.__dict__.update(shared)
+        e.__dict__.update(row)
+        out.append(e)
+    return out
+
+def snapshot_trees(w, name, trees):
+    w.table(name, trees, Tree.SNAPSHOT)
+    # Buah: jumlah per pohon (-1 = belum pernah berbuah) lalu semua posisi berurutan
+    fruits = [getattr(t, "fruit_positions", None) for t in trees]
+    w.array(name + ".fruit_count", np.array([-1 if f is None else len(f) for f in fruits], dtype=np.int32))
+    w.array(name + ".fruit", np.array([p for f in fruits if f for p in f], dtype=np.float64).reshape(-1, 2))
+
+def restore_trees(r, name, **shared):
+    """Pohon dari snapshot_trees(); `shared` harus berisi scheduler simulasi yang jamnya
+    sudah dipulihkan, karena timer pohon dipasang ulang relatif terhadap jam itu"""
+    rows = r.table(name, Tree.SNAPSHOT)
+    timers = [(row.pop("growth_timer"), row.pop("sway"), row.pop("fruit_respawn_timer")) for row in rows]
+    trees = restore_entities(Tree, rows, **shared)
+    fruit = [tuple(p) for p in r.array(name + ".fruit").tolist()]
+    i = 0
+    for t, count, timer in zip(trees, r.array(name + ".fruit_count").tolist(), timers):
+        if count >= 0:
+            t.fruit_positions = fruit[i:i + count]
+            i += count
+        t.events = []
+        t.resume(*timer)
+    return trees
+
+def snapshot_lane_vehicles(w, name, lanes, listing):
+    """Kendaraan disimpan per lajur LaneIndex (urutan update), beserta posisinya di `listing`"""
+    w.value(name + ".lanes", list(lanes.lanes))
+    ordered = [v for lane in lanes.lanes.values() for v in lane]
+    position = {id(v): i for i, v in enumerate(listing)}
+    w.table(name, ordered, Vehicle.SNAPSHOT)
+    w.array(name + ".order", np.array([position[id(v)] for v in ordered], dtype=np.int64))
+
+def restore_lane_vehicles(r, name, lanes, **shared):
+    """Isi ulang `lanes` dan kembalikan kendaraan dalam urutan daftar aslinya"""
+    ordered = restore_entities(Vehicle, r.table(name, Vehicle.SNAPSHOT), **shared)
+    for v in ordered:
+        v.width, v.height = Vehicle.dimensions(v.kind, v.scale)
+    lanes.load(r.value(name + ".lanes"), ordered)
+    listing = [None] * len(ordered)
+    for v, i in zip(ordered, r.array(name + ".order").tolist()):
+        listing[i] = v
+    return listing
 
 class Vehicle:
-    def __init__(self, kind="car", x=0, y=0, speed=2, scale=1.3, enable_exhaust=True):
+    CAR_COLORS = [(220,50,50), (50,120,220), (220,180,50), (50,200,80)]
+    SNAPSHOT = {"kind": "s", "x": "n", "prev_x": "n", "y": "n", "speed": "f", "scale": "f",
+                "enable_exhaust": "b", "color": "c", "passengers": "i", "exhaust_timer": "i"}
+
+    def __init__(self, kind="car", x=0, y=0, speed=2, scale=1.3, enable_exhaust=True, particles=None, rng=random):
         self.kind = kind
         self.x = x
+        self.prev_x = x
         self.y = y
         self.speed = speed
         self.scale = scale
         self.enable_exhaust = enable_exhaust
-        
-        base_width = 30 if kind=="car" else 68 if kind=="bus" else 18
-        base_height = 18 if kind!="bus" else 28
-        self.width = int(base_width * scale)
-        self.height = int(base_height * scale)
+        self.width, self.height = Vehicle.dimensions(kind, scale)
 
         if kind == "car":
-            self.color = random.choice([(220,50,50), (50,120,220), (220,180,50), (50,200,80)])
+            self.color = rng.choice(Vehicle.CAR_COLORS)
         elif kind == "bus":
             self.color = (30,130,230)
         else:
             self.color = (40,180,40)
 
-        self.passengers = random.randint(1,4) if kind=="bus" else 1
+        self.passengers = rng.randint(1,4) if kind=="bus" else 1
         self.exhaust_timer = 0
-        self.exhaust_particles = []
+        self.particles = particles
+
+    @staticmethod
+    def dimensions(kind, scale):
+        base_width = 30 if kind=="car" else 68 if kind=="bus" else 18
+        base_height = 18 if kind!="bus" else 28
+        return int(base_width * scale), int(base_height * scale)
 
     def update(self, traffic_light=None, vehicles=None):
         if traffic_light and traffic_light.state == "RED":
@@ -185,15 +1114,14 @@ class Vehicle:
             self.exhaust_timer += 1
             if self.exhaust_timer > 10:
                 self.exhaust_timer = 0
-                p = Particle(self.x - 5, self.y + 5, (80,80,80), vx=-0.5, vy=0)
-                self.exhaust_particles.append(p)
-
-        for p in self.exhaust_particles:
-            p.update()
-        self.exhaust_particles = [p for p in self.exhaust_particles if p.life > 0]
+                if self.particles is not None:
+                    self.particles.emit(self.x - 5, self.y + 5, (80,80,80), vx=-0.5, vy=0)
 
     def can_move(self, vehicles):
         SAFE_DISTANCE = self.width * 1.6
+        if isinstance(vehicles, LaneIndex):
+            leader = vehicles.leader(self)
+            return leader is None or leader.x - self.x >= SAFE_DISTANCE
         for other in vehicles:
             if other is self:
                 continue
@@ -202,39 +1130,63 @@ class Vehicle:
                     return False
         return True
 
-    def draw(self, surf):
-        for p in self.exhaust_particles:
-            p.draw(surf)
+    def sprite_bounds(self):
+        """(ox, oy, w, h): offset titik (x, y) di dalam sprite dan ukuran sprite"""
+        pad = 4
+        return (pad, self.height + pad, self.width + int(3 * self.scale) + 2 * pad,
+                self.height + self.height // 2 + int(8 * self.scale) + 2 * pad)
+
+    def sprite_blit(self):
+        """(sprite, posisi) dari atlas, atau None jika harus digambar primitif"""
+        if not SPRITES.enabled:
+            return None
+        ox, oy, w, h = self.sprite_bounds()
+        sprite = SPRITES.get(("vehicle", self.kind, self.color, self.scale), (w, h),
+                             lambda s: self.draw_shape(s, ox, oy))
+        return sprite, (int(self.x) - ox, int(self.y) - oy)
 
-        shadow = pygame.Rect(self.x+2*self.scale, self.y - self.height//2 + 2*self.scale, self.width, self.height)
+    def bounds(self):
+        ox, oy, w, h = self.sprite_bounds()
+        return pygame.Rect(int(self.x) - ox, int(self.y) - oy, w, h)
+
+    def draw(self, surf, offset=(0, 0)):
+        item = self.sprite_blit()
+        if item is None:
+            self.draw_shape(surf, self.x + offset[0], self.y + offset[1])
+        else:
+            sprite, (x, y) = item
+            surf.blit(sprite, (x + offset[0], y + offset[1]))
+
+    def draw_shape(self, surf, x, y):
+        shadow = pygame.Rect(x+2*self.scale, y - self.height//2 + 2*self.scale, self.width, self.height)
         pygame.draw.rect(surf, (0,0,0,60), shadow, border_radius=5)
 
         if self.kind == "bus":
-            r = pygame.Rect(self.x, self.y - self.height//2, self.width, self.height)
+            r = pygame.Rect(x, y - self.height//2, self.width, self.height)
             pygame.draw.rect(surf, self.color, r, border_radius=6)
             pygame.draw.rect(surf, (0,0,0), r, max(1,int(2*self.scale)), border_radius=6)
             
             window_width = int(12 * self.scale)
             window_height = int(8 * self.scale)
             for i in range(4):
-                wx = self.x + int(8*self.scale) + i * (window_width + int(3*self.scale))
+                wx = x + int(8*self.scale) + i * (window_width + int(3*self.scale))
                 pygame.draw.rect(surf, (185,230,255),
-                    (wx, self.y - self.height//2 + int(6 * self.scale), window_width, window_height),
+                    (wx, y - self.height//2 + int(6 * self.scale), window_width, window_height),
                     border_radius=3)
         else:
-            body_y = self.y - int(self.height * 0.25)
+            body_y = y - int(self.height * 0.25)
             wheel_radius = int(self.width * 0.12)
 
-            pygame.draw.ellipse(surf, self.color, (self.x, body_y, self.width, int(self.height * 0.6)))
+            pygame.draw.ellipse(surf, self.color, (x, body_y, self.width, int(self.height * 0.6)))
             
             roof_width = int(self.width * 0.7)
             roof_height = int(self.height * 0.65)
             pygame.draw.arc(surf, self.color,
-                (self.x + int(self.width * 0.10), body_y - int(roof_height * 0.55),
+                (x + int(self.width * 0.10), body_y - int(roof_height * 0.55),
                  int(roof_width * 1.15), int(roof_height * 1.45)),
                 math.radians(0), math.radians(180), 4)
 
-            window_x = self.x + int(self.width * 0.18)
+            window_x = x + int(self.width * 0.18)
             window_y = body_y - int(roof_height * 0.38)
             window_w = int(roof_width * 0.75)
             window_h = int(roof_height * 0.85)
@@ -242,86 +1194,459 @@ class Vehicle:
                 math.radians(0), math.radians(180), 4)
 
             pygame.draw.line(surf, self.color,
-                (self.x + int(self.width * 0.47), self.y - int(self.height * 0.45)),
-                (self.x + int(self.width * 0.47), self.y - int(self.height * 0.20)), 4)
+                (x + int(self.width * 0.47), y - int(self.height * 0.45)),
+                (x + int(self.width * 0.47), y - int(self.height * 0.20)), 4)
 
-            left_wheel_x = self.x + int(self.width * 0.18)
-            right_wheel_x = self.x + int(self.width * 0.72)
-            wheel_y = self.y + int(self.height * 0.15)
+            left_wheel_x = x + int(self.width * 0.18)
+            right_wheel_x = x + int(self.width * 0.72)
+            wheel_y = y + int(self.height * 0.15)
             for wx in [left_wheel_x, right_wheel_x]:
                 pygame.draw.circle(surf, (25,25,25), (wx, wheel_y), wheel_radius)
                 pygame.draw.circle(surf, (140,140,140), (wx, wheel_y), wheel_radius - 4)
                     
         wheel_radius = int(6 * self.scale)
-        wheel_y = self.y + self.height//2 - int(wheel_radius * 0.5)
+        wheel_y = y + self.height//2 - int(wheel_radius * 0.5)
 
         if self.kind == "bus":
-            left_wheel_x = self.x + int(15 * self.scale)
-            right_wheel_x = self.x + self.width - int(15 * self.scale)
+            left_wheel_x = x + int(15 * self.scale)
+            right_wheel_x = x + self.width - int(15 * self.scale)
         else:
-            left_wheel_x = self.x + int(7 * self.scale)
-            right_wheel_x = self.x + self.width - int(7 * self.scale)
+            left_wheel_x = x + int(7 * self.scale)
+            right_wheel_x = x + self.width - int(7 * self.scale)
 
         for wx in [left_wheel_x, right_wheel_x]:
             pygame.draw.circle(surf, (30, 30, 30), (wx, wheel_y), wheel_radius)
             pygame.draw.circle(surf, (120,120,120), (wx, wheel_y), wheel_radius - 2)
 
         pygame.draw.circle(surf, (255,255,200), 
-            (self.x + self.width - int(4 * self.scale), self.y - int(6 * self.scale)),
+            (x + self.width - int(4 * self.scale), y - int(6 * self.scale)),
             int(3 * self.scale))
 
+class LaneIndex:
+    """Indeks kendaraan per lajur (kunci: y), tiap lajur terurut menurut x.
+
+    Kendaraan hanya bergerak maju dan tidak saling menyalip, jadi urutan
+    hampir selalu tetap; resort() cukup insertion sort O(n) per tick.
+    Posisi kendaraan di lajurnya disimpan di `lane_slot` sehingga
+    leader() (kendaraan terdekat di depan) rata-rata O(1).
+    """
+    def __init__(self):
+        self.lanes = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, v):
+        lane = self.lanes.setdefault(v.y, [])
+        lo, hi = 0, len(lane)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if lane[mid].x <= v.x:
+                lo = mid + 1
+            else:
+                hi = mid
+        lane.insert(lo, v)
+        self._renumber(lane, lo)
+        self.count += 1
+
+    def remove(self, v):
+        lane = self.lanes[v.y]
+        i = self._slot(lane, v)
+        lane.pop(i)
+        self._renumber(lane, i)
+        self.count -= 1
+
+    def remove_all(self, vehicles):
+        """Hapus banyak kendaraan sekaligus (misalnya hasil culling)"""
+        gone = {id(v) for v in vehicles}
+        for y in {v.y for v in vehicles}:
+            lane = self.lanes[y]
+            kept = [v for v in lane if id(v) not in gone]
+            self.count -= len(lane) - len(kept)
+            self.lanes[y] = kept
+            self._renumber(kept, 0)
+
+    def leader(self, v):
+        """Kendaraan terdekat dengan x lebih besar di lajur yang sama, atau None"""
+        lane = self.lanes.get(v.y)
+        if not lane:
+            return None
+        i = self._slot(lane, v) + 1
+        while i < len(lane) and lane[i].x <= v.x:
+            i += 1
+        return lane[i] if i < len(lane) else None
+
+    def load(self, keys, vehicles):
+        """Isi ulang indeks dari kendaraan yang sudah terurut per lajur (dari snapshot);
+        `keys` menjaga urutan lajur, termasuk lajur yang sedang kosong"""
+        self.lanes = {y: [] for y in keys}
+        for v in vehicles:
+            self.lanes[v.y].append(v)
+        for lane in self.lanes.values():
+            self._renumber(lane, 0)
+        self.count = len(vehicles)
+
+    def within(self, rect, margin=0):
+        """Kendaraan di lajur dengan y di dalam rect (dilebarkan `margin`) dan x di dalam
+        rentang rect; dicari dengan bisect per lajur, jadi biayanya mengikuti jumlah
+        kendaraan yang terlihat. Tiap lajur dari depan ke belakang (urutan kemunculan)."""
+        out = []
+        for y, lane in self.lanes.items():
+            if not rect.top - margin <= y < rect.bottom + margin:
+                continue
+            lo = self._bisect(lane, rect.left - margin)
+            hi = self._bisect(lane, rect.right + margin)
+            out.extend(reversed(lane[lo:hi]))
+        return out
+
+    def front_to_back(self):
+        """Urutan update: kendaraan terdepan di tiap lajur lebih dulu"""
+        for lane in self.lanes.values():
+            for i in range(len(lane) - 1, -1, -1):
+                yield lane[i]
+
+    def resort(self):
+        for lane in self.lanes.values():
+            for i in range(1, len(lane)):
+                v = lane[i]
+                j = i - 1
+                while j >= 0 and lane[j].x > v.x:
+                    lane[j + 1] = lane[j]
+                    j -= 1
+                lane[j + 1] = v
+            self._renumber(lane, 0)
+
+    @staticmethod
+    def _bisect(lane, x):
+        """Indeks kendaraan pertama di lajur dengan x >= `x`"""
+        lo, hi = 0, len(lane)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if lane[mid].x < x:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _slot(self, lane, v):
+        i = getattr(v, "lane_slot", -1)
+        if 0 <= i < len(lane) and lane[i] is v:
+            return i
+        return next(i for i, other in enumerate(lane) if other is v)
+
+    @staticmethod
+    def _renumber(lane, start):
+        for i in range(start, len(lane)):
+            lane[i].lane_slot = i
+
+class VehicleView(Vehicle):
+    """Satu baris VehicleArrays dalam bentuk mirip Vehicle, hanya untuk draw()"""
+    def __init__(self, kind, x, y, scale, color):
+        self.kind = kind
+        self.x = x
+        self.y = y
+        self.scale = scale
+        self.color = color
+        self.width, self.height = Vehicle.dimensions(kind, scale)
+
+class VehicleArrays:
+    """Engine kendaraan struct-of-arrays (NumPy) untuk SmartCitySim(engine="numpy").
+
+    Semua kendaraan disimpan dalam array x/y/speed/width/kind/lane yang selalu
+    terurut menurut (lane, x). Satu step() menghitung lampu merah, jarak ke
+    kendaraan di depan, maju dan culling sebagai operasi vektor. Berbeda dari
+    engine objek, jarak aman dihitung dari posisi kendaraan depan sebelum
+    bergerak pada tick yang sama (reaksi terlambat satu tick).
+    """
+    KINDS = ("car", "bus", "bike")
+    LANE_SPAN = 1e6
+    FIELDS = {"x": np.float64, "prev_x": np.float64, "speed": np.float64, "width": np.float64,
+              "kind": np.int8, "lane": np.int32, "color": np.int8, "seq": np.int64,
+              "exhaust": np.int16}
+
+    def __init__(self, scale=1.3, capacity=1024, particles=None):
+        self.scale = scale
+        self.particles = particles
+        self.stop_cache = (None, None)
+        self.n = 0
+        self.next_seq = 0
+        self.lane_ids = {}
+        self.lane_y = []
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        old = getattr(self, "x", None)
+        for name, dtype in self.FIELDS.items():
+            arr = np.zeros(capacity, dtype=dtype)
+            if old is not None:
+                arr[:self.n] = getattr(self, name)[:self.n]
+            setattr(self, name, arr)
+
+    def __len__(self):
+        return self.n
+
+    def add(self, kind, x, y, speed, color=0):
+        if self.n == len(self.x):
+            self._alloc(2 * len(self.x))
+        lane = self.lane_ids.get(y)
+        if lane is None:
+            lane = self.lane_ids[y] = len(self.lane_y)
+            self.lane_y.append(y)
+        n = self.n
+        key = self._keys()
+        i = int(np.searchsorted(key, lane * self.LANE_SPAN + x, side="right"))
+        values = {"x": x, "prev_x": x, "speed": speed, "width": Vehicle.dimensions(kind, self.scale)[0],
+                  "kind": self.KINDS.index(kind), "lane": lane, "color": color,
+                  "seq": self.next_seq, "exhaust": 0}
+        for name, value in values.items():
+            arr = getattr(self, name)
+            arr[i+1:n+1] = arr[i:n]
+            arr[i] = value
+        self.n += 1
+        self.next_seq += 1
+
+    def remove_last(self, kind=None):
+        """Hapus kendaraan yang paling akhir ditambahkan (seperti remove_vehicle)"""
+        n = self.n
+        candidates = np.ones(n, dtype=bool) if kind is None else self.kind[:n] == self.KINDS.index(kind)
+        if not candidates.any():
+            return None
+        i = int(np.argmax(np.where(candidates, self.seq[:n], -1)))
+        removed = self.KINDS[self.kind[i]]
+        for name in self.FIELDS:
+            arr = getattr(self, name)
+            arr[i:n-1] = arr[i+1:n]
+        self.n -= 1
+        return removed
+
+    def step(self, network=None):
+        """Satu tick untuk semua kendaraan; kembalikan {kind: (dihapus, keluar_kanan)}"""
+        n = self.n
+        if n == 0:
+            return {}
+        x = self.x[:n]
+        lane = self.lane[:n]
+        move = np.ones(n, dtype=bool)
+
+        if network is not None and network.lights:
+            # Garis berhenti berikutnya per kendaraan: kunci (lajur, x) pertama yang lebih besar
+            stop_key, stop_lane, stop_x, stop_light = self.stops(network)
+            if len(stop_key):
+                i = np.minimum(np.searchsorted(stop_key, self._keys(), side="right"), len(stop_key) - 1)
+                ahead = (stop_lane[i] == lane) & (stop_x[i] > x)
+                red = network.red_mask()[stop_light[i]]
+                move &= ~(ahead & red & (stop_x[i] - x < 140))
+
+        # Kendaraan terdekat di depan: kunci pertama yang lebih besar di lajur sama
+        key = self._keys()
+        nxt = np.minimum(np.searchsorted(key, key, side="right"), n - 1)
+        gap = np.where(lane[nxt] == lane, x[nxt] - x, np.inf)
+        gap[gap <= 0] = np.inf
+        move &= gap >= self.width[:n] * 1.6
+
+        self.prev_x[:n] = x
+        x += np.where(move, self.speed[:n], 0.0)
+
+        # Asap knalpot mobil tiap 11 tick bergerak, sama seperti Vehicle.update
+        if self.particles is not None:
+            timer = self.exhaust[:n]
+            timer[move & (self.kind[:n] == 0)] += 1
+            fire = np.flatnonzero(timer > 10)
+            if len(fire):
+                timer[fire] = 0
+                lane_y = np.asarray(self.lane_y, dtype=np.float64)
+                self.particles.emit_many(x[fire] - 5, lane_y[lane[fire]] + 5, (80,80,80), vx=-0.5, vy=0)
+
+        x_end = (network.x_max if network is not None else WIDTH) + 200
+        keep = (x > -200) & (x < x_end) & (self.kind[:n] != self.KINDS.index("bike"))
+        removed = {}
+        if not keep.all():
+            gone_kinds = self.kind[:n][~keep]
+            exited = x[~keep] >= x_end
+            for k, name in enumerate(self.KINDS):
+                mask = gone_kinds == k
+                if mask.any():
+                    removed[name] = (int(mask.sum()), int(exited[mask].sum()))
+            self._compact(keep)
+
+        key = self._keys()
+        if self.n > 1 and (key[1:] < key[:-1]).any():
+            self._compact(np.argsort(key, kind="stable"))
+        return removed
+
+    def stops(self, network):
+        """RoadNetwork.stop_table untuk lajur saat ini, dihitung ulang hanya jika
+        jaringan atau daftar lajur berubah"""
+        key = (id(network), network.version, len(self.lane_y))
+        if self.stop_cache[0] != key:
+            self.stop_cache = (key, network.stop_table(self.lane_y))
+        return self.stop_cache[1]
+
+    def counts(self):
+        counts = np.bincount(self.kind[:self.n], minlength=len(self.KINDS))
+        return {name: int(c) for name, c in zip(self.KINDS, counts)}
+
+    def views(self, alpha=1.0, rect=None, margin=0):
+        """VehicleView untuk setiap kendaraan (urut x per lajur), dipakai saat menggambar.
+        alpha < 1 menginterpolasi x antara tick sebelumnya dan sekarang. Dengan `rect`
+        (dilebarkan `margin`) hanya kendaraan di dalamnya, lewat searchsorted per lajur."""
+        n = self.n
+        idx = slice(0, n) if rect is None else self.within(rect, margin)
+        xs = self.x[idx]
+        if alpha < 1.0:
+            prev = self.prev_x[idx]
+            xs = prev + (xs - prev) * alpha
+        out = []
+        for x, kind, lane, color in zip(xs.tolist(), self.kind[idx].tolist(),
+                                        self.lane[idx].tolist(), self.color[idx].tolist()):
+            name = self.KINDS[kind]
+            body = Vehicle.CAR_COLORS[color] if name == "car" else (30,130,230) if name == "bus" else (40,180,40)
+            out.append(VehicleView(name, x, self.lane_y[lane], self.scale, body))
+        return out
+
+    def within(self, rect, margin=0):
+        """Indeks kendaraan di dalam rect; baris terurut per (lajur, x), jadi setiap lajur
+        yang terlihat cukup dua searchsorted"""
+        lane, x = self.lane[:self.n], self.x[:self.n]
+        parts = []
+        for i, y in enumerate(self.lane_y):
+            if not rect.top - margin <= y < rect.bottom + margin:
+                continue
+            start, end = np.searchsorted(lane, [i, i + 1])
+            lo, hi = np.searchsorted(x[start:end], [rect.left - margin, rect.right + margin])
+            parts.append(np.arange(start + lo, start + hi))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.intp)
+
+    def _keys(self):
+        return self.lane[:self.n] * self.LANE_SPAN + self.x[:self.n]
+
+    def _compact(self, index):
+        """Ambil ulang baris aktif memakai mask boolean atau permutasi"""
+        n = self.n
+        for name in self.FIELDS:
+            arr = getattr(self, name)
+            picked = arr[:n][index]
+            arr[:len(picked)] = picked
+        self.n = len(picked)
+
 class Tree:
-    def __init__(self, x, ground_y, stage=0):
+    SNAPSHOT = {"x": "n", "ground_y": "n", "y": "n", "stage": "i", "watered": "b", "growth_timer": "i",
+                "sway": "i", "reward_given": "b", "has_fruit": "b", "fruit_respawn_timer": "i"}
+
+    GROW_TICKS = 3 * SIM_HZ
+    FRUIT_TICKS = 5 * SIM_HZ
+    # Urutan event pohon di tick yang sama: setelah lampu (0) dan spawn kendaraan (1)
+    EVENT_ORDER = 2
+
+    def __init__(self, x, ground_y, stage=0, particles=None, rng=random, scheduler=None):
+        self.rng = rng
+        # Pohon tidak di-update per tick: tumbuh dan berbuah lewat event scheduler,
+        # goyangan diturunkan dari jam. Tanpa scheduler simulasi pohon tetap diam.
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
         self.x = x
         self.ground_y = ground_y
         self.stage = stage
         self.watered = False
-        self.growth_timer = 0
-        self.sway = random.randint(0, 360)
-        self.sparkles = []
+        self.sway_offset = rng.randint(0, 360) - self.scheduler.tick
+        self.particles = particles
         self.reward_given = False
         self.y = self.ground_y
         self.has_fruit = False
-        self.fruit_respawn_timer = 0
+        self.watered_at = None
+        self.fruit_since = None
+        self.events = []
+        if stage == 3:
+            self.fruit_since = self.scheduler.tick
+        self.schedule()
+
+    @property
+    def sway(self):
+        return (self.sway_offset + self.scheduler.tick) % 360
+
+    @property
+    def depth_y(self):
+        return self.ground_y
+
+    @property
+    def growth_timer(self):
+        """Tick sejak disiram (0 jika belum disiram)"""
+        return self.scheduler.tick - self.watered_at if self.watered else 0
+
+    @property
+    def fruit_respawn_timer(self):
+        """Tick menunggu buah pada tahap 3 (0 jika tidak sedang menunggu)"""
+        return self.scheduler.tick - self.fruit_since if self.fruit_since is not None else 0
+
+    def resume(self, growth_timer, sway, fruit_respawn_timer):
+        """Pasang ulang timer dari nilai snapshot, lalu jadwalkan event yang tertunda"""
+        tick = self.scheduler.tick
+        self.sway_offset = sway - tick
+        self.watered_at = tick - growth_timer if self.watered else None
+        self.fruit_since = tick - fruit_respawn_timer if self.stage == 3 and not self.has_fruit else None
+        self.schedule()
+
+    def schedule(self):
+        self.cancel()
+        at, order = self.scheduler.at, self.EVENT_ORDER
+        if self.watered:
+            self.events.append(at(self.watered_at + self.GROW_TICKS + 1, self.grow, order=order))
+            self.schedule_sparkle()
+        if self.fruit_since is not None:
+            self.events.append(at(self.fruit_since + self.FRUIT_TICKS + 1, self.fruit_ready, order=order))
+
+    def cancel(self):
+        """Batalkan semua event pohon, misalnya saat pohon dihapus dari simulasi"""
+        for event in self.events:
+            Scheduler.cancel(event)
+        self.events = []
+
+    def schedule_sparkle(self):
+        # Selama disiram, tiap tick berpeluang 10% memancarkan partikel: jeda ke
+        # partikel berikutnya diambil sekali dari distribusi geometrik
+        if self.particles is not None:
+            delay = int(self.particles.rng.geometric(0.1))
+            self.events.append(self.scheduler.after(delay, self.sparkle, order=self.EVENT_ORDER))
 
     def water(self):
-        self.watered = True
-        for _ in range(10):
-            p = Particle(self.x, self.ground_y-5, (100,150,255), 
-                        vx=random.uniform(-2,2), vy=random.uniform(-3,-1))
-            self.sparkles.append(p)
+        if not self.watered:
+            self.watered = True
+            self.watered_at = self.scheduler.tick
+            self.schedule()
+        if self.particles is not None:
+            self.particles.emit(self.x, self.ground_y-5, (100,150,255),
+                                vx=(-2, 2), vy=(-3, -1), count=10)
 
-    def update(self):
-        self.sway = (self.sway + 1) % 360
-        
+    def sparkle(self):
+        # Partikel kosmetik memakai RNG milik ParticleSystem, bukan RNG simulasi
         if self.watered:
-            self.growth_timer += 1
-            if random.random() < 0.1:
-                p = Particle(self.x + random.randint(-10,10), 
-                        self.ground_y - 20 - self.stage*5,
-                        (100,255,100), vx=0, vy=-1)
-                self.sparkles.append(p)
-                
-            if self.growth_timer > 3*FPS:
-                self.stage = min(3, self.stage + 1)
-                self.growth_timer = 0
-                self.watered = False
-                self.reward_given = True  
-
-                for _ in range(20):
-                    p = Particle(self.x, self.ground_y - 20,
-                            (50,255,50), vx=random.uniform(-3,3), vy=random.uniform(-5,-2))
-                    self.sparkles.append(p)
-
-        for p in self.sparkles:
-            p.update()
-        self.sparkles = [p for p in self.sparkles if p.life > 0]
+            self.particles.emit(self.x + int(self.particles.rng.integers(-10, 11)),
+                                self.ground_y - 20 - self.stage*5,
+                                (100,255,100), vx=0, vy=-1)
+            self.schedule_sparkle()
+
+    def grow(self):
+        self.stage = min(3, self.stage + 1)
+        self.watered = False
+        self.watered_at = None
+        self.reward_given = True
 
-        if self.stage == 3 and not self.has_fruit:
-            self.fruit_respawn_timer += 1
-            if self.fruit_respawn_timer > FPS * 5:
-                self.fruit_respawn_timer = 0
-                self.grow_fruit()
+        if self.particles is not None:
+            self.particles.emit(self.x, self.ground_y - 20, (50,255,50),
+                                vx=(-3, 3), vy=(-5, -2), count=20)
+        if self.stage == 3 and not self.has_fruit and self.fruit_since is None:
+            # Hitungan buah ikut berjalan di tick tumbuhnya
+            self.fruit_since = self.scheduler.tick - 1
+        self.schedule()
+
+    def fruit_ready(self):
+        self.fruit_since = None
+        self.grow_fruit()
+
+    def digest_fields(self):
+        """Nilai yang menentukan state pohon, untuk state_digest() simulasi"""
+        return (self.x, self.ground_y, self.stage, self.watered, self.growth_timer, self.sway,
+                self.has_fruit, self.fruit_respawn_timer, getattr(self, "fruit_positions", None))
 
     def grow_fruit(self):
         self.has_fruit = True
@@ -329,65 +1654,107 @@ class Tree:
         leaf_radius = 20 + self.stage * 20
         trunk_h = 20 + self.stage * 35
         foliage_y = self.ground_y - trunk_h - leaf_radius//2
-        fruit_count = random.randint(3, 6)
+        fruit_count = self.rng.randint(3, 6)
 
         for _ in range(fruit_count):
-            radius = random.randint(int(leaf_radius * 0.3), int(leaf_radius * 0.8))
-            angle = random.uniform(0.5, 2.5)
+            radius = self.rng.randint(int(leaf_radius * 0.3), int(leaf_radius * 0.8))
+            angle = self.rng.uniform(0.5, 2.5)
             fx = self.x + math.cos(angle) * radius
-            fy = foliage_y + math.sin(angle) * radius + random.randint(5, 15)
+            fy = foliage_y + math.sin(angle) * radius + self.rng.randint(5, 15)
             self.fruit_positions.append((fx, fy))
 
-    def draw(self, surf):
-        for p in self.sparkles:
-            p.draw(surf)
-            
-        y = self.ground_y
-        
+    def sprite_bounds(self, stage=None):
+        if stage is None:
+            stage = self.stage
+        trunk_h = 20 + stage*35
+        leaf_radius = 20 + stage*20
+        ox = leaf_radius + 6
+        oy = trunk_h + leaf_radius//2 + leaf_radius + 8
+        return ox, oy, 2 * ox, oy + 6
+
+    def crown_blit(self):
+        """(sprite batang+daun, posisi) dari atlas, atau None jika harus primitif"""
+        if not SPRITES.enabled or self.x != int(self.x):
+            return None
+        ox, oy, w, h = self.sprite_bounds()
+        # Untuk x bulat, int(x + sway_offset) hanya bergantung pada floor(sway_offset)
+        sway_step = math.floor(math.sin(math.radians(self.sway)) * (self.stage * 0.5))
+        sprite = SPRITES.get(("tree", self.stage, sway_step), (w, h),
+                             lambda s: self.draw_shape(s, ox, oy, sway_step))
+        return sprite, (int(self.x) - ox, self.ground_y - oy)
+
+    def sprite_blit(self):
+        # Pohon berbuah perlu buah digambar di atas sprite, jadi tidak ikut batch
+        if self.stage and self.has_fruit:
+            return None
+        return self.crown_blit()
+
+    def bounds(self, stage=None):
+        # Buah bisa bergoyang sedikit keluar dari mahkota, jadi diberi margin
+        ox, oy, w, h = self.sprite_bounds(stage)
+        return pygame.Rect(int(self.x) - ox - 16, self.ground_y - oy - 16, w + 32, h + 32)
+
+    def reach(self):
+        """bounds() pohon dewasa; pohon dicatat di indeks spasial dengan kotak ini
+        supaya tidak perlu dipindah sel setiap kali tumbuh"""
+        return self.bounds(3)
+
+    def draw(self, surf, offset=(0, 0)):
+        ox, oy = offset
+        item = self.crown_blit()
+        if item is None:
+            self.draw_shape(surf, self.x + ox, self.ground_y + oy,
+                            math.sin(math.radians(self.sway)) * (self.stage * 0.5))
+        else:
+            sprite, (x, y) = item
+            surf.blit(sprite, (x + ox, y + oy))
+
+        if self.stage and self.has_fruit:
+            for i, (fx, fy) in enumerate(self.fruit_positions):
+                sway_offset = math.sin(math.radians(self.sway + i*30)) * 3
+                draw_x = fx + sway_offset + ox
+                draw_y = fy + sway_offset/2 + oy
+                pygame.draw.circle(surf, (255, 60, 60), (int(draw_x), int(draw_y)), 10)
+                pygame.draw.circle(surf, (200, 30, 30), (int(draw_x), int(draw_y)), 10, 2)
+
+    def draw_shape(self, surf, x, y, sway_offset):
         if self.stage == 0:
-            pygame.draw.circle(surf, (139,69,19), (int(self.x), y-3), 4)
-            pygame.draw.circle(surf, (100,50,10), (int(self.x), y-3), 4, 1)
+            pygame.draw.circle(surf, (139,69,19), (int(x), y-3), 4)
+            pygame.draw.circle(surf, (100,50,10), (int(x), y-3), 4, 1)
         else:
             trunk_h = 20 + self.stage*35
-            sway_offset = math.sin(math.radians(self.sway)) * (self.stage * 0.5)
             trunk_width = 10 + self.stage * 8
 
-            trunk_rect = pygame.Rect(self.x - trunk_width // 2, y - trunk_h, trunk_width, trunk_h)
+            trunk_rect = pygame.Rect(x - trunk_width // 2, y - trunk_h, trunk_width, trunk_h)
             pygame.draw.rect(surf, (120,80,50), trunk_rect, border_radius=4)
             pygame.draw.rect(surf, (90,60,30), trunk_rect, 2, border_radius=4)
 
             for i in range(0, trunk_h, 8):
-                pygame.draw.line(surf, (100,70,40), (self.x-4, y-trunk_h+i), (self.x+4, y-trunk_h+i), 1)
+                pygame.draw.line(surf, (100,70,40), (x-4, y-trunk_h+i), (x+4, y-trunk_h+i), 1)
             
             leaf_radius = 20 + self.stage*20
             foliage_y = y - trunk_h - leaf_radius//2
             
-            pygame.draw.circle(surf, (20,100,20), (int(self.x + sway_offset), foliage_y), leaf_radius)
-            pygame.draw.circle(surf, (40,160,40), (int(self.x + sway_offset), foliage_y-3), leaf_radius-2)
-            pygame.draw.circle(surf, (60,200,60), (int(self.x + sway_offset-3), foliage_y-5), leaf_radius//2)
+            pygame.draw.circle(surf, (20,100,20), (int(x + sway_offset), foliage_y), leaf_radius)
+            pygame.draw.circle(surf, (40,160,40), (int(x + sway_offset), foliage_y-3), leaf_radius-2)
+            pygame.draw.circle(surf, (60,200,60), (int(x + sway_offset-3), foliage_y-5), leaf_radius//2)
             
             if self.stage >= 2:
                 pygame.draw.circle(surf, (30,140,30), 
-                    (int(self.x-leaf_radius//2 + sway_offset), foliage_y+5), leaf_radius//2)
+                    (int(x-leaf_radius//2 + sway_offset), foliage_y+5), leaf_radius//2)
                 pygame.draw.circle(surf, (30,140,30), 
-                    (int(self.x+leaf_radius//2 + sway_offset), foliage_y+5), leaf_radius//2)
-                    
-            if self.has_fruit:
-                for i, (fx, fy) in enumerate(self.fruit_positions):
-                    sway_offset = math.sin(math.radians(self.sway + i*30)) * 3
-                    draw_x = fx + sway_offset
-                    draw_y = fy + sway_offset/2
-                    pygame.draw.circle(surf, (255, 60, 60), (int(draw_x), int(draw_y)), 10)
-                    pygame.draw.circle(surf, (200, 30, 30), (int(draw_x), int(draw_y)), 10, 2)
+                    (int(x+leaf_radius//2 + sway_offset), foliage_y+5), leaf_radius//2)
 
 class RewardEffect:
-    def __init__(self, x, y, kind="star"):
+    SNAPSHOT = {"x": "n", "y": "n", "kind": "s", "life": "i", "vx": "f", "vy": "f"}
+
+    def __init__(self, x, y, kind="star", rng=random):
         self.x = x
         self.y = y
         self.kind = kind
         self.life = 100
-        self.vx = random.uniform(-1, 1)
-        self.vy = random.uniform(-2, -0.5)
+        self.vx = rng.uniform(-1, 1)
+        self.vy = rng.uniform(-2, -0.5)
 
     def update(self):
         self.x += self.vx
@@ -403,212 +1770,1075 @@ class RewardEffect:
         elif self.kind == "rainbow":
             pygame.draw.arc(surf, (255,100,100), (self.x-30, self.y-40, 60, 40), 0, 3.14)
 
+    def bounds(self):
+        return pygame.Rect(int(self.x) - 32, int(self.y) - 42, 64, 50)
+
 class Building:
-    def __init__(self, x, y, w, h, color):
+    WINDOW_W, WINDOW_H = 18, 20
+    SPACING_X, SPACING_Y = 25, 30
+    MARGIN_X, MARGIN_Y = 10, 15
+
+    def __init__(self, x, y, w, h, color, rng=random):
         self.x, self.y, self.w, self.h = x, y, w, h
         self.color = color
-        self.window_lights = [[random.random() > 0.3 for _ in range(w//25)] 
+        self.window_lights = [[rng.random() > 0.3 for _ in range(w//25)] 
                              for _ in range(h//30)]
+        # Gedung dirender sekali ke sprite (bayangan, sisi, atap, jendela);
+        # dirender ulang hanya jika ukuran/warna berubah atau lewat set_window()
+        self.sprite = None
+        self.sprite_key = None
         
-    def draw(self, surf):
-        shadow_surf = pygame.Surface((self.w+10, self.h+10), pygame.SRCALPHA)
-        pygame.draw.rect(shadow_surf, (0,0,0,40), (0, 0, self.w+10, self.h+10))
-        surf.blit(shadow_surf, (self.x+8, self.y+8))
+    def draw(self, surf, offset=(0, 0)):
+        pos = (self.x + offset[0], self.y - 10 + offset[1])
+        if self.sprite is None or self.sprite_key != (self.w, self.h, self.color):
+            self.render_sprite()
+            DIRTY.add(self.sprite.get_rect(topleft=pos))
+        surf.blit(self.sprite, pos)
+
+    def bounds(self):
+        return pygame.Rect(self.x, self.y - 10, self.w + 18, self.h + 28)
+
+    def invalidate(self):
+        self.sprite = None
+
+    def set_window(self, row, col, is_lit):
+        """Nyalakan/matikan satu jendela dan perbarui hanya area jendela itu di sprite"""
+        if self.window_lights[row][col] == is_lit:
+            return
+        self.window_lights[row][col] = is_lit
+        if self.sprite is not None:
+            pos = self.window_pos(row, col)
+            if pos is not None:
+                wx, wy = pos
+                self.sprite.fill(self.color, (wx-1, wy-1, self.WINDOW_W+2, self.WINDOW_H+2))
+                self.draw_window(self.sprite, wx, wy, is_lit)
+                DIRTY.add((self.x + wx - 1, self.y - 10 + wy - 1, self.WINDOW_W + 2, self.WINDOW_H + 2))
+
+    def window_pos(self, row, col):
+        """Posisi jendela relatif terhadap sprite, atau None jika tidak muat di fasad"""
+        wx = self.MARGIN_X + col * self.SPACING_X
+        wy = 10 + self.MARGIN_Y + row * self.SPACING_Y
+        if wx + self.WINDOW_W > self.w - self.MARGIN_X:
+            return None
+        if wy + self.WINDOW_H > 10 + self.h - self.MARGIN_Y:
+            return None
+        return wx, wy
+
+    def draw_window(self, surf, wx, wy, is_lit):
+        pygame.draw.rect(surf, (40,40,50), (wx-1, wy-1, self.WINDOW_W+2, self.WINDOW_H+2), border_radius=2)
+        color = (255,250,200) if is_lit else (50,50,70)
+        pygame.draw.rect(surf, color, (wx, wy, self.WINDOW_W, self.WINDOW_H), border_radius=2)
+
+        # Glow lama (alpha 80 berwarna sama di atas jendela) tidak mengubah piksel, jadi dilewati
+        if is_lit:
+            pygame.draw.rect(surf, (200,190,140), (wx, wy, self.WINDOW_W, 6))
+
+    def render_sprite(self):
+        # Origin sprite = (x, y - 10) supaya atap miring ikut tergambar
+        x, y, w, h = 0, 10, self.w, self.h
+        sprite = pygame.Surface((w + 18, h + 28), pygame.SRCALPHA)
+        pygame.draw.rect(sprite, (0,0,0,40), (x+8, y+8, w+10, h+10))
         
         side_color = tuple(max(0, c-40) for c in self.color)
-        side_points = [(self.x + self.w, self.y), (self.x + self.w + 15, self.y + 15),
-                      (self.x + self.w + 15, self.y + self.h + 15), (self.x + self.w, self.y + self.h)]
-        pygame.draw.polygon(surf, side_color, side_points)
+        side_points = [(x + w, y), (x + w + 15, y + 15),
+                      (x + w + 15, y + h + 15), (x + w, y + h)]
+        pygame.draw.polygon(sprite, side_color, side_points)
         
         top_color = tuple(min(255, c+20) for c in self.color)
-        top_points = [(self.x, self.y), (self.x + 15, self.y - 10),
-                     (self.x + self.w + 15, self.y - 10), (self.x + self.w, self.y)]
-        pygame.draw.polygon(surf, top_color, top_points)
-        
-        pygame.draw.rect(surf, self.color, (self.x, self.y, self.w, self.h))
-        pygame.draw.rect(surf, (0,0,0), (self.x, self.y, self.w, self.h), 2)
+        top_points = [(x, y), (x + 15, y - 10),
+                     (x + w + 15, y - 10), (x + w, y)]
+        pygame.draw.polygon(sprite, top_color, top_points)
         
-        WINDOW_W, WINDOW_H = 18, 20
-        SPACING_X, SPACING_Y = 25, 30
-        MARGIN_X, MARGIN_Y = 10, 15
+        pygame.draw.rect(sprite, self.color, (x, y, w, h))
+        pygame.draw.rect(sprite, (0,0,0), (x, y, w, h), 2)
 
         for row, lights_row in enumerate(self.window_lights):
             for col, is_lit in enumerate(lights_row):
-                wx = self.x + MARGIN_X + col * SPACING_X
-                wy = self.y + MARGIN_Y + row * SPACING_Y
-
-                if wx + WINDOW_W > self.x + self.w - MARGIN_X: 
-                    break  
-                if wy + WINDOW_H > self.y + self.h - MARGIN_Y: 
+                pos = self.window_pos(row, col)
+                if pos is None:
                     continue
+                self.draw_window(sprite, pos[0], pos[1], is_lit)
 
-                pygame.draw.rect(surf, (40,40,50), (wx-1, wy-1, WINDOW_W+2, WINDOW_H+2), border_radius=2)
-                color = (255,250,200) if is_lit else (50,50,70)
-                pygame.draw.rect(surf, color, (wx, wy, WINDOW_W, WINDOW_H), border_radius=2)
+        self.sprite = sprite
+        self.sprite_key = (self.w, self.h, self.color)
 
-                if is_lit:
-                    glow = pygame.Surface((SPACING_X, SPACING_Y), pygame.SRCALPHA)
-                    pygame.draw.rect(glow, (255,250,200,80), (3, 3, WINDOW_W, WINDOW_H), border_radius=2)
-                    surf.blit(glow, (wx-3, wy-3))
-                    pygame.draw.rect(surf, (200,190,140), (wx, wy, WINDOW_W, 6))
+class LayerCache:
+    """Cache Surface untuk lapisan latar yang statis atau jarang berubah.
 
-class SmartCitySim:
+    Setiap lapisan disimpan per nama bersama kuncinya (misalnya warna langit
+    yang sudah dikuantisasi). get() hanya merender ulang jika kuncinya berubah,
+    sehingga satu frame cukup satu blit per lapisan.
+    """
     def __init__(self):
+        self.layers = {}
+
+    def get(self, name, key, render, size=(WIDTH, HEIGHT), alpha=False):
+        cached = self.layers.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        layer = pygame.Surface(size, pygame.SRCALPHA) if alpha else pygame.Surface(size)
+        render(layer)
+        self.layers[name] = (key, layer)
+        return layer
+
+    def blit(self, surf, name, key, render, pos=(0, 0), size=(WIDTH, HEIGHT), alpha=False):
+        """Blit lapisan ke surf; area lapisan ditandai DIRTY hanya saat dirender ulang"""
+        cached = self.layers.get(name)
+        layer = self.get(name, key, render, size, alpha)
+        if cached is None or cached[1] is not layer:
+            DIRTY.add(pygame.Rect(pos, size))
+        surf.blit(layer, pos)
+
+    def tile(self, surf, name, key, render, xs, y, size=(WIDTH, HEIGHT), alpha=False):
+        """Seperti blit(), tetapi lapisan diulang mendatar di setiap x pada `xs`"""
+        cached = self.layers.get(name)
+        layer = self.get(name, key, render, size, alpha)
+        for x in xs:
+            if cached is None or cached[1] is not layer:
+                DIRTY.add(pygame.Rect((x, y), size))
+            surf.blit(layer, (x, y))
+
+    def invalidate(self, name=None):
+        if name is None:
+            self.layers.clear()
+        else:
+            self.layers.pop(name, None)
+
+class Camera:
+    """Jendela pandang ke dunia yang bisa lebih besar dari layar.
+
+    (x, y) adalah titik dunia di pojok kiri atas layar dan `zoom` = piksel
+    layar per piksel dunia = ZOOM_STEP ** level, jadi level 0 tepat 1:1.
+    Kamera selalu dijepit di dalam dunia, dan zoom minimum dibatasi supaya
+    jendela tidak pernah lebih besar dari dunia.
+    """
+    MIN_ZOOM, MAX_ZOOM = 0.5, 3.0
+    ZOOM_STEP = 1.25
+
+    def __init__(self, world, size=(WIDTH, HEIGHT)):
+        self.world = world
+        self.size = size
+        self.x = self.y = 0
+        self.level = 0
+        self.zoom = 1.0
+
+    @property
+    def min_zoom(self):
+        return min(self.MAX_ZOOM, max(self.MIN_ZOOM, self.size[0] / self.world[0], self.size[1] / self.world[1]))
+
+    @property
+    def rect(self):
+        """Area dunia yang terlihat (Rect, koordinat dunia)"""
+        return pygame.Rect(self.x, self.y, math.ceil(self.size[0] / self.zoom), math.ceil(self.size[1] / self.zoom))
+
+    @property
+    def offset(self):
+        """Geseran dunia -> layar pada zoom 1"""
+        return -self.x, -self.y
+
+    @property
+    def key(self):
+        return self.x, self.y, self.zoom
+
+    def clamp(self):
+        lo = math.ceil(math.log(self.min_zoom, self.ZOOM_STEP) - 1e-9)
+        hi = math.floor(math.log(self.MAX_ZOOM, self.ZOOM_STEP) + 1e-9)
+        self.level = min(hi, max(lo, self.level))
+        self.zoom = self.ZOOM_STEP ** self.level
+        # Posisi dibulatkan ke piksel dunia supaya dunia dan overlay bergeser sama persis
+        self.x = max(0, min(round(self.x), int(self.world[0] - self.size[0] / self.zoom)))
+        self.y = max(0, min(round(self.y), int(self.world[1] - self.size[1] / self.zoom)))
+
+    def pan(self, dx, dy):
+        """Geser sejauh (dx, dy) piksel layar"""
+        self.x += dx / self.zoom
+        self.y += dy / self.zoom
+        self.clamp()
+
+    def zoom_by(self, steps, anchor=None):
+        """Zoom masuk (steps > 0) atau keluar sebanyak `steps` kali ZOOM_STEP; titik dunia
+        di bawah `anchor` (posisi layar, default tengah) tetap di tempat"""
+        ax, ay = anchor if anchor is not None else (self.size[0] / 2, self.size[1] / 2)
+        wx, wy = self.to_world((ax, ay))
+        self.level += steps
+        self.clamp()
+        self.x = wx - ax / self.zoom
+        self.y = wy - ay / self.zoom
+        self.clamp()
+
+    def to_world(self, pos):
+        return self.x + pos[0] / self.zoom, self.y + pos[1] / self.zoom
+
+    def to_screen(self, pos):
+        return (pos[0] - self.x) * self.zoom, (pos[1] - self.y) * self.zoom
+
+class SpatialHash:
+    """Grid seragam berukuran `cell` x `cell` piksel dunia untuk objek yang digambar.
+
+    Setiap objek dicatat di satu sel, yaitu sel pojok kiri atas kotaknya;
+    query(rect) melebarkan rect ke kiri dan ke atas sejauh kotak terbesar
+    yang pernah disisipkan lalu hanya membuka sel di area itu, jadi biayanya
+    mengikuti luas area yang ditanya, bukan jumlah objek di dunia. Hasil
+    query selalu dalam urutan penyisipan, sama seperti daftar asalnya.
+    """
+    def __init__(self, cell=256):
+        self.cell = cell
+        self.cells = {}     # (cx, cy) -> [(urutan sisip, objek)]
+        # id(objek) -> (urutan sisip, sel, objek); urutan dict = urutan sisip
+        self.entries = {}
+        self.reach = (0, 0)
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, x, y):
+        return x // self.cell, y // self.cell
+
+    def insert(self, obj, rect):
+        key = self.key(rect.left, rect.top)
+        self.entries[id(obj)] = (self.seq, key, obj)
+        self.cells.setdefault(key, []).append((self.seq, obj))
+        self.seq += 1
+        self.reach = (max(self.reach[0], rect.width), max(self.reach[1], rect.height))
+
+    def remove(self, obj):
+        entry = self.entries.pop(id(obj), None)
+        if entry is not None:
+            self._discard(obj, entry[0], entry[1])
+
+    def move(self, obj, rect):
+        """Perbarui kotak objek; sel hanya diganti jika pojok kiri atasnya pindah sel,
+        dan urutan objek tetap seperti saat pertama disisipkan"""
+        entry = self.entries.get(id(obj))
+        if entry is None:
+            self.insert(obj, rect)
+            return
+        seq, old, _ = entry
+        key = self.key(rect.left, rect.top)
+        if key != old:
+            self._discard(obj, seq, old)
+            self.entries[id(obj)] = (seq, key, obj)
+            self.cells.setdefault(key, []).append((seq, obj))
+        self.reach = (max(self.reach[0], rect.width), max(self.reach[1], rect.height))
+
+    def clear(self):
+        self.cells = {}
+        self.entries = {}
+        self.reach = (0, 0)
+
+    def query(self, rect):
+        rect = pygame.Rect(rect)
+        x0, y0 = self.key(rect.left - self.reach[0], rect.top - self.reach[1])
+        x1, y1 = self.key(rect.right, rect.bottom)
+        found = []
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.cells):
+            # Area lebih luas dari jumlah sel terisi: cukup periksa sel yang ada
+            inside = [bucket for (cx, cy), bucket in self.cells.items() if x0 <= cx <= x1 and y0 <= cy <= y1]
+            if len(inside) == len(self.cells):
+                # Semua sel terisi masuk: semua objek, sudah dalam urutan sisip
+                return [entry[2] for entry in self.entries.values()]
+            for bucket in inside:
+                found.extend(bucket)
+        else:
+            for cy in range(y0, y1 + 1):
+                for cx in range(x0, x1 + 1):
+                    found.extend(self.cells.get((cx, cy), ()))
+        found.sort()
+        return [obj for _, obj in found]
+
+    def _discard(self, obj, seq, key):
+        bucket = self.cells[key]
+        bucket.remove((seq, obj))
+        if not bucket:
+            del self.cells[key]
+
+class PollutionField:
+    """Medan polusi 2D: satu sel grid NumPy per `cell` x `cell` piksel dunia.
+
+    Setiap tick kendaraan menambah polusi di selnya (dikumpulkan sekaligus
+    lewat np.bincount), pohon menyerap di sekitar mahkotanya, lalu angin
+    (advection upwind) dan difusi dijalankan sebagai operasi array pada
+    seluruh grid. Polusi keluar lewat tepi grid searah angin; tepi lain
+    memantulkan difusi. `score` (0..1, 1 = udara bersih) diturunkan dari
+    rata-rata konsentrasi dan dipakai HUD sebagai kualitas udara.
+    """
+    EMISSION = {"car": 1.0, "bus": 2.5, "bike": 0.0}
+    # Serapan per tick per tahap pohon di zona serapnya, dan rata-rata
+    # konsentrasi saat kualitas udara dianggap 0
+    ABSORB = 0.05
+    LIMIT = 0.7
+
+    def __init__(self, width=WIDTH, height=HEIGHT, cell=10, wind=(0.3, -0.05), diffusion=0.15, decay=0.002):
+        if abs(wind[0]) + abs(wind[1]) + 4 * diffusion > 1:
+            raise ValueError("angin dan difusi terlalu besar untuk satu tick (|u| + |v| + 4D harus <= 1)")
+        self.cell = cell
+        self.cols = max(1, math.ceil(width / cell))
+        self.rows = max(1, math.ceil(height / cell))
+        self.wind = wind
+        self.diffusion = diffusion
+        self.decay = decay
+        self.field = np.zeros((self.rows, self.cols), dtype=np.float64)
+        self.buf = np.empty_like(self.field)
+        self.retain = np.ones_like(self.field)
+        self.trees_key = None
+        self.score = 1.0
+
+    def cells(self, xs, ys):
+        """Indeks sel datar untuk posisi dunia; -1 untuk posisi di luar grid"""
+        cx = np.floor_divide(xs, self.cell).astype(np.int64)
+        cy = np.floor_divide(ys, self.cell).astype(np.int64)
+        inside = (cx >= 0) & (cx < self.cols) & (cy >= 0) & (cy < self.rows)
+        return np.where(inside, cy * self.cols + cx, -1)
+
+    def emit(self, xs, ys, amounts):
+        """Tambahkan polusi di banyak titik sekaligus (satu bincount untuk semua emitor)"""
+        if len(xs) == 0:
+            return
+        idx = self.cells(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+        inside = idx >= 0
+        self.field += np.bincount(idx[inside], weights=np.broadcast_to(amounts, idx.shape)[inside],
+                                  minlength=self.rows * self.cols).reshape(self.rows, self.cols)
+
+    def set_trees(self, trees):
+        """Hitung ulang faktor serapan per sel, hanya jika posisi/tahap pohon berubah"""
+        key = tuple((t.x, t.ground_y, t.stage) for t in trees)
+        if key == self.trees_key:
+            return
+        self.trees_key = key
+        rate = np.zeros(self.rows * self.cols, dtype=np.float64)
+        yy, xx = np.mgrid[0:self.rows, 0:self.cols]
+        centers_x = (xx + 0.5) * self.cell
+        centers_y = (yy + 0.5) * self.cell
+        for x, ground_y, stage in key:
+            if stage == 0:
+                continue
+            # Zona serap: lingkaran yang mencakup batang dan mahkota, makin besar per tahap
+            trunk_h = 20 + stage * 35
+            leaf_radius = 20 + stage * 20
+            cy = ground_y - (trunk_h + leaf_radius) / 2
+            radius = (trunk_h + leaf_radius) / 2 + 40
+            near = (centers_x - x) ** 2 + (centers_y - cy) ** 2 <= radius ** 2
+            rate[near.ravel()] += self.ABSORB * stage
+        self.retain = np.exp(-rate).reshape(self.rows, self.cols)
+
+    def step(self):
+        f, out = self.field, self.buf
+        u, v = self.wind
+        # Advection upwind (donor cell): sebagian isi sel pindah ke tetangga searah angin
+        np.multiply(f, 1.0 - abs(u) - abs(v), out=out)
+        if u > 0:
+            out[:, 1:] += u * f[:, :-1]
+        elif u < 0:
+            out[:, :-1] -= u * f[:, 1:]
+        if v > 0:
+            out[1:, :] += v * f[:-1, :]
+        elif v < 0:
+            out[:-1, :] -= v * f[1:, :]
+        f, out = out, f
+
+        # Difusi 5 titik; di tepi sel bertukar dengan dirinya sendiri (fluks nol)
+        d = self.diffusion
+        np.multiply(f, 1.0 - 4 * d, out=out)
+        out[1:, :] += d * f[:-1, :]
+        out[:-1, :] += d * f[1:, :]
+        out[:, 1:] += d * f[:, :-1]
+        out[:, :-1] += d * f[:, 1:]
+        out[0, :] += d * f[0, :]
+        out[-1, :] += d * f[-1, :]
+        out[:, 0] += d * f[:, 0]
+        out[:, -1] += d * f[:, -1]
+
+        out *= self.retain
+        out *= 1.0 - self.decay
+        self.field, self.buf = out, f
+        self.score = max(0.0, 1.0 - float(out.mean()) / self.LIMIT)
+
+class Heatmap:
+    """Overlay peta panas dari array NumPy 2D (satu nilai per sel grid dunia).
+
+    Nilai dipetakan lewat tabel warna RGBA ke Surface kecil (satu piksel per
+    sel) yang dipakai ulang dan ditulis langsung lewat pygame.surfarray, lalu
+    diperbesar sekali ke Surface layar yang juga dipakai ulang. Tidak ada
+    alokasi Surface per frame.
+    """
+    # Titik warna (posisi 0..1, RGBA): transparan -> kuning -> oranye -> merah
+    STOPS = ((0.0, (40, 200, 80, 0)), (0.3, (240, 230, 60, 70)),
+             (0.65, (250, 140, 40, 130)), (1.0, (220, 40, 40, 180)))
+
+    def __init__(self, stops=STOPS):
+        pos = [p for p, _ in stops]
+        ramp = np.linspace(0.0, 1.0, 256)
+        self.lut = np.stack([np.interp(ramp, pos, [c[i] for _, c in stops]) for i in range(4)],
+                            axis=1).round().astype(np.uint8)
+        self.small = None
+        self.scaled = None
+
+    def render(self, values, vmax, block, size):
+        """Warnai blok sel `block` = (kolom, baris, jumlah kolom, jumlah baris) dari
+        `values` (sel di luar array = 0) dan kembalikan Surface berukuran `size` piksel"""
+        c0, r0, cols, rows = block
+        if self.small is None or self.small.get_size() != (cols, rows):
+            self.small = pygame.Surface((cols, rows), pygame.SRCALPHA)
+        if self.scaled is None or self.scaled.get_size() != size:
+            self.scaled = pygame.Surface(size, pygame.SRCALPHA)
+        idx = np.zeros((rows, cols), dtype=np.uint8)
+        grid = values[r0:r0 + rows, c0:c0 + cols]
+        idx[:grid.shape[0], :grid.shape[1]] = np.clip(grid * (255.0 / vmax), 0, 255)
+        # surfarray memakai indeks [x, y], jadi grid [baris, kolom] ditranspos
+        rgba = self.lut[idx.T]
+        pygame.surfarray.pixels3d(self.small)[...] = rgba[..., :3]
+        pygame.surfarray.pixels_alpha(self.small)[...] = rgba[..., 3]
+        pygame.transform.smoothscale(self.small, self.scaled.get_size(), self.scaled)
+        return self.scaled
+
+class CityStats:
+    """Statistik HUD kota cerdas yang diperbarui bertahap, bukan dihitung ulang tiap frame.
+
+    SmartCitySim memanggil vehicle_added/vehicle_removed/tree_added/tree_removed
+    setiap kali daftar berubah, sehingga semua angka dibaca dalam O(1).
+    record() menyimpan satu sampel ke ring buffer `history`.
+    """
+    FIELDS = ("car_count", "bus_count", "total", "people_count",
+              "tree_count", "tree_power", "air_score", "congestion")
+
+    def __init__(self, sim, history=600):
+        self.sim = sim
+        self.kind_counts = {"car": 0, "bus": 0}
+        self.total = 0
+        self.tree_count = 0
+        self.tree_power = 0.0
+        self.exited = 0
+        self.history = deque(maxlen=history)
+
+    def vehicle_added(self, kind, count=1):
+        self.kind_counts[kind] = self.kind_counts.get(kind, 0) + count
+        self.total += count
+
+    def vehicle_removed(self, kind, count=1, exited=0):
+        self.kind_counts[kind] -= count
+        self.total -= count
+        self.exited += exited
+
+    def tree_added(self, t):
+        self.tree_count += 1
+        self.tree_power += 1.0 + 0.5*t.stage
+
+    def tree_removed(self, t):
+        self.tree_count -= 1
+        self.tree_power -= 1.0 + 0.5*t.stage
+
+    def rebuild(self):
+        """Hitung ulang dari nol, misalnya setelah daftar diubah langsung dari luar"""
+        self.kind_counts = {"car": 0, "bus": 0}
+        self.total = 0
+        self.tree_count = 0
+        self.tree_power = 0.0
+        for v in self.sim.iter_vehicles():
+            self.vehicle_added(v.kind)
+        for t in self.sim.trees:
+            self.tree_added(t)
+
+    @property
+    def car_count(self):
+        return self.kind_counts["car"]
+
+    @property
+    def bus_count(self):
+        return self.kind_counts["bus"]
+
+    @property
+    def people_count(self):
+        return self.car_count * 2 + self.bus_count * 15
+
+    @property
+    def air_score(self):
+        # Diturunkan dari medan polusi simulasi (diperbarui sekali per tick)
+        return self.sim.pollution.score
+
+    @property
+    def congestion(self):
+        return min(1.0, self.total/self.sim.max_congestion)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def record(self):
+        self.history.append(tuple(getattr(self, name) for name in self.FIELDS))
+
+    def series(self, name):
+        """Deret waktu satu metrik dari ring buffer, sampel terlama lebih dulu"""
+        i = self.FIELDS.index(name)
+        return [sample[i] for sample in self.history]
+
+class SmartCitySim:
+    # Mode peta panas yang digilir tombol H; None = tanpa overlay
+    OVERLAYS = (None, "pollution", "congestion")
+    OVERLAY_LABELS = {"pollution": "Peta Panas: Polusi Udara", "congestion": "Peta Panas: Kepadatan Kendaraan"}
+    # Ukuran sel (piksel) untuk menghitung kepadatan kendaraan, dan kepadatan yang dianggap penuh
+    DENSITY_CELL = 40
+    DENSITY_MAX = 1.0
+    PANEL_HEIGHT = 200
+    # Jarak (piksel dunia) di luar layar tempat kendaraan masih dicari saat menggambar:
+    # sprite kendaraan menjorok dari titik (x, y)-nya, dan x bergeser saat interpolasi
+    VEHICLE_MARGIN = 200
+
+    def __init__(self, engine="objects", seed=None, network=None):
+        # engine "objects": satu objek Vehicle per kendaraan; "numpy": VehicleArrays
+        if engine not in ("objects", "numpy"):
+            raise ValueError(f"engine tidak dikenal: {engine}")
+        self.engine = engine
+        self.seed, self.rng, self.fx_rng = sim_rngs(seed)
+        self.traffic = VehicleArrays() if engine == "numpy" else None
         self.vehicles = []
         self.trees = []
-        self.traffic_light = TrafficLight(950, 300)
+        # Jalan dan lampu; tanpa `network` satu jalan dua lajur dengan satu lampu
+        self.network = network if network is not None else RoadNetwork.single()
+        self.traffic_light = self.network.lights[0] if self.network.lights else None
+        # Jam simulasi: lampu, kendaraan otomatis dan pohon berjalan lewat event-nya
+        self.scheduler = self.network.scheduler
+        # Dunia selebar jaringan jalan (minimal selebar layar); di bawah jalan terbawah
+        # disisakan ruang setinggi panel HUD supaya jalan itu bisa digeser ke atas panel
+        bottom = max((r["y"] + max(r["lanes"]) + 100 for r in self.network.roads), default=0)
+        self.world = (max(WIDTH, self.network.x_max), max(HEIGHT, bottom + self.PANEL_HEIGHT))
         self.shadow_buildings = [] 
         self.buildings = []
-        self.clouds = [Cloud() for _ in range(10)]
+        self.clouds = [Cloud(self.rng, self.world[0]) for _ in range(10 * math.ceil(self.world[0] / WIDTH))]
         self.road_y = 340
-        self.spawn_timer = 0
+        # Kendaraan baru muncul setiap `spawn_interval` tick; peluang mobil (bukan bus) = car_ratio
+        self._spawn_interval = 50
+        self._spawn_auto = True
+        self.spawn_elapsed = 0
+        self.spawn_event = None
+        self.schedule_spawn()
+        self.car_ratio = 0.5
         self.max_congestion = 18
-        self.spawn_auto = True
         self.time_of_day = 0
+        self.stats = CityStats(self)
+        self.pollution = PollutionField(self.network.x_max, self.network.y_max)
+        self.lanes = LaneIndex()
+        self.particles = ParticleSystem(capacity=8192, seed=self.fx_rng.getrandbits(64))
+        self.layers = LayerCache()
+        # Nilai HUD yang terakhir digambar, untuk menandai panel saat berubah
+        self.hud_key = None
+        self.hazy = False
+        self.overlay = None
+        self.overlay_drawn = False
+        self.heatmap = Heatmap()
+        if self.traffic is not None:
+            self.traffic.particles = self.particles
         
         for i in range(20):
-            w = random.randint(110, 160)
-            h = random.randint(100, 200)
-            x = 20 + i * random.randint(50, 80)
-            y = self.road_y - h - random.randint(10, 30)
+            w = self.rng.randint(110, 160)
+            h = self.rng.randint(100, 200)
+            x = 20 + i * self.rng.randint(50, 80)
+            y = self.road_y - h - self.rng.randint(10, 30)
             self.shadow_buildings.append((x, y, w, h))
             
         for i in range(10):
-            w = random.randint(90, 140)
-            h = random.randint(120, 220)
+            w = self.rng.randint(90, 140)
+            h = self.rng.randint(120, 220)
             x = 20 + i*190
             y = self.road_y - h - 80
-            color = random.choice([(120,130,140), (100,110,130), (140,120,110)])
-            self.buildings.append(Building(x, y, w, h, color))
+            color = self.rng.choice([(120,130,140), (100,110,130), (140,120,110)])
+            self.buildings.append(Building(x, y, w, h, color, self.rng))
+
+        # Dunia yang lebih lebar dari layar diteruskan dengan gedung dari RNG kosmetik,
+        # supaya RNG simulasi tetap sama dengan dunia selebar layar
+        for i in range(10, math.ceil((self.world[0] - 20) / 190)):
+            w = self.fx_rng.randint(90, 140)
+            h = self.fx_rng.randint(120, 220)
+            color = self.fx_rng.choice([(120,130,140), (100,110,130), (140,120,110)])
+            self.buildings.append(Building(20 + i*190, self.road_y - h - 80, w, h, color, self.fx_rng))
+
+        # Kamera ke dunia dan indeks spasial per lapisan gambar: awan, gedung, serta lampu
+        # dan pohon; kendaraan dicari lewat indeks lajurnya (LaneIndex/VehicleArrays)
+        self.camera = Camera(self.world)
+        self.camera_drawn = None
+        self.canvas = None
+        self.cloud_index = SpatialHash()
+        self.building_index = SpatialHash()
+        self.prop_index = SpatialHash()
+        self.index_scene()
 
     def add_vehicle(self, kind="car"):
-        y = self.road_y + random.choice([-15, 15])
-        speed = random.uniform(1.5, 3.0) if kind=="car" else random.uniform(1.2, 2.0)
-        self.vehicles.append(Vehicle(kind=kind, x=-100, y=y, speed=speed))
+        y = self.rng.choice(self.network.lane_ys)
+        speed = self.rng.uniform(1.5, 3.0) if kind=="car" else self.rng.uniform(1.2, 2.0)
+        if self.traffic is not None:
+            # Urutan pemanggilan random sama dengan Vehicle.__init__
+            color = Vehicle.CAR_COLORS.index(self.rng.choice(Vehicle.CAR_COLORS)) if kind == "car" else 0
+            if kind == "bus":
+                self.rng.randint(1, 4)
+            self.traffic.add(kind, -100, y, speed, color)
+            self.stats.vehicle_added(kind)
+            return
+        v = Vehicle(kind=kind, x=-100, y=y, speed=speed, particles=self.particles, rng=self.rng)
+        self.vehicles.append(v)
+        self.lanes.add(v)
+        self.stats.vehicle_added(v.kind)
 
     def remove_vehicle(self, kind=None):
+        if self.traffic is not None:
+            removed = self.traffic.remove_last(kind)
+            if removed:
+                self.stats.vehicle_removed(removed)
+            return
         for i in range(len(self.vehicles)-1,-1,-1):
             if kind is None or self.vehicles[i].kind==kind:
-                self.vehicles.pop(i)
+                v = self.vehicles.pop(i)
+                self.lanes.remove(v)
+                self.stats.vehicle_removed(v.kind)
                 return
 
-    def add_tree(self):
-        x = random.randint(50, WIDTH - 50)
-        self.trees.append(Tree(x, self.road_y - 60, stage=random.choice([1,2])))
+    def add_tree(self, stage=None):
+        x = self.rng.randint(50, self.world[0] - 50)
+        if stage is None:
+            stage = self.rng.choice([1,2])
+        t = Tree(x, self.road_y - 60, stage=stage, particles=self.particles, rng=self.rng,
+                 scheduler=self.scheduler)
+        self.place_tree(t)
+
+    def place_tree(self, t):
+        self.trees.append(t)
+        self.prop_index.insert(t, t.reach())
+        self.stats.tree_added(t)
 
     def remove_tree(self):
         if self.trees:
-            self.trees.pop()
+            t = self.trees.pop()
+            t.cancel()
+            self.prop_index.remove(t)
+            self.stats.tree_removed(t)
+
+    def index_scene(self):
+        """Isi ulang indeks spasial dari awan, gedung, lampu dan pohon"""
+        for index in (self.cloud_index, self.building_index, self.prop_index):
+            index.clear()
+        for cloud in self.clouds:
+            self.cloud_index.insert(cloud, cloud.bounds())
+        for b in self.buildings:
+            self.building_index.insert(b, b.bounds())
+        # Lampu lebih dulu, sama seperti urutan gambar sebelum diurutkan menurut kedalaman
+        for light in self.network.lights:
+            self.prop_index.insert(light, light.bounds())
+        for t in self.trees:
+            self.prop_index.insert(t, t.reach())
+
+    @property
+    def spawn_timer(self):
+        """Tick sejak kendaraan otomatis terakhir; berhenti bertambah selama spawn_auto mati"""
+        if not self._spawn_auto:
+            return self.spawn_elapsed
+        return self.spawn_elapsed + self.scheduler.tick - self.spawn_mark
+
+    @spawn_timer.setter
+    def spawn_timer(self, value):
+        self.spawn_elapsed = value
+        self.schedule_spawn()
+
+    @property
+    def spawn_auto(self):
+        return self._spawn_auto
+
+    @spawn_auto.setter
+    def spawn_auto(self, value):
+        self.spawn_elapsed = self.spawn_timer
+        self._spawn_auto = value
+        self.schedule_spawn()
+
+    @property
+    def spawn_interval(self):
+        return self._spawn_interval
+
+    @spawn_interval.setter
+    def spawn_interval(self, value):
+        self.spawn_elapsed = self.spawn_timer
+        self._spawn_interval = value
+        self.schedule_spawn()
+
+    def schedule_spawn(self):
+        # spawn_elapsed berlaku mulai tick ini; kendaraan muncul saat timer melewati interval
+        self.spawn_mark = self.scheduler.tick
+        Scheduler.cancel(self.spawn_event)
+        self.spawn_event = None
+        if self._spawn_auto:
+            delay = max(1, self._spawn_interval + 1 - self.spawn_elapsed)
+            self.spawn_event = self.scheduler.after(delay, self.spawn, order=1)
+
+    def spawn(self):
+        self.spawn_elapsed = 0
+        self.schedule_spawn()
+        self.add_vehicle("car" if self.rng.random() < self.car_ratio else "bus")
 
     def update(self):
+        snapshot_positions(self.clouds)
+        snapshot_positions(self.vehicles)
         self.time_of_day = (self.time_of_day + 0.2) % 360
-        self.traffic_light.update()
         
         for cloud in self.clouds:
             cloud.update()
+            self.cloud_index.move(cloud, cloud.bounds())
+
+        # Pergantian lampu, kendaraan otomatis, serta pohon tumbuh/berbuah
+        self.scheduler.advance()
         
-        if self.spawn_auto:
-            self.spawn_timer += 1
-            if self.spawn_timer > 50:
-                self.spawn_timer = 0
-                self.add_vehicle("car" if random.random() < 0.5 else "bus")
+        pt = PROFILER.start()
+        if self.traffic is not None:
+            for kind, (count, exited) in self.traffic.step(self.network).items():
+                self.stats.vehicle_removed(kind, count, exited)
+        else:
+            self.update_vehicles()
+        pt = PROFILER.lap("smart.vehicles", pt)
+
+        self.particles.update()
+        pt = PROFILER.lap("smart.particles", pt)
+        self.update_pollution()
+        PROFILER.stop("smart.pollution", pt)
+        self.stats.record()
+
+    def update_pollution(self):
+        """Emisi semua kendaraan sekaligus, serapan pohon, lalu angin dan difusi"""
+        field = self.pollution
+        xs, ys = self.vehicle_positions()
+        if self.traffic is not None:
+            rates = np.array([field.EMISSION[k] for k in VehicleArrays.KINDS])
+            amounts = rates[self.traffic.kind[:self.traffic.n]]
+        else:
+            amounts = np.fromiter((field.EMISSION[v.kind] for v in self.vehicles), dtype=np.float64,
+                                  count=len(self.vehicles))
+        field.emit(xs, ys, amounts)
+        field.set_trees(self.trees)
+        field.step()
+
+    def vehicle_positions(self):
+        """Posisi (x, y) semua kendaraan sebagai dua array NumPy, apa pun engine-nya"""
+        if self.traffic is not None:
+            n = self.traffic.n
+            return self.traffic.x[:n], np.asarray(self.traffic.lane_y, dtype=np.float64)[self.traffic.lane[:n]]
+        n = len(self.vehicles)
+        return (np.fromiter((v.x for v in self.vehicles), dtype=np.float64, count=n),
+                np.fromiter((v.y for v in self.vehicles), dtype=np.float64, count=n))
+
+    def congestion_density(self):
+        """Jumlah kendaraan per sel DENSITY_CELL x DENSITY_CELL piksel dunia"""
+        cell = self.DENSITY_CELL
+        cols = math.ceil(self.network.x_max / cell)
+        rows = math.ceil(self.network.y_max / cell)
+        xs, ys = self.vehicle_positions()
+        cx = np.floor_divide(xs, cell).astype(np.int64)
+        cy = np.floor_divide(ys, cell).astype(np.int64)
+        inside = (cx >= 0) & (cx < cols) & (cy >= 0) & (cy < rows)
+        counts = np.bincount(cy[inside] * cols + cx[inside], minlength=rows * cols)
+        return counts.reshape(rows, cols)
+
+    def cycle_overlay(self):
+        i = self.OVERLAYS.index(self.overlay)
+        self.overlay = self.OVERLAYS[(i + 1) % len(self.OVERLAYS)]
+
+    def draw_overlay(self, surf, height):
+        """Peta panas mode aktif di atas bagian kota yang terlihat (layar setinggi
+        `height`, tanpa panel HUD); hanya sel di bawah kamera yang diwarnai"""
+        if self.overlay is None and not self.overlay_drawn:
+            return
+        # Overlay berubah setiap tick, dan hilangnya overlay juga mengubah layar
+        DIRTY.add((0, 0, WIDTH, height))
+        self.overlay_drawn = self.overlay is not None
+        if self.overlay is None:
+            return
+        if self.overlay == "pollution":
+            values, cell, vmax = self.pollution.field, self.pollution.cell, self.pollution.LIMIT * 2
+        else:
+            values, cell, vmax = self.congestion_density(), self.DENSITY_CELL, self.DENSITY_MAX
+        camera = self.camera
+        x0, y0 = camera.to_world((0, 0))
+        x1, y1 = camera.to_world((WIDTH, height))
+        c0, r0 = int(x0 // cell), int(y0 // cell)
+        cols, rows = math.ceil(x1 / cell) - c0, math.ceil(y1 / cell) - r0
+        size = (round(cols * cell * camera.zoom), round(rows * cell * camera.zoom))
+        layer = self.heatmap.render(values, vmax, (c0, r0, cols, rows), size)
+        sx, sy = (round(v) for v in camera.to_screen((c0 * cell, r0 * cell)))
+        surf.blit(layer, (sx, sy), (0, 0, WIDTH - sx, height - sy))
+        label = TEXT.render(FONT_BOLD, f"{self.OVERLAY_LABELS[self.overlay]}   (H = ganti)", (255,255,255))
+        surf.blit(label, (20, 15))
+
+    def update_vehicles(self):
+        network = self.network
+        for v in self.lanes.front_to_back():
+            v.update(network.light_ahead(v.y, v.x), self.lanes)
+        self.lanes.resort()
         
+        x_end = network.x_max + 200
+        kept, removed = [], []
         for v in self.vehicles:
-            v.update(self.traffic_light, self.vehicles)
-        
-        self.vehicles = [v for v in self.vehicles if -200 < v.x < WIDTH + 200 and v.kind != "bike"]
+            if -200 < v.x < x_end and v.kind != "bike":
+                kept.append(v)
+            else:
+                removed.append(v)
+                self.stats.vehicle_removed(v.kind, exited=int(v.x >= x_end))
+        if removed:
+            self.lanes.remove_all(removed)
+        self.vehicles = kept
 
-        for t in self.trees:
-            t.update()
+    def iter_vehicles(self, alpha=1.0):
+        """Kendaraan untuk digambar/dihitung, apa pun engine-nya"""
+        return self.traffic.views(alpha) if self.traffic is not None else self.vehicles
 
-    def draw(self, surf):
-        sky_color = int(180 + 40 * math.sin(math.radians(self.time_of_day)))
+    def metrics(self):
+        """Angka HUD (kendaraan, orang, kualitas udara, kemacetan) tanpa perlu render"""
+        return self.stats.as_dict()
+
+    def state_digest(self):
+        """Digest state simulasi (tanpa partikel dan efek kosmetik); seed dan input
+        yang sama harus menghasilkan digest yang sama di setiap tick"""
+        if self.traffic is not None:
+            n = self.traffic.n
+            vehicles = [getattr(self.traffic, name)[:n] for name in ("x", "speed", "kind", "lane", "color")]
+        else:
+            vehicles = [[(v.kind, v.x, v.y, v.speed, v.color) for v in self.vehicles]]
+        return state_digest(self.rng.getstate(), self.time_of_day, self.spawn_timer, self.spawn_auto,
+                            *[(light.state, light.timer) for light in self.network.lights],
+                            [(c.x, c.y) for c in self.clouds],
+                            [t.digest_fields() for t in self.trees], self.stats.as_dict(),
+                            self.pollution.field, *vehicles)
+
+    def snapshot(self):
+        """Seluruh state simulasi sebagai bytes (lihat SnapshotWriter); partikel tidak ikut.
+        Gedung dan latar dibangun ulang dari seed saat restore()."""
+        w = SnapshotWriter("smart")
+        stats = self.stats
+        w.value("meta", {"seed": self.seed, "engine": self.engine, "tick": self.scheduler.tick,
+                         "time_of_day": self.time_of_day,
+                         "spawn_timer": self.spawn_timer, "spawn_interval": self.spawn_interval,
+                         "car_ratio": self.car_ratio, "max_congestion": self.max_congestion,
+                         "spawn_auto": self.spawn_auto})
+        w.value("network", self.network.spec())
+        w.value("lights.durations", [light.durations for light in self.network.lights])
+        w.table("lights", self.network.lights, {"state": "s", "timer": "i", "glow": "i"})
+        w.value("stats", {"kind_counts": stats.kind_counts, "total": stats.total, "exited": stats.exited,
+                          "tree_count": stats.tree_count, "tree_power": stats.tree_power,
+                          "history_len": stats.history.maxlen})
+        w.array("stats.history", np.array(stats.history, dtype=np.float64).reshape(-1, len(CityStats.FIELDS)))
+        w.rng("rng", self.rng)
+        w.rng("fx_rng", self.fx_rng)
+        w.array("pollution", self.pollution.field)
+        w.value("pollution.score", self.pollution.score)
+        w.table("clouds", self.clouds, Cloud.SNAPSHOT)
+        snapshot_trees(w, "trees", self.trees)
+        if self.traffic is not None:
+            traffic = self.traffic
+            w.value("traffic", {"next_seq": traffic.next_seq, "lane_y": traffic.lane_y})
+            for name in VehicleArrays.FIELDS:
+                w.array("traffic." + name, getattr(traffic, name)[:traffic.n])
+        else:
+            snapshot_lane_vehicles(w, "vehicles", self.lanes, self.vehicles)
+        return w.tobytes()
+
+    @classmethod
+    def restore(cls, data):
+        """Simulasi baru dari hasil snapshot(); lanjutannya identik dengan simulasi asal"""
+        r = SnapshotReader(data, "smart")
+        meta = r.value("meta")
+        sim = cls(engine=meta["engine"], seed=meta["seed"], network=RoadNetwork.from_spec(r.value("network")))
+        # Semua event dijadwalkan ulang relatif terhadap jam yang dipulihkan
+        sim.scheduler.reset(meta["tick"])
+        for name in ("time_of_day", "spawn_timer", "spawn_interval", "car_ratio", "max_congestion", "spawn_auto"):
+            setattr(sim, name, meta[name])
+        for light, state, durations in zip(sim.network.lights, r.table("lights", {"state": "s", "timer": "i", "glow": "i"}),
+                                           r.value("lights.durations")):
+            light.durations = durations
+            light.set_state(state["state"], state["timer"], state["glow"])
+        r.rng("rng", sim.rng)
+        r.rng("fx_rng", sim.fx_rng)
+        sim.clouds = restore_entities(Cloud, r.table("clouds", Cloud.SNAPSHOT), rng=sim.rng, world_w=sim.world[0])
+        sim.trees = restore_trees(r, "trees", rng=sim.rng, particles=sim.particles, scheduler=sim.scheduler)
+        sim.index_scene()
+        sim.pollution.field = r.array("pollution")
+        sim.pollution.score = r.value("pollution.score")
+        if sim.traffic is not None:
+            traffic = r.value("traffic")
+            arrays = {name: r.array("traffic." + name) for name in VehicleArrays.FIELDS}
+            n = len(arrays["x"])
+            sim.traffic._alloc(max(1024, n))
+            for name, arr in arrays.items():
+                getattr(sim.traffic, name)[:n] = arr
+            sim.traffic.n = n
+            sim.traffic.next_seq = traffic["next_seq"]
+            sim.traffic.lane_y = traffic["lane_y"]
+            sim.traffic.lane_ids = {y: i for i, y in enumerate(traffic["lane_y"])}
+        else:
+            sim.vehicles = restore_lane_vehicles(r, "vehicles", sim.lanes, particles=sim.particles)
+
+        stats = r.value("stats")
+        sim.stats.kind_counts = stats["kind_counts"]
+        for name in ("total", "exited", "tree_count", "tree_power"):
+            setattr(sim.stats, name, stats[name])
+        counts = [name not in ("tree_power", "air_score", "congestion") for name in CityStats.FIELDS]
+        sim.stats.history = deque((tuple(int(v) if is_int else v for v, is_int in zip(row, counts))
+                                   for row in r.array("stats.history").tolist()), maxlen=stats["history_len"])
+        return sim
+
+    def render_sky(self, surf, sky_color):
         for i in range(HEIGHT//2):
             c = sky_color - i//3
             pygame.draw.line(surf, (c, c+30, 255), (0, i), (WIDTH, i))
-        
-        car_count = sum(1 for v in self.vehicles if v.kind=="car")
-        bus_count = sum(1 for v in self.vehicles if v.kind=="bus")
-        total = len(self.vehicles)
-        people_count = car_count * 2 + bus_count * 15
-        
-        tree_power = sum(1.0 + 0.5*t.stage for t in self.trees)
-        air_score = max(0.0, (1.0 - min(1.0, (total*0.08) / (1 + tree_power*0.6))))
-        
-        if air_score < 0.5:
-            pollution_alpha = int((1.0 - air_score) * 120)
-            pollution_surf = pygame.Surface((WIDTH, HEIGHT//2), pygame.SRCALPHA)
-            pollution_surf.fill((100, 80, 60, pollution_alpha))
-            surf.blit(pollution_surf, (0, 0))
-            
-            for i in range(int((1.0 - air_score) * 30)):
-                x, y = random.randint(0, WIDTH), random.randint(0, HEIGHT//2)
-                size = random.randint(3, 8)
-                smog = pygame.Surface((size*2, size*2), pygame.SRCALPHA)
-                pygame.draw.circle(smog, (80, 70, 60, random.randint(30, 80)), (size, size), size)
-                surf.blit(smog, (x, y))
-        
-        for cloud in self.clouds:
-            cloud.draw(surf)
-            
+
+    def render_skyline(self, surf):
         for x, y, w, h in self.shadow_buildings:
             pygame.draw.rect(surf, (45,45,70), (x, y, w, h), border_radius=6)
 
-        for b in self.buildings:
-            b.draw(surf)
-        
-        pygame.draw.rect(surf, (70,150,70), (0, self.road_y-100, WIDTH, 100))
+    def render_street(self, surf):
+        # Digambar relatif terhadap puncak lapisan (road_y - 100)
+        road_y = 100
+        pygame.draw.rect(surf, (70,150,70), (0, road_y-100, WIDTH, 100))
         
         for i in range(100):
             shade = 60 + i//5
-            pygame.draw.line(surf, (shade, shade, shade), (0, self.road_y-50+i), (WIDTH, self.road_y-50+i))
+            pygame.draw.line(surf, (shade, shade, shade), (0, road_y-50+i), (WIDTH, road_y-50+i))
         
         for i in range(0, WIDTH, 70):
-            pygame.draw.rect(surf, (255,240,120), (i+15, self.road_y-5, 35, 8), border_radius=2)
+            pygame.draw.rect(surf, (255,240,120), (i+15, road_y-5, 35, 8), border_radius=2)
         
-        pygame.draw.rect(surf, (160,160,160), (0, self.road_y-60, WIDTH, 10))
-        pygame.draw.rect(surf, (160,160,160), (0, self.road_y+50, WIDTH, 10))
-        pygame.draw.rect(surf, (60,140,60), (0, self.road_y+60, WIDTH, HEIGHT-self.road_y-60))
+        pygame.draw.rect(surf, (160,160,160), (0, road_y-60, WIDTH, 10))
+        pygame.draw.rect(surf, (160,160,160), (0, road_y+50, WIDTH, 10))
+        pygame.draw.rect(surf, (60,140,60), (0, road_y+60, WIDTH, HEIGHT-self.road_y-60))
+
+    def tile_xs(self, view, offset, x0, x1):
+        """x (koordinat gambar) ubin lapisan selebar layar yang menutupi x dunia [x0, x1)
+        dan beririsan dengan view"""
+        first = x0 + max(0, (view.left - x0) // WIDTH) * WIDTH
+        return [x + offset[0] for x in range(first, min(x1, view.right), WIDTH)]
+
+    def draw(self, surf, alpha=1.0):
+        camera = self.camera
+        view = camera.rect
+        if camera.key != self.camera_drawn:
+            # Kamera bergeser atau zoom berubah: seluruh layar berubah
+            DIRTY.mark_full()
+            self.camera_drawn = camera.key
+        if camera.zoom == 1:
+            self.draw_world(surf, view, camera.offset, alpha)
+        else:
+            # Dunia digambar ke kanvas seukuran area yang terlihat lalu diskalakan ke layar
+            if self.canvas is None or self.canvas.get_size() != view.size:
+                self.canvas = pygame.Surface(view.size)
+            self.draw_world(self.canvas, view, (-view.x, -view.y), alpha)
+            pygame.transform.scale(self.canvas, surf.get_size(), surf)
+            DIRTY.mark_full()
+        self.draw_hud(surf)
+
+    def draw_world(self, surf, view, offset, alpha):
+        """Gambar bagian dunia di dalam `view` (Rect dunia); titik dunia (x, y) jatuh di
+        (x + offset[0], y + offset[1]) pada surf. Latar diulang per lebar layar, objek
+        diambil dari indeks spasial dan kendaraan dari indeks lajur."""
+        pt = PROFILER.start()
+        ox, oy = offset
+        sky_xs = self.tile_xs(view, offset, 0, self.world[0])
+        sky_color = int(180 + 40 * math.sin(math.radians(self.time_of_day)))
+        self.layers.tile(surf, "sky", sky_color, lambda s: self.render_sky(s, sky_color),
+                         sky_xs, oy, size=(WIDTH, HEIGHT//2))
         
-        drawables = [(self.traffic_light.depth_y, self.traffic_light)]
-        drawables.extend((t.ground_y, t) for t in self.trees)
-        drawables.extend((v.y, v) for v in self.vehicles)
-        drawables.sort(key=lambda x: x[0])
+        air_score = self.stats.air_score
+        hazy = air_score < 0.5
+        if hazy or self.hazy:
+            # Kabut (atau hilangnya kabut frame lalu) mengubah seluruh langit
+            DIRTY.add_all([pygame.Rect(x, oy, WIDTH, HEIGHT//2) for x in sky_xs])
+        self.hazy = hazy
+        if hazy:
+            # Satu Surface kabut yang dipakai ulang; ketebalannya lewat alpha Surface
+            haze = self.layers.get("haze", None, lambda s: s.fill((100, 80, 60)), size=(WIDTH, HEIGHT//2))
+            haze.set_alpha(int((1.0 - air_score) * 120))
+            for x in sky_xs:
+                surf.blit(haze, (x, oy))
+
+        # Objek di sel yang beririsan dengan view; yang sedikit di luar layar terpotong saat blit
+        clouds = self.cloud_index.query(view)
+        with interpolated(clouds, alpha):
+            for cloud in clouds:
+                cloud.draw(surf, offset)
+                DIRTY.add(cloud.bounds().move(ox, oy))
+            
+        self.layers.tile(surf, "skyline", self.road_y, self.render_skyline,
+                         sky_xs, oy, size=(WIDTH, self.road_y), alpha=True)
+        pt = PROFILER.lap("smart.sky", pt)
+
+        for b in self.building_index.query(view):
+            b.draw(surf, offset)
+        pt = PROFILER.lap("draw.Building", pt)
+        
+        # Setiap jalan memakai lapisan jalan yang sama, diulang sepanjang ruasnya
+        street_h = HEIGHT - (self.road_y - 100)
+        for road in self.network.roads:
+            top = road["y"] - 100
+            if top < view.bottom and top + street_h > view.top:
+                self.layers.tile(surf, "street", self.road_y, self.render_street,
+                                 self.tile_xs(view, offset, road["x0"], road["x0"] + road["length"]),
+                                 top + oy, (WIDTH, street_h))
         
-        for _, obj in drawables:
-            obj.draw(surf)
+        self.particles.draw(surf, alpha, view)
+        pt = PROFILER.lap("smart.street", pt)
+        
+        # Engine numpy menginterpolasi lewat views(alpha); engine objek lewat interpolated()
+        vehicles = self.visible_vehicles(view, alpha)
+        with interpolated(vehicles if self.traffic is None else [], alpha):
+            drawables = [(e.depth_y, e) for e in self.prop_index.query(view)]
+            drawables.extend((v.y, v) for v in vehicles)
+            drawables.sort(key=lambda x: x[0])
+            draw_entities(surf, [obj for _, obj in drawables], offset)
+        PROFILER.stop("smart.entities", pt)
+
+    def visible_vehicles(self, rect, alpha=1.0):
+        """Kendaraan di sekitar rect dunia, untuk digambar (VehicleView untuk engine numpy)"""
+        if self.traffic is not None:
+            return self.traffic.views(alpha, rect, self.VEHICLE_MARGIN)
+        return self.lanes.within(rect, self.VEHICLE_MARGIN)
+
+    def draw_hud(self, surf):
+        pt = PROFILER.start()
+        city = self.stats
+        car_count, bus_count, total = city.car_count, city.bus_count, city.total
+        people_count = city.people_count
+        air_score = city.air_score
 
-        panel_height = 200
+        panel_height = self.PANEL_HEIGHT
+        self.draw_overlay(surf, HEIGHT - panel_height)
+        pt = PROFILER.lap("smart.overlay", pt)
+
+        hud_key = (car_count, bus_count, city.tree_count, total, people_count,
+                   stat_bar_key(280, city.congestion, (80,255,80), (255,80,80)),
+                   stat_bar_key(280, air_score, (255,80,80), (80,255,80)))
+        if hud_key != self.hud_key:
+            self.hud_key = hud_key
+            DIRTY.add((0, HEIGHT - panel_height, WIDTH, panel_height))
         panel = pygame.Surface((WIDTH, panel_height), pygame.SRCALPHA)
         panel.fill((20, 20, 40, 240))
         surf.blit(panel, (0, HEIGHT - panel_height))
         
-        title = BIGFONT.render("🏙️ SIMULASI KOTA CERDAS", True, (255,255,100))
+        title = TEXT.render(BIGFONT, "🏙️ SIMULASI KOTA CERDAS", (255,255,100))
         surf.blit(title, (20, HEIGHT - panel_height + 15))
         
         stats = [
             (f"🚗 Mobil: {car_count}", (255,100,100), 30),
             (f"🚌 Bus: {bus_count}", (100,150,255), 170),
-            (f"🌳 Pohon: {len(self.trees)}", (100,255,150), 310),
+            (f"🌳 Pohon: {city.tree_count}", (100,255,150), 310),
             (f"📊 Total: {total}", (255,255,255), 450),
             (f"👥 Orang: {people_count}", (255,220,120), 590)
         ]
         
         for text, color, x_pos in stats:
-            surf.blit(FONT_BOLD.render(text, True, color), (x_pos, HEIGHT - panel_height + 65))
+            surf.blit(TEXT.render(FONT_BOLD, text, color), (x_pos, HEIGHT - panel_height + 65))
         
-        congestion_ratio = min(1.0, total/self.max_congestion)
+        congestion_ratio = city.congestion
         draw_stat_bar(surf, 30, HEIGHT - panel_height + 95, 280, 25, congestion_ratio, 
                      "Tingkat Kemacetan", (80,255,80), (255,80,80))
         draw_stat_bar(surf, 340, HEIGHT - panel_height + 95, 280, 25, air_score, 
                      "Kualitas Udara", (255,80,80), (80,255,80))
         
         if total > self.max_congestion:
-            msg = MEDFONT.render("⚠️ MACET! Polusi bertambah! Tambahkan pohon!", True, (255,255,100))
+            msg = TEXT.render(MEDFONT, "⚠️ MACET! Polusi bertambah! Tambahkan pohon!", (255,255,100))
             surf.blit(msg, (650, HEIGHT - panel_height + 20))
         
-        controls_text = "🎮 Kontrol   |   A = + Mobil   |   Z = - Mobil   |   S = + Bus   |   X = - Bus   |   D = + Pohon   |   C = - Pohon   |   SPACE = Auto   |   ESC = Menu"
-        rendered = FONT.render(controls_text, True, (220,220,220))
+        controls_text = "🎮 Kontrol   |   A = + Mobil   |   Z = - Mobil   |   S = + Bus   |   X = - Bus   |   D = + Pohon   |   C = - Pohon   |   SPACE = Auto   |   H = Peta Panas   |   Panah = Geser   |   +/- = Zoom   |   ESC = Menu"
+        rendered = TEXT.render(FONT, controls_text, (220,220,220))
         
         box_width = rendered.get_width() + 40
         box_height = rendered.get_height() + 16
@@ -619,6 +2849,7 @@ class SmartCitySim:
         surf.blit(control_box, (box_x, box_y))
         pygame.draw.rect(surf, (120,200,140), (box_x, box_y, box_width, box_height), 2, border_radius=10)
         surf.blit(rendered, (box_x + 20, box_y + 8))
+        PROFILER.stop("smart.hud", pt)
 
 
 def draw_stat_bar(surf, x, y, w, h, ratio, label, good_color, bad_color):
@@ -629,25 +2860,286 @@ def draw_stat_bar(surf, x, y, w, h, ratio, label, good_color, bad_color):
     pygame.draw.rect(surf, color, (x, y, fill_w, h), border_radius=5)
     pygame.draw.rect(surf, (200,200,200), (x, y, w, h), 2, border_radius=5)
     
-    text = FONT.render(f"{label}: {int(ratio*100)}%", True, (255,255,255))
+    text = TEXT.render(FONT, f"{label}: {int(ratio*100)}%", (255,255,255))
     surf.blit(text, (x + w//2 - text.get_width()//2, y + h//2 - text.get_height()//2))
 
+def stat_bar_key(w, ratio, good_color, bad_color):
+    """Semua yang menentukan piksel draw_stat_bar, untuk mendeteksi perubahan HUD"""
+    return int(w * ratio), blend_color(good_color, bad_color, ratio), int(ratio * 100)
+
 def blend_color(c1, c2, ratio):
     return tuple(int(c1[i] * (1-ratio) + c2[i] * ratio) for i in range(3))
 
+def wrap_text(font, text, max_width):
+    """Pecah teks per kata menjadi baris yang lebarnya kurang dari max_width"""
+    lines = []
+    current_line = ""
+    for word in text.split():
+        test_line = current_line + word + " "
+        if TEXT.size(font, test_line)[0] < max_width:
+            current_line = test_line
+        else:
+            if current_line:
+                lines.append(current_line.strip())
+            current_line = word + " "
+    if current_line:
+        lines.append(current_line.strip())
+    return lines
+
+
+class Forest:
+    """Mode hutan PlantingSim: petak-petak dalam grid rows x cols yang disimpan
+    sebagai array NumPy 2D (tahap, disiram, tick disiram, buah, goyangan).
+
+    Menanam, menyiram dan mencabut berlaku untuk satu wilayah sekaligus (slice
+    array). Pertumbuhan dan buah memakai scheduler simulasi seperti Tree, tetapi
+    satu event per kelompok petak yang disiram pada tick yang sama, jadi petak
+    yang menunggu tidak memakan biaya per tick. Hanya jendela yang terlihat
+    (`view`) yang digambar.
+    """
+    STAGE_EMPTY = -1
+    PLOT_W, PLOT_H = 40, 36
+    # Area layar untuk hutan: di antara panel judul dan panel instruksi
+    AREA = pygame.Rect(0, 100, WIDTH, HEIGHT - 210)
+    FIELDS = {"stage": np.int8, "watered": bool, "watered_at": np.int64,
+              "fruit": np.int8, "fruit_since": np.int64, "sway": np.int16}
+
+    def __init__(self, rows, cols, scheduler, seed=0):
+        self.rows, self.cols = rows, cols
+        self.scheduler = scheduler
+        self.rng = np.random.default_rng(seed)
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.zeros((rows, cols), dtype=dtype))
+        self.stage[:] = self.STAGE_EMPTY
+        self.fruit_since[:] = -1
+        self.view = [0, 0]
+        # Naik setiap kali isi hutan berubah, untuk cache metrik
+        self.version = 0
+        self.metrics_cache = (None, None)
+
+    def __len__(self):
+        return self.rows * self.cols
+
+    def region(self, region=None):
+        """(slice baris, slice kolom) untuk (r0, c0, r1, c1); None = seluruh hutan"""
+        if region is None:
+            return slice(0, self.rows), slice(0, self.cols)
+        r0, c0, r1, c1 = region
+        return slice(max(0, r0), min(self.rows, r1)), slice(max(0, c0), min(self.cols, c1))
+
+    def visible(self):
+        """Wilayah (r0, c0, r1, c1) yang muat di layar mulai dari `view`"""
+        r0, c0 = self.view
+        return (r0, c0, min(self.rows, r0 + self.AREA.height // self.PLOT_H),
+                min(self.cols, c0 + self.AREA.width // self.PLOT_W))
+
+    def pan(self, drow, dcol):
+        r0, c0, r1, c1 = self.visible()
+        self.view[0] = max(0, min(self.rows - (r1 - r0), self.view[0] + drow))
+        self.view[1] = max(0, min(self.cols - (c1 - c0), self.view[1] + dcol))
+
+    def indices(self, region, mask):
+        """Indeks datar (ke array .ravel()) dari petak `mask` di dalam wilayah"""
+        rows, cols = self.region(region)
+        r, c = np.nonzero(mask)
+        return (r + rows.start) * self.cols + (c + cols.start)
+
+    def plant(self, region=None):
+        """Tanam benih di semua petak kosong dalam wilayah; kembalikan jumlahnya"""
+        area = self.region(region)
+        idx = self.indices(region, self.stage[area] == self.STAGE_EMPTY)
+        if len(idx):
+            flat = self.flat()
+            flat["stage"][idx] = 0
+            flat["watered"][idx] = False
+            flat["fruit"][idx] = 0
+            flat["fruit_since"][idx] = -1
+            flat["sway"][idx] = self.rng.integers(0, 360, len(idx)) - self.scheduler.tick % 360
+            self.version += 1
+        return len(idx)
+
+    def water(self, region=None):
+        """Siram petak bertanaman yang belum disiram; tumbuh GROW_TICKS + 1 tick kemudian"""
+        area = self.region(region)
+        idx = self.indices(region, (self.stage[area] >= 0) & ~self.watered[area])
+        if len(idx):
+            tick = self.scheduler.tick
+            flat = self.flat()
+            flat["watered"][idx] = True
+            flat["watered_at"][idx] = tick
+            self.schedule_growth(idx, tick)
+            self.version += 1
+        return len(idx)
+
+    def clear(self, region=None):
+        """Cabut semua tanaman dalam wilayah; event yang tertunda diabaikan saat jatuh tempo"""
+        area = self.region(region)
+        count = int(np.count_nonzero(self.stage[area] >= 0))
+        self.stage[area] = self.STAGE_EMPTY
+        self.watered[area] = False
+        self.fruit[area] = 0
+        self.fruit_since[area] = -1
+        self.version += 1
+        return count
+
+    def flat(self):
+        return {name: getattr(self, name).ravel() for name in self.FIELDS}
+
+    def schedule_growth(self, idx, watered_at):
+        self.scheduler.at(watered_at + Tree.GROW_TICKS + 1, self.grow, idx, watered_at,
+                          order=Tree.EVENT_ORDER)
+
+    def schedule_fruit(self, idx, since):
+        self.scheduler.at(since + Tree.FRUIT_TICKS + 1, self.fruit_ready, idx, since,
+                          order=Tree.EVENT_ORDER)
+
+    def grow(self, idx, watered_at):
+        flat = self.flat()
+        # Petak yang sejak itu dicabut atau ditanam ulang tidak ikut tumbuh
+        idx = idx[flat["watered"][idx] & (flat["watered_at"][idx] == watered_at)]
+        if not len(idx):
+            return
+        stage = np.minimum(flat["stage"][idx] + 1, 3)
+        flat["stage"][idx] = stage
+        flat["watered"][idx] = False
+        # Seperti Tree: hitungan buah ikut berjalan di tick tumbuhnya
+        ripe = idx[(stage == 3) & (flat["fruit"][idx] == 0) & (flat["fruit_since"][idx] < 0)]
+        if len(ripe):
+            since = self.scheduler.tick - 1
+            flat["fruit_since"][ripe] = since
+            self.schedule_fruit(ripe, since)
+        self.version += 1
+
+    def fruit_ready(self, idx, since):
+        flat = self.flat()
+        idx = idx[(flat["fruit_since"][idx] == since) & (flat["stage"][idx] == 3)]
+        if not len(idx):
+            return
+        flat["fruit"][idx] = self.rng.integers(3, 7, len(idx))
+        flat["fruit_since"][idx] = -1
+        self.version += 1
+
+    def schedule_all(self):
+        """Jadwalkan ulang event tertunda dari isi array, misalnya setelah restore snapshot"""
+        flat = self.flat()
+        watered = np.flatnonzero(flat["watered"])
+        for tick in np.unique(flat["watered_at"][watered]).tolist():
+            self.schedule_growth(watered[flat["watered_at"][watered] == tick], tick)
+        waiting = np.flatnonzero(flat["fruit_since"] >= 0)
+        for since in np.unique(flat["fruit_since"][waiting]).tolist():
+            self.schedule_fruit(waiting[flat["fruit_since"][waiting] == since], since)
+
+    def metrics(self):
+        if self.metrics_cache[0] != self.version:
+            counts = np.bincount(self.stage.ravel() + 1, minlength=5).tolist()
+            self.metrics_cache = (self.version, {
+                "plots": len(self),
+                "planted": len(self) - counts[0],
+                "stage_counts": counts[1:],
+                "watered": int(np.count_nonzero(self.watered)),
+                "fruiting": int(np.count_nonzero(self.fruit)),
+            })
+        return self.metrics_cache[1]
+
+    def digest_fields(self):
+        return [getattr(self, name) for name in self.FIELDS]
+
+    def snapshot(self, w, name):
+        w.value(name, {"rows": self.rows, "cols": self.cols, "view": self.view,
+                       "rng": self.rng.bit_generator.state})
+        for field in self.FIELDS:
+            w.array(f"{name}.{field}", getattr(self, field))
+
+    @classmethod
+    def restore(cls, r, name, scheduler):
+        meta = r.value(name)
+        forest = cls(meta["rows"], meta["cols"], scheduler)
+        forest.rng.bit_generator.state = meta["rng"]
+        forest.view = meta["view"]
+        for field in cls.FIELDS:
+            setattr(forest, field, r.array(f"{name}.{field}"))
+        forest.schedule_all()
+        return forest
+
+    @staticmethod
+    def plot_sprite(stage, sway_step, fruit, watered):
+        """Sprite kecil satu petak (titik (x, tanah) di tengah bawah), dari atlas"""
+        w, h = 36, 64
+        def render(s):
+            x, y = w // 2, h - 6
+            pygame.draw.ellipse(s, (110,80,50) if watered else (140,105,70), (x - 14, y - 4, 28, 9))
+            if stage == 0:
+                pygame.draw.circle(s, (139,69,19), (x, y - 2), 3)
+            elif stage > 0:
+                trunk_h, leaf = 6 + stage * 7, 5 + stage * 4
+                pygame.draw.rect(s, (120,80,50), (x - stage, y - trunk_h, 2 + stage * 2, trunk_h))
+                cx, cy = x + sway_step, y - trunk_h - leaf // 2
+                pygame.draw.circle(s, (20,100,20), (cx, cy), leaf)
+                pygame.draw.circle(s, (60,180,60), (cx - 1, cy - 2), leaf - 2)
+                for i in range(fruit):
+                    angle = 0.6 + i * 1.1
+                    pygame.draw.circle(s, (230,50,50), (int(cx + math.cos(angle) * leaf * 0.6),
+                                                        int(cy + math.sin(angle) * leaf * 0.5)), 2)
+            if watered:
+                pygame.draw.circle(s, (60,150,255), (x + 11, y - 10), 2)
+        return SPRITES.get(("plot", stage, sway_step, fruit, watered), (w, h), render), (w // 2, h - 6)
+
+    def draw(self, surf):
+        """Gambar petak dalam jendela `view` saja, baris belakang lebih dulu"""
+        r0, c0, r1, c1 = self.visible()
+        area = (slice(r0, r1), slice(c0, c1))
+        stage, fruit, watered = self.stage[area], self.fruit[area], self.watered[area]
+        # sway disimpan int16: jumlahkan dalam int64 agar tick besar tidak meluap
+        sway = np.radians((self.sway[area].astype(np.int64) + self.scheduler.tick % 360) % 360)
+        steps = np.floor(np.sin(sway) * np.maximum(stage, 0) * 0.5).astype(int)
+        top = self.AREA.top
+        items = []
+        for r in range(r1 - r0):
+            y = top + (r + 1) * self.PLOT_H - 4
+            for c, (st, step, fr, wt) in enumerate(zip(stage[r].tolist(), steps[r].tolist(),
+                                                       fruit[r].tolist(), watered[r].tolist())):
+                sprite, (ox, oy) = self.plot_sprite(st, step, fr, wt)
+                items.append((sprite, (c * self.PLOT_W + self.PLOT_W // 2 - ox, y - oy)))
+        clip = surf.get_clip()
+        surf.set_clip(self.AREA)
+        surf.blits(items, doreturn=False)
+        surf.set_clip(clip)
+        DIRTY.add(self.AREA)
 
 class PlantingSim:
-    def __init__(self):
+    INSIGHT_SIZE = (750, 140)
+    # Ukuran hutan (baris, kolom) saat mode hutan pertama kali dibuka dari aplikasi
+    FOREST_SIZE = (300, 300)
+
+    def __init__(self, seed=None, forest=None):
+        self.seed, self.rng, self.fx_rng = sim_rngs(seed)
         self.slots = [None for _ in range(8)]
         self.ground_y = 520
         self.selected_slot = None
-        self.clouds = [Cloud() for _ in range(3)]
+        self.clouds = [Cloud(self.rng) for _ in range(3)]
         self.time = 0
         self.effects = []
+        self.particles = ParticleSystem(capacity=2048, seed=self.fx_rng.getrandbits(64))
+        self.layers = LayerCache()
+        # Ringkasan isi slot yang terakhir digambar, untuk menandai area slot saat berubah
+        self.slot_key = None
+        # Panel insight komposit per tahap dan latar gelapnya, dibuat saat pertama tampil
+        self.insight_panels = {}
+        self.insight_overlay = None
+        # Jam simulasi untuk pohon dan masa tampil insight
+        self.scheduler = Scheduler()
         self.show_insight = False
-        self.insight_timer = 0
-        self.insight_duration = 5 * 60
+        self.insight_since = 0
+        self.insight_event = None
+        self.insight_duration = 5 * SIM_HZ
         self.current_insight_stage = None
+        # Mode hutan: petak array (Forest) menggantikan 8 slot di layar
+        self.forest = None
+        self.forest_mode = False
+        self.drawn_mode = None
+        if forest is not None:
+            self.forest = Forest(*forest, self.scheduler, seed=self.seed)
+            self.forest_mode = True
         
         self.insights = {
             0: {"tahap": "Bibit muncul", "pemicu": "Setelah bibit ditanam", 
@@ -662,68 +3154,229 @@ class PlantingSim:
 
     def plant_seed(self, slot_idx):
         if 0 <= slot_idx < len(self.slots) and self.slots[slot_idx] is None:
-            self.slots[slot_idx] = Tree(140 + slot_idx * 120, self.ground_y, stage=0)
-            self.show_insight = True
-            self.insight_timer = 0
-            self.current_insight_stage = 0
+            self.slots[slot_idx] = Tree(140 + slot_idx * 120, self.ground_y, stage=0, particles=self.particles,
+                                        rng=self.rng, scheduler=self.scheduler)
+            self.show_stage_insight(0)
 
     def water_slot(self, slot_idx):
         t = self.slots[slot_idx]
         if t:
             t.water()
-            self.show_insight = True
-            self.insight_timer = 0
-            self.current_insight_stage = t.stage
+            self.show_stage_insight(t.stage)
 
     def remove_tree(self, slot_idx):
         if 0 <= slot_idx < len(self.slots):
+            if self.slots[slot_idx]:
+                self.slots[slot_idx].cancel()
             self.slots[slot_idx] = None
 
+    def toggle_forest(self):
+        if self.forest is None:
+            self.forest = Forest(*self.FOREST_SIZE, self.scheduler, seed=self.seed)
+        self.forest_mode = not self.forest_mode
+
+    def forest_action(self, action, everywhere=False):
+        """plant/water/clear untuk jendela hutan yang terlihat, atau seluruh hutan"""
+        region = None if everywhere else self.forest.visible()
+        count = getattr(self.forest, action)(region)
+        if count and action != "clear":
+            self.show_stage_insight(0 if action == "plant" else 1)
+        return count
+
+    @property
+    def insight_timer(self):
+        """Tick sejak insight terakhir muncul (0 saat tidak tampil)"""
+        return self.scheduler.tick - self.insight_since if self.show_insight else 0
+
+    def show_stage_insight(self, stage, timer=0):
+        """Tampilkan insight tahap `stage` yang sudah tampil `timer` tick; hilang sendiri
+        lewat event setelah insight_duration"""
+        self.show_insight = True
+        self.insight_since = self.scheduler.tick - timer
+        self.current_insight_stage = stage
+        Scheduler.cancel(self.insight_event)
+        self.insight_event = self.scheduler.at(self.insight_since + self.insight_duration + 1, self.hide_insight)
+
+    def hide_insight(self):
+        self.show_insight = False
+        self.insight_event = None
+
     def update(self):
+        snapshot_positions(self.clouds)
         self.time += 1
         
-        if self.show_insight:
-            self.insight_timer += 1
-            if self.insight_timer > self.insight_duration:
-                self.show_insight = False
-                self.insight_timer = 0
-        
         for cloud in self.clouds:
             cloud.update()
+
+        # Insight kedaluwarsa (order 0) lalu pohon tumbuh/berbuah (Tree.EVENT_ORDER)
+        self.scheduler.advance()
             
         for t in self.slots:
-            if t:
-                t.update()
-                if t.reward_given:
-                    self.effects.append(RewardEffect(t.x, t.ground_y - 80, random.choice(["star", "butterfly", "rainbow"])))
-                    t.reward_given = False
-                    self.show_insight = True
-                    self.insight_timer = 0
-                    self.current_insight_stage = t.stage
+            if t and t.reward_given:
+                self.effects.append(RewardEffect(t.x, t.ground_y - 80, self.rng.choice(["star", "butterfly", "rainbow"]), self.rng))
+                t.reward_given = False
+                self.show_stage_insight(t.stage)
                     
         self.effects = [e for e in self.effects if e.life > 0]
         
         for e in self.effects:
             e.update()
+        
+        self.particles.update()
 
-    def draw(self, surf):
+    def metrics(self):
+        """Ringkasan slot: jumlah pohon per tahap dan yang sedang berbuah (plus hutan jika ada)"""
+        trees = [t for t in self.slots if t]
+        result = {
+            "planted": len(trees),
+            "stage_counts": [sum(1 for t in trees if t.stage == s) for s in range(4)],
+            "watered": sum(1 for t in trees if t.watered),
+            "fruiting": sum(1 for t in trees if t.has_fruit),
+        }
+        if self.forest is not None:
+            result["forest"] = self.forest.metrics()
+        return result
+
+    def state_digest(self):
+        """Digest state simulasi (tanpa partikel dan efek kosmetik)"""
+        return state_digest(self.rng.getstate(), self.time, self.selected_slot,
+                            [t and t.digest_fields() for t in self.slots],
+                            [(e.x, e.y, e.kind, e.life) for e in self.effects],
+                            (self.show_insight, self.insight_timer, self.current_insight_stage),
+                            [(c.x, c.y) for c in self.clouds],
+                            *([self.forest_mode] + self.forest.digest_fields() if self.forest is not None else []))
+
+    def snapshot(self):
+        """Seluruh state simulasi sebagai bytes (lihat SnapshotWriter); partikel tidak ikut"""
+        w = SnapshotWriter("plant")
+        w.value("meta", {"seed": self.seed, "tick": self.scheduler.tick, "time": self.time,
+                         "selected_slot": self.selected_slot,
+                         "show_insight": self.show_insight, "insight_timer": self.insight_timer,
+                         "insight_duration": self.insight_duration,
+                         "current_insight_stage": self.current_insight_stage,
+                         "forest_mode": self.forest_mode})
+        w.rng("rng", self.rng)
+        w.rng("fx_rng", self.fx_rng)
+        w.table("clouds", self.clouds, Cloud.SNAPSHOT)
+        w.value("slots", [i for i, t in enumerate(self.slots) if t])
+        snapshot_trees(w, "trees", [t for t in self.slots if t])
+        w.table("effects", self.effects, RewardEffect.SNAPSHOT)
+        if self.forest is not None:
+            self.forest.snapshot(w, "forest")
+        return w.tobytes()
+
+    @classmethod
+    def restore(cls, data):
+        """Simulasi baru dari hasil snapshot(); lanjutannya identik dengan simulasi asal"""
+        r = SnapshotReader(data, "plant")
+        meta = r.value("meta")
+        sim = cls(seed=meta["seed"])
+        sim.scheduler.reset(meta["tick"])
+        for name in ("time", "selected_slot", "insight_duration", "current_insight_stage", "forest_mode"):
+            setattr(sim, name, meta[name])
+        if meta["show_insight"]:
+            sim.show_stage_insight(meta["current_insight_stage"], meta["insight_timer"])
+        r.rng("rng", sim.rng)
+        r.rng("fx_rng", sim.fx_rng)
+        sim.clouds = restore_entities(Cloud, r.table("clouds", Cloud.SNAPSHOT), rng=sim.rng, world_w=WIDTH)
+        for i, t in zip(r.value("slots"), restore_trees(r, "trees", rng=sim.rng, particles=sim.particles,
+                                                         scheduler=sim.scheduler)):
+            sim.slots[i] = t
+        sim.effects = restore_entities(RewardEffect, r.table("effects", RewardEffect.SNAPSHOT))
+        if "forest" in r.parts:
+            sim.forest = Forest.restore(r, "forest", sim.scheduler)
+        return sim
+
+    def render_backdrop(self, surf):
         for i in range(HEIGHT):
             c = 200 - i//4
             pygame.draw.line(surf, (c, c+35, 255), (0, i), (WIDTH, i))
         
-        for cloud in self.clouds:
-            cloud.draw(surf)
+        # Tanah dan rumput tidak tertutup awan, jadi ikut lapisan yang sama
+        pygame.draw.rect(surf, (90,170,90), (0, self.ground_y, WIDTH, HEIGHT-self.ground_y))
+        pygame.draw.line(surf, (120,90,60), (0, self.ground_y), (WIDTH, self.ground_y), 5)
+        
+        for i in range(0, WIDTH, 15):
+            pygame.draw.line(surf, (70,150,70), (i, self.ground_y), (i, self.ground_y+self.fx_rng.randint(5, 12)), 2)
+
+    def draw(self, surf, alpha=1.0):
+        pt = PROFILER.start()
+        self.layers.blit(surf, "backdrop", self.ground_y, self.render_backdrop)
+        
+        with interpolated(self.clouds, alpha):
+            for cloud in self.clouds:
+                cloud.draw(surf)
+                DIRTY.add(cloud.bounds())
         
         pygame.draw.circle(surf, (255,255,100), (WIDTH-100, 150), 35)
         pygame.draw.circle(surf, (255,240,80), (WIDTH-100, 150), 32)
         
-        pygame.draw.rect(surf, (90,170,90), (0, self.ground_y, WIDTH, HEIGHT-self.ground_y))
-        pygame.draw.line(surf, (120,90,60), (0, self.ground_y), (WIDTH, self.ground_y), 5)
+        pt = PROFILER.lap("plant.backdrop", pt)
+        if self.forest_mode != self.drawn_mode:
+            # Pindah mode slot <-> hutan mengganti isi hampir seluruh layar
+            self.drawn_mode = self.forest_mode
+            DIRTY.mark_full()
+        if self.forest_mode:
+            self.draw_forest(surf, alpha)
+        else:
+            self.draw_slots(surf, alpha)
+        pt = PROFILER.lap("plant.slots", pt)
         
-        for i in range(0, WIDTH, 15):
-            pygame.draw.line(surf, (70,150,70), (i, self.ground_y), (i, self.ground_y+random.randint(5, 12)), 2)
+        title_panel = pygame.Surface((WIDTH, 100), pygame.SRCALPHA)
+        title_panel.fill((40, 80, 40, 230))
+        surf.blit(title_panel, (0, 0))
+        
+        title = TEXT.render(BIGFONT, "🌱 SIMULASI MENANAM POHON", (150,255,150))
+        surf.blit(title, (WIDTH//2 - title.get_width()//2, 20))
+        
+        subtitle = TEXT.render(FONT, "Tanam benih, siram secara teratur, dan saksikan pohon tumbuh!", (200,255,200))
+        surf.blit(subtitle, (WIDTH//2 - subtitle.get_width()//2, 65))
+        
+        instr_panel = pygame.Surface((WIDTH-40, 90), pygame.SRCALPHA)
+        instr_panel.fill((60, 40, 20, 230))
+        surf.blit(instr_panel, (20, HEIGHT-110))
+        pygame.draw.rect(surf, (150,120,80), (20, HEIGHT-110, WIDTH-40, 90), 3, border_radius=8)
+        
+        if self.forest_mode:
+            m = self.forest.metrics()
+            counts = m["stage_counts"]
+            instructions = [
+                "🎮 Panah = Geser (Shift = 10 petak) | P = Tanam | W = Siram | R = Cabut | Shift + P/W/R = Seluruh Hutan",
+                f"🌲 Petak {m['planted']:,}/{m['plots']:,} | Benih {counts[0]:,} | Tunas {counts[1]:,} | "
+                f"Kecil {counts[2]:,} | Dewasa {counts[3]:,} | Berbuah {m['fruiting']:,} | Disiram {m['watered']:,}",
+                "H = Mode Slot | ESC = Kembali ke Menu"
+            ]
+            DIRTY.add((20, HEIGHT-110, WIDTH-40, 90))
+        else:
+            instructions = [
+                "🎮 Angka 1-8 = Pilih Slot | P = Tanam Benih | W = Siram Air | R = Cabut Pohon | H = Mode Hutan",
+                "💡 Tips: Siram pohon secara teratur untuk membuatnya tumbuh lebih cepat!",
+                "ESC = Kembali ke Menu"
+            ]
+        
+        for i, text in enumerate(instructions):
+            color = (255,230,180) if i < 2 else (255,200,100)
+            surf.blit(TEXT.render(FONT, text, color), (35, HEIGHT - 95 + i*25))
+
+        for e in self.effects:
+            e.draw(surf)
+            DIRTY.add(e.bounds())
         
+        pt = PROFILER.lap("plant.panels", pt)
+        self.draw_insight(surf, pt)
+
+    def draw_forest(self, surf, alpha):
+        self.layers.blit(surf, "forest", None, lambda s: s.fill((85,160,85)),
+                         Forest.AREA.topleft, Forest.AREA.size)
+        self.forest.draw(surf)
+        self.particles.draw(surf, alpha)
+
+    def draw_slots(self, surf, alpha):
         stage_names = ["🌱 Benih", "🌿 Tunas", "🌳 Kecil", "🌲 Dewasa"]
+        slot_key = (self.selected_slot, tuple(t and (t.stage, t.watered) for t in self.slots))
+        if slot_key != self.slot_key:
+            self.slot_key = slot_key
+            DIRTY.add((0, self.ground_y - 95, WIDTH, 160))
         for i in range(len(self.slots)):
             x = 140 + i*120
             slot_rect = pygame.Rect(x-50, self.ground_y, 100, 60)
@@ -735,52 +3388,28 @@ class PlantingSim:
                 pygame.draw.rect(surf, (255,200,0), slot_rect, 5, border_radius=10)
                 pygame.draw.polygon(surf, (255,200,0), [(x, self.ground_y - 75), (x-10, self.ground_y - 90), (x+10, self.ground_y - 90)])
             
-            num = MEDFONT.render(f"#{i+1}", True, (60,40,20))
+            num = TEXT.render(MEDFONT, f"#{i+1}", (60,40,20))
             surf.blit(num, (x - num.get_width()//2, self.ground_y - 52))
             
             t = self.slots[i]
             if t:
                 t.draw(surf)
-                stage_text = FONT.render(stage_names[t.stage], True, (40,100,40))
+                DIRTY.add(t.bounds())
+                stage_text = TEXT.render(FONT, stage_names[t.stage], (40,100,40))
                 surf.blit(stage_text, (x - stage_text.get_width()//2, self.ground_y + 20))
                 
                 if t.watered:
-                    water_text = FONT_BOLD.render("💧 Disiram", True, (50,150,255))
+                    water_text = TEXT.render(FONT_BOLD, "💧 Disiram", (50,150,255))
                     surf.blit(water_text, (x - water_text.get_width()//2, self.ground_y + 40))
             else:
-                empty_text = FONT.render("Kosong", True, (120,100,80))
+                empty_text = TEXT.render(FONT, "Kosong", (120,100,80))
                 surf.blit(empty_text, (x - empty_text.get_width()//2, self.ground_y - 30))
         
-        title_panel = pygame.Surface((WIDTH, 100), pygame.SRCALPHA)
-        title_panel.fill((40, 80, 40, 230))
-        surf.blit(title_panel, (0, 0))
-        
-        title = BIGFONT.render("🌱 SIMULASI MENANAM POHON", True, (150,255,150))
-        surf.blit(title, (WIDTH//2 - title.get_width()//2, 20))
-        
-        subtitle = FONT.render("Tanam benih, siram secara teratur, dan saksikan pohon tumbuh!", True, (200,255,200))
-        surf.blit(subtitle, (WIDTH//2 - subtitle.get_width()//2, 65))
-        
-        instr_panel = pygame.Surface((WIDTH-40, 90), pygame.SRCALPHA)
-        instr_panel.fill((60, 40, 20, 230))
-        surf.blit(instr_panel, (20, HEIGHT-110))
-        pygame.draw.rect(surf, (150,120,80), (20, HEIGHT-110, WIDTH-40, 90), 3, border_radius=8)
-        
-        instructions = [
-            "🎮 Angka 1-8 = Pilih Slot | P = Tanam Benih | W = Siram Air | R = Cabut Pohon",
-            "💡 Tips: Siram pohon secara teratur untuk membuatnya tumbuh lebih cepat!",
-            "ESC = Kembali ke Menu"
-        ]
-        
-        for i, text in enumerate(instructions):
-            color = (255,230,180) if i < 2 else (255,200,100)
-            surf.blit(FONT.render(text, True, color), (35, HEIGHT - 95 + i*25))
+        self.particles.draw(surf, alpha)
 
-        for e in self.effects:
-            e.draw(surf)
-        
+    def draw_insight(self, surf, pt):
         if self.show_insight and self.current_insight_stage is not None:
-            insight_data = self.insights[self.current_insight_stage]
+            DIRTY.mark_full()
             
             fade_duration = 30
             if self.insight_timer < fade_duration:
@@ -790,79 +3419,71 @@ class PlantingSim:
             else:
                 alpha_factor = 1.0
             
-            panel_width, panel_height = 750, 140
-            panel_x = (WIDTH - panel_width) // 2
-            panel_y = (HEIGHT - panel_height) // 2 - 50
-            
-            overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, int(100 * alpha_factor)))
-            surf.blit(overlay, (0, 0))
-            
-            shadow_surf = pygame.Surface((panel_width + 8, panel_height + 8), pygame.SRCALPHA)
-            shadow_surf.fill((0, 0, 0, int(150 * alpha_factor)))
-            surf.blit(shadow_surf, (panel_x + 6, panel_y + 6))
-            
-            panel_surf = pygame.Surface((panel_width, panel_height), pygame.SRCALPHA)
-            for i in range(panel_height):
-                pygame.draw.line(panel_surf, (20, 60, 40, int((240 - (i // 4)) * alpha_factor)), (0, i), (panel_width, i))
-            surf.blit(panel_surf, (panel_x, panel_y))
-            
-            pygame.draw.rect(surf, (120, 220, 160, int(255 * alpha_factor)), (panel_x, panel_y, panel_width, panel_height), 5, border_radius=15)
-            pygame.draw.rect(surf, (80, 180, 120, int(120 * alpha_factor)), (panel_x-3, panel_y-3, panel_width+6, panel_height+6), 3, border_radius=15)
-            
-            header = MEDFONT.render("✨🌿 Nature Speaks 🌿✨", True, (180, 255, 200))
-            header.set_alpha(int(255 * alpha_factor))
-            surf.blit(header, (panel_x + 25, panel_y + 20))
-            
-            tahap_label = FONT_BOLD.render("Tahap:", True, (200, 255, 220))
-            tahap_value = FONT.render(insight_data["tahap"], True, (255, 255, 255))
-            pemicu_label = FONT_BOLD.render("Pemicu:", True, (200, 255, 220))
-            pemicu_value = FONT.render(insight_data["pemicu"], True, (255, 255, 255))
-            
-            for text_surf in [tahap_label, tahap_value, pemicu_label, pemicu_value]:
-                text_surf.set_alpha(int(255 * alpha_factor))
-            
-            surf.blit(tahap_label, (panel_x + 25, panel_y + 58))
-            surf.blit(tahap_value, (panel_x + 95, panel_y + 58))
-            surf.blit(pemicu_label, (panel_x + 300, panel_y + 58))
-            surf.blit(pemicu_value, (panel_x + 375, panel_y + 58))
+            # Latar gelap dan panel komposit dibuat sekali; fade cukup mengubah alpha keduanya
+            if self.insight_overlay is None:
+                self.insight_overlay = pygame.Surface((WIDTH, HEIGHT))
+            self.insight_overlay.set_alpha(int(100 * alpha_factor))
+            surf.blit(self.insight_overlay, (0, 0))
             
-            divider_surf = pygame.Surface((panel_width - 50, 2), pygame.SRCALPHA)
-            divider_surf.fill((120, 220, 160, int(180 * alpha_factor)))
-            surf.blit(divider_surf, (panel_x + 25, panel_y + 85))
-            
-            full_text = f"🌿 {insight_data['insight']}"
-            words = full_text.split()
-            lines = []
-            current_line = ""
-            
-            for word in words:
-                test_line = current_line + word + " "
-                if FONT_BOLD.size(test_line)[0] < panel_width - 60:
-                    current_line = test_line
-                else:
-                    if current_line:
-                        lines.append(current_line.strip())
-                    current_line = word + " "
-            if current_line:
-                lines.append(current_line.strip())
-            
-            for idx, line in enumerate(lines):
-                text_surf = FONT_BOLD.render(line, True, (150, 255, 200))
-                text_surf.set_alpha(int(255 * alpha_factor))
-                surf.blit(text_surf, (panel_x + 25, panel_y + 95 + idx * 22))
+            stage = self.current_insight_stage
+            panel = self.insight_panels.get(stage)
+            if panel is None:
+                panel = self.insight_panels[stage] = self.render_insight_panel(self.insights[stage])
+            panel.set_alpha(int(255 * alpha_factor))
+            panel_width, panel_height = self.INSIGHT_SIZE
+            surf.blit(panel, ((WIDTH - panel_width) // 2 - 3, (HEIGHT - panel_height) // 2 - 53))
+            PROFILER.stop("plant.insight", pt)
+
+    def render_insight_panel(self, insight_data):
+        """Komposit panel insight satu tahap (bayangan, gradien, bingkai, teks yang
+        sudah dibungkus) dengan alpha penuh; posisi (0, 0) = sudut bingkai luar"""
+        panel_width, panel_height = self.INSIGHT_SIZE
+        m = 3  # tebal bingkai luar
+        panel = pygame.Surface((panel_width + 2*m + 11, panel_height + 2*m + 11), pygame.SRCALPHA)
+        
+        shadow_surf = pygame.Surface((panel_width + 8, panel_height + 8), pygame.SRCALPHA)
+        shadow_surf.fill((0, 0, 0, 150))
+        panel.blit(shadow_surf, (m + 6, m + 6))
+        
+        gradient = pygame.Surface((panel_width, panel_height), pygame.SRCALPHA)
+        for i in range(panel_height):
+            pygame.draw.line(gradient, (20, 60, 40, 240 - (i // 4)), (0, i), (panel_width, i))
+        panel.blit(gradient, (m, m))
+        
+        pygame.draw.rect(panel, (120, 220, 160), (m, m, panel_width, panel_height), 5, border_radius=15)
+        pygame.draw.rect(panel, (80, 180, 120), (0, 0, panel_width + 2*m, panel_height + 2*m), 3, border_radius=15)
+        
+        panel.blit(TEXT.render(MEDFONT, "✨🌿 Nature Speaks 🌿✨", (180, 255, 200)), (m + 25, m + 20))
+        panel.blit(TEXT.render(FONT_BOLD, "Tahap:", (200, 255, 220)), (m + 25, m + 58))
+        panel.blit(TEXT.render(FONT, insight_data["tahap"], (255, 255, 255)), (m + 95, m + 58))
+        panel.blit(TEXT.render(FONT_BOLD, "Pemicu:", (200, 255, 220)), (m + 300, m + 58))
+        panel.blit(TEXT.render(FONT, insight_data["pemicu"], (255, 255, 255)), (m + 375, m + 58))
+        
+        divider_surf = pygame.Surface((panel_width - 50, 2), pygame.SRCALPHA)
+        divider_surf.fill((120, 220, 160, 180))
+        panel.blit(divider_surf, (m + 25, m + 85))
+        
+        lines = wrap_text(FONT_BOLD, f"🌿 {insight_data['insight']}", panel_width - 60)
+        for idx, line in enumerate(lines):
+            panel.blit(TEXT.render(FONT_BOLD, line, (150, 255, 200)), (m + 25, m + 95 + idx * 22))
+        return panel
 
 
 class Pedestrian:
-    def __init__(self, x, y):
+    SNAPSHOT = {"x": "n", "prev_x": "n", "y": "n", "direction": "i", "speed": "f", "color": "c",
+                "anim_frame": "i", "hair_color": "c", "hair_style": "s"}
+
+    def __init__(self, x, y, rng=random):
+        self.rng = rng
         self.x = x
+        self.prev_x = x
         self.y = y
-        self.direction = random.choice([-1, 1])
-        self.speed = random.uniform(0.8, 1.2)
-        self.color = random.choice([(220, 80, 80), (80, 140, 220), (140, 200, 80), (220, 160, 80)])
-        self.anim_frame = random.randint(0, 30)
+        self.direction = rng.choice([-1, 1])
+        self.speed = rng.uniform(0.8, 1.2)
+        self.color = rng.choice([(220, 80, 80), (80, 140, 220), (140, 200, 80), (220, 160, 80)])
+        self.anim_frame = rng.randint(0, 30)
         self.hair_color = (20, 20, 20)
-        self.hair_style = random.choice(["short", "long"])
+        self.hair_style = rng.choice(["short", "long"])
     
     def update(self):
         self.x += self.direction * self.speed
@@ -870,13 +3491,30 @@ class Pedestrian:
         
         if self.x < -50:
             self.x = WIDTH + 50
-            self.y = HEIGHT - 170 + random.randint(-8, 8)
+            self.y = HEIGHT - 170 + self.rng.randint(-8, 8)
         elif self.x > WIDTH + 50:
             self.x = -50
-            self.y = HEIGHT - 170 + random.randint(-8, 8)
+            self.y = HEIGHT - 170 + self.rng.randint(-8, 8)
     
-    def draw(self, surf):
-        x, y = int(self.x), int(self.y)
+    def sprite_blit(self):
+        if not SPRITES.enabled:
+            return None
+        sprite = SPRITES.get(("pedestrian", self.color, self.hair_style, self.direction, self.anim_frame), (36, 62),
+                             lambda s: self.draw_shape(s, 18, 30))
+        return sprite, (int(self.x) - 18, int(self.y) - 30)
+
+    def bounds(self):
+        return pygame.Rect(int(self.x) - 18, int(self.y) - 30, 36, 62)
+
+    def draw(self, surf, offset=(0, 0)):
+        item = self.sprite_blit()
+        if item is None:
+            self.draw_shape(surf, int(self.x) + offset[0], int(self.y) + offset[1])
+        else:
+            sprite, (x, y) = item
+            surf.blit(sprite, (x + offset[0], y + offset[1]))
+
+    def draw_shape(self, surf, x, y):
         leg_swing = math.sin(self.anim_frame * 0.3) * 7
         arm_swing = math.sin(self.anim_frame * 0.3 + math.pi) * 5
         face_dir = self.direction
@@ -916,13 +3554,18 @@ class Pedestrian:
 
 
 class Cyclist:
-    def __init__(self, x, y):
+    SNAPSHOT = {"x": "n", "prev_x": "n", "y": "n", "direction": "i", "speed": "f", "color": "c",
+                "anim_frame": "i"}
+
+    def __init__(self, x, y, rng=random):
+        self.rng = rng
         self.x = x
+        self.prev_x = x
         self.y = y
-        self.direction = random.choice([-1, 1])
-        self.speed = random.uniform(2.0, 3.0)
-        self.color = random.choice([(220, 80, 80), (80, 140, 220), (140, 200, 80), (220, 160, 80)])
-        self.anim_frame = random.randint(0, 20)
+        self.direction = rng.choice([-1, 1])
+        self.speed = rng.uniform(2.0, 3.0)
+        self.color = rng.choice([(220, 80, 80), (80, 140, 220), (140, 200, 80), (220, 160, 80)])
+        self.anim_frame = rng.randint(0, 20)
         
     def update(self):
         self.x += self.direction * self.speed
@@ -930,13 +3573,30 @@ class Cyclist:
         
         if self.x < -50:
             self.x = WIDTH + 50
-            self.y = HEIGHT - 200 + random.randint(-8, 8)
+            self.y = HEIGHT - 200 + self.rng.randint(-8, 8)
         elif self.x > WIDTH + 50:
             self.x = -50
-            self.y = HEIGHT - 200 + random.randint(-8, 8)
+            self.y = HEIGHT - 200 + self.rng.randint(-8, 8)
     
-    def draw(self, surf):
-        x, y = int(self.x), int(self.y)
+    def sprite_blit(self):
+        if not SPRITES.enabled:
+            return None
+        sprite = SPRITES.get(("cyclist", self.color, self.direction, self.anim_frame), (40, 62),
+                             lambda s: self.draw_shape(s, 20, 34))
+        return sprite, (int(self.x) - 20, int(self.y) - 34)
+
+    def bounds(self):
+        return pygame.Rect(int(self.x) - 20, int(self.y) - 34, 40, 62)
+
+    def draw(self, surf, offset=(0, 0)):
+        item = self.sprite_blit()
+        if item is None:
+            self.draw_shape(surf, int(self.x) + offset[0], int(self.y) + offset[1])
+        else:
+            sprite, (x, y) = item
+            surf.blit(sprite, (x + offset[0], y + offset[1]))
+
+    def draw_shape(self, surf, x, y):
         face_dir = self.direction
         pedal = math.sin(self.anim_frame * 0.5) * 6
         
@@ -967,73 +3627,81 @@ class Cyclist:
 
 
 class GreenCitySim:
-    def __init__(self):
+    def __init__(self, seed=None):
+        self.seed, self.rng, self.fx_rng = sim_rngs(seed)
         self.buildings = []
         self.trees = []
         self.pedestrians = []
         self.cyclists = []
         self.cars = []
         self.buses = []
-        self.clouds = [Cloud() for _ in range(4)]
+        self.clouds = [Cloud(self.rng) for _ in range(4)]
         self.birds = []
         self.time = 0
-        self.spawn_timer = 0
+        # Jam simulasi; spawn_timer diturunkan darinya, pohon memakai event-nya
+        self.scheduler = Scheduler()
+        self.spawn_mark = 0
+        self.lanes = LaneIndex()
+        self.layers = LayerCache()
+        self.hud_key = None
         self.init_scene()
 
     def init_scene(self):
         # Buildings with variety (base di posisi yang sama dengan pohon)
         building_base_y = HEIGHT - 240
         for i in range(6):
-            w = random.randint(90,150)
-            h = random.randint(150,320)
+            w = self.rng.randint(90,150)
+            h = self.rng.randint(150,320)
             x = 60 + i*185
             y = building_base_y - h
-            color = random.choice([(110,120,135), (95,105,125), (125,115,105)])
-            self.buildings.append(Building(x, y, w, h, color))
+            color = self.rng.choice([(110,120,135), (95,105,125), (125,115,105)])
+            self.buildings.append(Building(x, y, w, h, color, self.rng))
         
         # Initial trees (berjajar rapi, lebih kecil)
         tree_positions = [100, 230, 360, 490, 620, 750, 880, 1010]
         for x in tree_positions:
-            t = Tree(x, HEIGHT-240, stage=1)
+            t = Tree(x, HEIGHT-240, stage=1, rng=self.rng, scheduler=self.scheduler)
             self.trees.append(t)
         
         # Pedestrians
         for i in range(5):
-            x = random.randint(0, WIDTH)
-            y = HEIGHT-170 + random.randint(-10,10)
-            self.pedestrians.append(Pedestrian(x, y))
+            x = self.rng.randint(0, WIDTH)
+            y = HEIGHT-170 + self.rng.randint(-10,10)
+            self.pedestrians.append(Pedestrian(x, y, self.rng))
         
         # Cyclists (pengendara sepeda)
         for i in range(4):
-            x = random.randint(0, WIDTH)
-            y = HEIGHT-200 + random.randint(-8, 8)
-            self.cyclists.append(Cyclist(x, y))
+            x = self.rng.randint(0, WIDTH)
+            y = HEIGHT-200 + self.rng.randint(-8, 8)
+            self.cyclists.append(Cyclist(x, y, self.rng))
         
         # Cars - POSISI DI TENGAH JALAN, spawn dengan jarak
         for i in range(2):  # Kurangi dari 3 ke 2
             self.cars.append(Vehicle(kind="car", 
                                     x=-100 - i * 350,  # spawn dengan jarak lebih jauh
                                     y=HEIGHT-215,  # POSISI DI TENGAH JALAN
-                                    speed=random.uniform(1.5, 2.0),  # Kecepatan lebih lambat
+                                    speed=self.rng.uniform(1.5, 2.0),  # Kecepatan lebih lambat
                                     scale=1.0,
-                                    enable_exhaust=False))
+                                    enable_exhaust=False, rng=self.rng))
         
         # Initial buses - spawn dengan jarak
         for i in range(1):  # Kurangi dari 2 ke 1
             self.buses.append(Vehicle(kind="bus", 
                                      x=-500 - i * 400,  # spawn dengan jarak lebih jauh
                                      y=HEIGHT-215,  # POSISI DI TENGAH JALAN (sama dengan mobil)
-                                     speed=random.uniform(1.0, 1.4),  # Kecepatan lebih lambat
-                                     enable_exhaust=False))
-                                    
+                                     speed=self.rng.uniform(1.0, 1.4),  # Kecepatan lebih lambat
+                                     enable_exhaust=False, rng=self.rng))
+        
+        for v in self.cars + self.buses:
+            self.lanes.add(v)
         
         # Birds
         for i in range(5):
             self.birds.append({
-                "x": random.randint(0, WIDTH),
-                "y": random.randint(200, 300),
-                "vx": random.uniform(-1, 1),
-                "vy": random.uniform(-0.3, 0.3),
+                "x": self.rng.randint(0, WIDTH),
+                "y": self.rng.randint(200, 300),
+                "vx": self.rng.uniform(-1, 1),
+                "vy": self.rng.uniform(-0.3, 0.3),
                 "wing": 0
             })
 
@@ -1044,15 +3712,26 @@ class GreenCitySim:
                 return False
         return True
 
+    @property
+    def spawn_timer(self):
+        """Tick sejak kendaraan terakhir muncul"""
+        return self.scheduler.tick - self.spawn_mark
+
+    @spawn_timer.setter
+    def spawn_timer(self, value):
+        self.spawn_mark = self.scheduler.tick - value
+
     def update(self):
+        for entities in (self.clouds, self.cyclists, self.pedestrians, self.cars, self.buses):
+            snapshot_positions(entities)
+        for bird in self.birds:
+            bird["prev_x"] = bird["x"]
         self.time += 1
-        self.spawn_timer += 1
         
         for cloud in self.clouds:
             cloud.update()
-        
-        for t in self.trees:
-            t.update()
+
+        self.scheduler.advance()
         
         # Cyclists
         for c in self.cyclists:
@@ -1062,61 +3741,42 @@ class GreenCitySim:
         for p in self.pedestrians:
             p.update()
         
-        # ===== UPDATE CARS (dengan collision detection) =====
-        all_vehicles = self.cars + self.buses
-        
-        for car in self.cars:
-            # Cek jarak dengan kendaraan lain
-            can_move = True
-            for other in all_vehicles:
-                if other is car:
-                    continue
-                
-                # Jika ada kendaraan di depan dalam jarak 80px, berhenti
-                distance = other.x - car.x
-                if 0 < distance < 80:
-                    can_move = False
-                    break
-            
-            if can_move:
-                car.update()
+        # ===== UPDATE CARS & BUSES (collision detection lewat LaneIndex) =====
+        # Kendaraan terdepan diproses dulu; mobil berhenti jika ada kendaraan
+        # di depan dalam jarak 80px, bus (lebih panjang) 100px
+        for v in self.lanes.front_to_back():
+            leader = self.lanes.leader(v)
+            if leader is None or leader.x - v.x >= (80 if v.kind == "car" else 100):
+                v.update()
+        self.lanes.resort()
         
-        # Hapus mobil yang keluar layar
-        self.cars = [c for c in self.cars if -300 < c.x < WIDTH + 300]
+        # Hapus kendaraan yang keluar layar
+        gone = [c for c in self.cars if not -300 < c.x < WIDTH + 300]
+        gone += [b for b in self.buses if not b.x < WIDTH + 200]
+        if gone:
+            self.lanes.remove_all(gone)
+            self.cars = [c for c in self.cars if -300 < c.x < WIDTH + 300]
+            self.buses = [b for b in self.buses if b.x < WIDTH + 200]
+        all_vehicles = self.cars + self.buses
         
         # Spawn mobil baru (dengan jarak aman dan lebih jarang)
-        if self.spawn_timer > 180 and random.random() < 0.3:  # Lebih jarang spawn
+        if self.spawn_timer > 180 and self.rng.random() < 0.3:  # Lebih jarang spawn
             if self.can_spawn_vehicle(-100, all_vehicles, safe_distance=250):  # Jarak lebih jauh
-                self.cars.append(Vehicle(kind="car", x=-100, y=HEIGHT-215,  # Posisi tengah jalan
-                                        speed=random.uniform(1.5, 2.0), scale=1.0,  # Kecepatan lebih lambat
-                enable_exhaust=False))
+                car = Vehicle(kind="car", x=-100, y=HEIGHT-215,  # Posisi tengah jalan
+                              speed=self.rng.uniform(1.5, 2.0), scale=1.0,  # Kecepatan lebih lambat
+                              enable_exhaust=False, rng=self.rng)
+                self.cars.append(car)
+                self.lanes.add(car)
                 self.spawn_timer = 0
         
-        # ===== UPDATE BUSES (dengan collision detection) =====
-        for bus in self.buses:
-            can_move = True
-            for other in all_vehicles:
-                if other is bus:
-                    continue
-                
-                # Bus lebih panjang, butuh jarak lebih jauh (100px)
-                distance = other.x - bus.x
-                if 0 < distance < 100:
-                    can_move = False
-                    break
-            
-            if can_move:
-                bus.update()
-        
-        # Hapus bus yang keluar layar
-        self.buses = [b for b in self.buses if b.x < WIDTH + 200]
-        
         # Spawn bus baru (dengan jarak aman dan lebih jarang lagi)
-        if self.spawn_timer > 240 and random.random() < 0.25:  # Lebih jarang dari mobil
+        if self.spawn_timer > 240 and self.rng.random() < 0.25:  # Lebih jarang dari mobil
             if self.can_spawn_vehicle(-100, all_vehicles, safe_distance=300):  # Jarak lebih jauh
-                self.buses.append(Vehicle(kind="bus", x=-100, y=HEIGHT-215,  # Posisi tengah jalan
-                                         speed=random.uniform(1.0, 1.4),
-                                         enable_exhaust=False)) # Kecepatan lebih lambat
+                bus = Vehicle(kind="bus", x=-100, y=HEIGHT-215,  # Posisi tengah jalan
+                              speed=self.rng.uniform(1.0, 1.4),
+                              enable_exhaust=False, rng=self.rng) # Kecepatan lebih lambat
+                self.buses.append(bus)
+                self.lanes.add(bus)
                 self.spawn_timer = 0
         
         # Birds
@@ -1127,9 +3787,70 @@ class GreenCitySim:
             
             if bird["x"] < -50 or bird["x"] > WIDTH + 50:
                 bird["x"] = WIDTH + 50 if bird["vx"] < 0 else -50
-                bird["y"] = random.randint(200, 300)
+                bird["y"] = self.rng.randint(200, 300)
 
-    def draw(self, surf):
+    def metrics(self):
+        """Jumlah entitas kota hijau (sama dengan stat di panel)"""
+        return {
+            "tree_count": len(self.trees),
+            "car_count": len(self.cars),
+            "bus_count": len(self.buses),
+            "cyclist_count": len(self.cyclists),
+            "pedestrian_count": len(self.pedestrians),
+            "people_count": len(self.cars) * 2 + len(self.buses) * 15
+                            + len(self.cyclists) + len(self.pedestrians),
+        }
+
+    def state_digest(self):
+        """Digest state simulasi (tanpa efek kosmetik)"""
+        return state_digest(self.rng.getstate(), self.time, self.spawn_timer,
+                            [(c.x, c.y) for c in self.clouds],
+                            [t.digest_fields() for t in self.trees],
+                            [(p.x, p.y, p.direction, p.anim_frame) for p in self.pedestrians],
+                            [(c.x, c.y, c.direction, c.anim_frame) for c in self.cyclists],
+                            [(v.kind, v.x, v.speed) for v in self.cars + self.buses],
+                            [(b["x"], b["y"], b["wing"]) for b in self.birds])
+
+    BIRD_SNAPSHOT = {"x": "n", "prev_x": "n", "y": "n", "vx": "f", "vy": "f", "wing": "i"}
+
+    def snapshot(self):
+        """Seluruh state simulasi sebagai bytes (lihat SnapshotWriter); gedung dibangun ulang dari seed"""
+        w = SnapshotWriter("green")
+        w.value("meta", {"seed": self.seed, "tick": self.scheduler.tick, "time": self.time,
+                         "spawn_timer": self.spawn_timer})
+        w.rng("rng", self.rng)
+        w.rng("fx_rng", self.fx_rng)
+        w.table("clouds", self.clouds, Cloud.SNAPSHOT)
+        snapshot_trees(w, "trees", self.trees)
+        w.table("pedestrians", self.pedestrians, Pedestrian.SNAPSHOT)
+        w.table("cyclists", self.cyclists, Cyclist.SNAPSHOT)
+        snapshot_lane_vehicles(w, "vehicles", self.lanes, self.cars + self.buses)
+        # prev_x burung baru ada setelah update pertama; sebelum itu sama dengan x
+        w.table("birds", self.birds, self.BIRD_SNAPSHOT, get=lambda b, k: b.get(k, b["x"]))
+        return w.tobytes()
+
+    @classmethod
+    def restore(cls, data):
+        """Simulasi baru dari hasil snapshot(); lanjutannya identik dengan simulasi asal"""
+        r = SnapshotReader(data, "green")
+        meta = r.value("meta")
+        sim = cls(seed=meta["seed"])
+        sim.scheduler.reset(meta["tick"])
+        sim.time, sim.spawn_timer = meta["time"], meta["spawn_timer"]
+        r.rng("rng", sim.rng)
+        r.rng("fx_rng", sim.fx_rng)
+        sim.clouds = restore_entities(Cloud, r.table("clouds", Cloud.SNAPSHOT), rng=sim.rng, world_w=WIDTH)
+        sim.trees = restore_trees(r, "trees", rng=sim.rng, particles=None, scheduler=sim.scheduler)
+        sim.pedestrians = restore_entities(Pedestrian, r.table("pedestrians", Pedestrian.SNAPSHOT), rng=sim.rng)
+        sim.cyclists = restore_entities(Cyclist, r.table("cyclists", Cyclist.SNAPSHOT), rng=sim.rng)
+        sim.lanes = LaneIndex()
+        vehicles = restore_lane_vehicles(r, "vehicles", sim.lanes, particles=None)
+        sim.cars = [v for v in vehicles if v.kind == "car"]
+        sim.buses = [v for v in vehicles if v.kind == "bus"]
+        sim.birds = r.table("birds", cls.BIRD_SNAPSHOT)
+        return sim
+
+    def render_backdrop(self, surf):
         # ===== SKY GRADIENT (lebih halus) =====
         for i in range(HEIGHT):
             ratio = i / HEIGHT
@@ -1193,14 +3914,7 @@ class GreenCitySim:
                          [(800, mountain_base_y - 90),
                           (1000, mountain_base_y - 50)], 2)
 
-        # ===== CLOUDS (diturunkan posisinya) =====
-        for cloud in self.clouds:
-            original_y = cloud.y
-            cloud.y = 240
-            cloud.draw(surf)
-            cloud.y = original_y
-
-        # ===== WIND TURBINES (posisi di tanah) =====
+        # Tower dan nacelle turbin statis; baling-baling digambar tiap frame
         turbine_base_y = HEIGHT - 240
         turbine_height = 130
         
@@ -1213,6 +3927,68 @@ class GreenCitySim:
             nacelle_y = turbine_base_y - turbine_height - 10
             pygame.draw.ellipse(surf, (255, 255, 255), (x - 8, nacelle_y, 23, 16))
             pygame.draw.ellipse(surf, (220, 220, 220), (x - 8, nacelle_y, 23, 16), 2)
+
+    def render_road(self, surf):
+        # Koordinat relatif terhadap puncak lapisan (HEIGHT - 240)
+        top = HEIGHT - 240
+        
+        # ===== ROAD =====
+        road_y = HEIGHT - 240 - top
+        pygame.draw.rect(surf, (160, 160, 160), (0, road_y, WIDTH, 90))
+        
+        # Road texture (aspal)
+        for i in range(0, WIDTH, 25):
+            shade = self.fx_rng.randint(155, 165)
+            pygame.draw.rect(surf, (shade, shade, shade), (i, road_y, 25, 90))
+
+        # Center line (dashed yellow)
+        for i in range(0, WIDTH, 65):
+            pygame.draw.rect(surf, (255, 230, 100), (i + 12, road_y + 42, 40, 6), border_radius=2)
+
+        # ===== SIDEWALK =====
+        sidewalk_y = HEIGHT - 150 - top
+        pygame.draw.rect(surf, (200, 200, 200), (0, sidewalk_y, WIDTH, 30))
+        
+        # Sidewalk tiles
+        for i in range(0, WIDTH, 35):
+            pygame.draw.line(surf, (180, 180, 180), (i, sidewalk_y), (i, sidewalk_y + 30), 2)
+
+        # ===== BIKE LANE =====
+        bike_lane_y = HEIGHT - 165 - top
+        pygame.draw.line(surf, (80, 200, 80), (0, bike_lane_y), (WIDTH, bike_lane_y), 4)
+
+    def render_ground(self, surf):
+        # Grass texture (digambar relatif terhadap HEIGHT - 120)
+        pygame.draw.rect(surf, (75, 155, 75), (0, 0, WIDTH, 120))
+        
+        for i in range(0, WIDTH, 6):
+            grass_h = self.fx_rng.randint(4, 9)
+            grass_shade = self.fx_rng.randint(70, 90)
+            pygame.draw.line(surf, (grass_shade, 150 + grass_shade//3, grass_shade),
+                           (i, 0), (i, grass_h), 2)
+
+    def draw(self, surf, alpha=1.0):
+        pt = PROFILER.start()
+        # ===== SKY, SUN, MOUNTAINS, TURBINE TOWERS (lapisan cache) =====
+        self.layers.blit(surf, "backdrop", None, self.render_backdrop)
+
+        # ===== CLOUDS (diturunkan posisinya) =====
+        with interpolated(self.clouds, alpha):
+            for cloud in self.clouds:
+                original_y = cloud.y
+                cloud.y = 240
+                cloud.draw(surf)
+                DIRTY.add(cloud.bounds())
+                cloud.y = original_y
+
+        pt = PROFILER.lap("green.backdrop", pt)
+
+        # ===== WIND TURBINE BLADES =====
+        turbine_base_y = HEIGHT - 240
+        turbine_height = 130
+        
+        for x in [200, 450, 700, 950]:
+            nacelle_y = turbine_base_y - turbine_height - 10
             
             # Blades dengan motion
             angle_offset = (self.time * 2.5) % 360
@@ -1234,39 +4010,20 @@ class GreenCitySim:
             
             # Center hub
             pygame.draw.circle(surf, (200, 200, 200), (int(x + 3.5), blade_center_y), 5)
+            DIRTY.add((x - 30, blade_center_y - 33, 70, 70))
+
+        pt = PROFILER.lap("green.turbines", pt)
 
         # ===== BUILDINGS =====
         for b in self.buildings:
             b.draw(surf)
+        pt = PROFILER.lap("draw.Building", pt)
 
         # ===== TREES =====
-        for t in self.trees:
-            t.draw(surf)
-
-        # ===== ROAD =====
-        road_y = HEIGHT - 240
-        pygame.draw.rect(surf, (160, 160, 160), (0, road_y, WIDTH, 90))
-        
-        # Road texture (aspal)
-        for i in range(0, WIDTH, 25):
-            shade = random.randint(155, 165)
-            pygame.draw.rect(surf, (shade, shade, shade), (i, road_y, 25, 90))
-
-        # Center line (dashed yellow)
-        for i in range(0, WIDTH, 65):
-            pygame.draw.rect(surf, (255, 230, 100), (i + 12, road_y + 42, 40, 6), border_radius=2)
-
-        # ===== SIDEWALK =====
-        sidewalk_y = HEIGHT - 150
-        pygame.draw.rect(surf, (200, 200, 200), (0, sidewalk_y, WIDTH, 30))
-        
-        # Sidewalk tiles
-        for i in range(0, WIDTH, 35):
-            pygame.draw.line(surf, (180, 180, 180), (i, sidewalk_y), (i, sidewalk_y + 30), 2)
+        draw_entities(surf, self.trees)
 
-        # ===== BIKE LANE =====
-        bike_lane_y = HEIGHT - 165
-        pygame.draw.line(surf, (80, 200, 80), (0, bike_lane_y), (WIDTH, bike_lane_y), 4)
+        # ===== ROAD, SIDEWALK, BIKE LANE (lapisan cache) =====
+        self.layers.blit(surf, "road", None, self.render_road, (0, HEIGHT - 240), (WIDTH, 120))
 
         # ===== LAYERING SYSTEM (dari belakang ke depan) =====
         # Gabungkan semua kendaraan dan sort berdasarkan posisi X
@@ -1274,21 +4031,20 @@ class GreenCitySim:
         all_vehicles = [(v.x, v) for v in self.cars + self.buses]
         all_vehicles.sort(key=lambda item: item[0])
         
-        # Gambar semua kendaraan dengan urutan yang benar
-        for _, vehicle in all_vehicles:
-            vehicle.draw(surf)
-        
-        # Layer 3: Cyclists (di depan kendaraan, di bike lane)
-        for c in self.cyclists:
-            c.draw(surf)
-        
-        # Layer 4: Pedestrians (paling depan, di sidewalk)
-        for p in self.pedestrians:
-            p.draw(surf)
+        # Gambar semua kendaraan dengan urutan yang benar, lalu
+        # Layer 3: Cyclists (di depan kendaraan, di bike lane) dan
+        # Layer 4: Pedestrians (paling depan, di sidewalk) -- satu batch blit
+        movers = [v for _, v in all_vehicles] + self.cyclists + self.pedestrians
+        with interpolated(movers, alpha):
+            draw_entities(surf, movers)
 
         # ===== BIRDS =====
         for bird in self.birds:
-            bx, by = int(bird["x"]), int(bird["y"])
+            bx, by = bird["x"], bird["y"]
+            dx = bx - bird.get("prev_x", bx)
+            if abs(dx) <= MAX_LERP:
+                bx -= dx * (1.0 - alpha)
+            bx, by = int(bx), int(by)
             
             # Bird body
             pygame.draw.circle(surf, (60, 50, 40), (bx, by), 4)
@@ -1308,17 +4064,12 @@ class GreenCitySim:
                            (bx, by),
                            (bx + wing_span, by - abs(wing_angle)),
                            2)
+            DIRTY.add((bx - 12, by - 13, 25, 19))
 
-        # ===== GRASS/GROUND =====
-        ground_y = HEIGHT - 120
-        pygame.draw.rect(surf, (75, 155, 75), (0, ground_y, WIDTH, 120))
-        
-        # Grass texture
-        for i in range(0, WIDTH, 6):
-            grass_h = random.randint(4, 9)
-            grass_shade = random.randint(70, 90)
-            pygame.draw.line(surf, (grass_shade, 150 + grass_shade//3, grass_shade),
-                           (i, ground_y), (i, ground_y + grass_h), 2)
+        # ===== GRASS/GROUND (lapisan cache) =====
+        self.layers.blit(surf, "ground", None, self.render_ground, (0, HEIGHT - 120), (WIDTH, 120))
+
+        pt = PROFILER.lap("green.entities", pt)
 
         # ===== UI PANEL (disederhanakan) =====
         panel_h = 100
@@ -1331,8 +4082,8 @@ class GreenCitySim:
 
         # Title dengan shadow
         title_text = "🌿 Simulasi Kota Hijau"
-        title_shadow = BIGFONT.render(title_text, True, (0, 0, 0))
-        title = BIGFONT.render(title_text, True, (180, 255, 180))
+        title_shadow = TEXT.render(BIGFONT, title_text, (0, 0, 0))
+        title = TEXT.render(BIGFONT, title_text, (180, 255, 180))
         surf.blit(title_shadow, (22, 17))
         surf.blit(title, (20, 15))
 
@@ -1348,19 +4099,46 @@ class GreenCitySim:
         ]
         
         for text, color, x_pos in stat_items:
-            surf.blit(FONT_BOLD.render(text, True, color), (x_pos, stats_y))
+            surf.blit(TEXT.render(FONT_BOLD, text, color), (x_pos, stats_y))
+
+        hud_key = (len(self.trees), len(self.cars), len(self.buses), len(self.cyclists), len(self.pedestrians))
+        if hud_key != self.hud_key:
+            self.hud_key = hud_key
+            DIRTY.add((0, 0, WIDTH, panel_h))
+        PROFILER.stop("green.hud", pt)
             
             
+# Tombol kamera kota cerdas: geseran (piksel layar per tekan) dan langkah zoom
+CAMERA_PANS = {pygame.K_LEFT: (-60, 0), pygame.K_RIGHT: (60, 0), pygame.K_UP: (0, -60), pygame.K_DOWN: (0, 60)}
+CAMERA_ZOOMS = {pygame.K_EQUALS: 1, pygame.K_PLUS: 1, pygame.K_KP_PLUS: 1, pygame.K_MINUS: -1, pygame.K_KP_MINUS: -1}
+
+# Periode gelombang gradien menu dalam frame: sin((y + t) / 50) berulang setiap 100*pi
+MENU_WAVE_PERIOD = 100 * math.pi
+
 class App:
-    def __init__(self):
+    def __init__(self, seed=None, prewarm=False, city_grid=None):
         self.state = "menu"
-        self.smart = SmartCitySim()
-        self.plant = PlantingSim()
-        self.green = GreenCitySim()
+        # Simulasi baru dibuat saat mode-nya pertama kali dibuka (lihat sim()),
+        # atau lebih awal di thread latar jika prewarm=True
+        self.seed = seed
+        # (baris, kolom): kota cerdas berupa grid jalan, bukan satu jalan selebar layar
+        self.city_grid = city_grid
+        self.sims = {}
+        self.sims_lock = threading.Lock()
+        if prewarm:
+            threading.Thread(target=self.prewarm, daemon=True).start()
         self.buttons = []
         self.create_menu_buttons()
-        self.particles = []
+        self.particles = ParticleSystem(capacity=1024)
+        self.layers = LayerCache()
         self.menu_time = 0
+        # Jumlah update() sejak App dibuat; indeks waktu untuk rekaman input
+        self.ticks = 0
+        self.recorder = None
+        self.drawn_state = None
+        # Langkah tetap: sisa waktu nyata (detik) yang belum dijadikan tick, dan kecepatan waktu
+        self.accumulator = 0.0
+        self.time_scale = 1
         
         # Floating elements untuk animasi
         self.floating_elements = []
@@ -1379,6 +4157,34 @@ class App:
                 "phase": random.randint(0, 360)
             })
 
+    def sim(self, name):
+        """Simulasi untuk mode `name`, dibuat saat pertama kali dibutuhkan"""
+        with self.sims_lock:
+            sim = self.sims.get(name)
+            if sim is None:
+                if name == "smart" and self.city_grid:
+                    sim = SmartCitySim(seed=self.seed, network=RoadNetwork.grid(*self.city_grid))
+                else:
+                    sim = SIMULATIONS[name](seed=self.seed)
+                self.sims[name] = sim
+            return sim
+
+    def prewarm(self):
+        for name in SIMULATIONS:
+            self.sim(name)
+
+    @property
+    def smart(self):
+        return self.sim("smart")
+
+    @property
+    def plant(self):
+        return self.sim("plant")
+
+    @property
+    def green(self):
+        return self.sim("green")
+
     def create_menu_buttons(self):
         self.buttons = [
             Button((WIDTH//2 - 225, 280, 450, 75), 
@@ -1403,26 +4209,40 @@ class App:
         self.state = s
         # Add transition particles
         for _ in range(50):
-            self.particles.append(Particle(
+            self.particles.emit(
                 random.randint(0, WIDTH),
                 random.randint(0, HEIGHT),
                 random.choice([(100,255,150), (100,200,255), (255,200,100)]),
-                vx=random.uniform(-3,3),
-                vy=random.uniform(-3,3)
-            ))
+                vx=(-3, 3),
+                vy=(-3, 3)
+            )
 
     def quit(self):
+        self.stop_recording()
+        if PROFILER.export_path:
+            PROFILER.export(PROFILER.export_path)
         pygame.quit()
         sys.exit()
 
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close(self.ticks, self.state_digest())
+            self.recorder = None
+
+    def state_digest(self):
+        """Digest mode aktif, jumlah tick dan ketiga simulasi (dibangun jika belum)"""
+        return state_digest(self.state, self.ticks, [self.sim(name).state_digest() for name in SIMULATIONS])
+
     def handle_event(self, event):
+        if self.recorder is not None:
+            self.recorder.record(self.ticks, event)
         if event.type == pygame.MOUSEBUTTONDOWN:
             mx, my = event.pos
             if self.state == "menu":
                 for b in self.buttons:
                     if b.rect.collidepoint((mx,my)):
                         b.click()
-            elif self.state == "plant":
+            elif self.state == "plant" and not self.plant.forest_mode:
                 for i in range(len(self.plant.slots)):
                     x = 140 + i*120
                     slot_rect = pygame.Rect(x-50, self.plant.ground_y-60, 100, 60)
@@ -1434,6 +4254,19 @@ class App:
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_ESCAPE:
                 self.state = "menu"
+            elif event.key == pygame.K_F3:
+                # Overlay profiler; pengukuran ikut menyala selama overlay tampil
+                PROFILER.overlay = not PROFILER.overlay
+                if PROFILER.overlay and not PROFILER.enabled:
+                    PROFILER.reset()
+                    PROFILER.enabled = True
+                elif not PROFILER.overlay and PROFILER.export_path is None:
+                    PROFILER.enabled = False
+                DIRTY.mark_full()
+            elif event.key == pygame.K_f and self.state != "menu":
+                # Percepat waktu simulasi: x1 -> x10 -> x100 -> x1
+                i = TIME_SCALES.index(self.time_scale)
+                self.time_scale = TIME_SCALES[(i + 1) % len(TIME_SCALES)]
             
             if self.state == "smart":
                 if event.key == pygame.K_a:
@@ -1450,9 +4283,33 @@ class App:
                     self.smart.remove_tree()
                 elif event.key == pygame.K_SPACE:
                     self.smart.spawn_auto = not self.smart.spawn_auto
+                elif event.key == pygame.K_h:
+                    self.smart.cycle_overlay()
+                elif event.key in CAMERA_PANS:
+                    # Geser kamera; Shift = lima kali lebih jauh
+                    step = 5 if event.mod & pygame.KMOD_SHIFT else 1
+                    dx, dy = CAMERA_PANS[event.key]
+                    self.smart.camera.pan(dx * step, dy * step)
+                elif event.key in CAMERA_ZOOMS:
+                    self.smart.camera.zoom_by(CAMERA_ZOOMS[event.key])
             
+            elif self.state == "plant" and self.plant.forest_mode:
+                everywhere = bool(event.mod & pygame.KMOD_SHIFT)
+                step = 10 if everywhere else 1
+                pans = {pygame.K_UP: (-step, 0), pygame.K_DOWN: (step, 0),
+                        pygame.K_LEFT: (0, -step), pygame.K_RIGHT: (0, step)}
+                actions = {pygame.K_p: "plant", pygame.K_w: "water", pygame.K_r: "clear"}
+                if event.key in pans:
+                    self.plant.forest.pan(*pans[event.key])
+                elif event.key in actions:
+                    self.plant.forest_action(actions[event.key], everywhere)
+                elif event.key == pygame.K_h:
+                    self.plant.toggle_forest()
+
             elif self.state == "plant":
-                if pygame.K_1 <= event.key <= pygame.K_8:
+                if event.key == pygame.K_h:
+                    self.plant.toggle_forest()
+                elif pygame.K_1 <= event.key <= pygame.K_8:
                     idx = event.key - pygame.K_1
                     self.plant.selected_slot = idx
                 elif event.key == pygame.K_p:
@@ -1471,10 +4328,29 @@ class App:
                 elif event.key == pygame.K_y:
                     self.green.remove_tree()
 
+    def advance(self, dt):
+        """Jalankan update() dengan langkah tetap SIM_STEP untuk dt detik waktu nyata.
+
+        Di dalam simulasi waktu dikali time_scale (menu selalu x1). Kembalikan
+        alpha (0..1): posisi waktu render di antara tick terakhir dan berikutnya.
+        """
+        scale = 1 if self.state == "menu" else self.time_scale
+        self.accumulator += min(dt, MAX_FRAME_DT) * scale
+        ticks = 0
+        while self.accumulator >= SIM_STEP:
+            if ticks == MAX_FRAME_TICKS:
+                # Tertinggal terlalu jauh: buang sisa supaya frame berikutnya tidak makin berat
+                self.accumulator = 0.0
+                break
+            self.update()
+            self.accumulator -= SIM_STEP
+            ticks += 1
+        return self.accumulator / SIM_STEP
+
     def update(self):
-        for p in self.particles:
-            p.update()
-        self.particles = [p for p in self.particles if p.life > 0]
+        pt = PROFILER.start()
+        self.ticks += 1
+        self.particles.update()
         
         if self.state == "menu":
             self.menu_time += 1
@@ -1496,19 +4372,28 @@ class App:
             self.plant.update()
         elif self.state == "green":
             self.green.update()
+        PROFILER.stop("update", pt)
+
+    def render_menu_gradient(self, surf, phase):
+        # Wave effect on gradient (satu kolom sekaligus lewat NumPy)
+        rows = np.arange(HEIGHT)
+        wave = np.sin((rows + phase) / 50) * 15
+        ratio = (rows + wave) / HEIGHT
+        column = pygame.surfarray.pixels3d(surf)[0]
+        column[:, 0] = (140 + (180 - 140) * ratio).astype(int)
+        column[:, 1] = (180 + (220 - 180) * ratio).astype(int)
+        column[:, 2] = 255
+        del column
 
     def draw_menu(self):
         # ===== ANIMATED GRADIENT BACKGROUND =====
-        for i in range(HEIGHT):
-            # Wave effect on gradient
-            wave = math.sin((i + self.menu_time) / 50) * 15
-            ratio = (i + wave) / HEIGHT
-            
-            r = int(140 + (180 - 140) * ratio)
-            g = int(180 + (220 - 180) * ratio)
-            b = 255
-            
-            pygame.draw.line(SCREEN, (r, g, b), (0, i), (WIDTH, i))
+        # Gradien hanya berubah terhadap y: satu kolom 1px per fase gelombang
+        # di-cache lalu diskalakan ke seluruh layar. Fase dibungkus pada periode
+        # gelombang yang sebenarnya (100*pi frame) agar tidak melompat.
+        phase = self.menu_time % MENU_WAVE_PERIOD
+        column = self.layers.get("menu_gradient", phase,
+                                 lambda s: self.render_menu_gradient(s, phase), (1, HEIGHT))
+        pygame.transform.scale(column, (WIDTH, HEIGHT), SCREEN)
         
         # ===== FLOATING ANIMATED ELEMENTS =====
         for elem in self.floating_elements:
@@ -1529,8 +4414,7 @@ class App:
             SCREEN.blit(glow_surf, (int(elem["x"] - size * 1.5), int(elem["y"] - size * 1.5)))
         
         # ===== PARTICLES =====
-        for p in self.particles:
-            p.draw(SCREEN)
+        self.particles.draw(SCREEN)
         
         # ===== LOGO/ICON (Earth) =====
         earth_x, earth_y = WIDTH // 2, 140
@@ -1569,17 +4453,16 @@ class App:
         title_y = 80
         
         # Shadow with multiple layers for depth
+        title_w = TEXT.size(BIGFONT, "🌍 SIMULASI GRAFIKA")[0]
         for offset in range(5, 0, -1):
             shadow_alpha = 30 * offset
-            title_shadow = BIGFONT.render("🌍 SIMULASI GRAFIKA", True, (0, 0, 0))
-            title_shadow.set_alpha(shadow_alpha)
-            SCREEN.blit(title_shadow, (WIDTH//2 - title_shadow.get_width()//2 + offset, 
-                                      title_y + offset))
+            TEXT.blit(SCREEN, BIGFONT, "🌍 SIMULASI GRAFIKA", (0, 0, 0),
+                      (WIDTH//2 - title_w//2 + offset, title_y + offset), shadow_alpha)
         
         # Main title with color wave
         title_text = "🌍 SIMULASI GRAFIKA"
         x_offset = 0
-        base_x = WIDTH // 2 - BIGFONT.size(title_text)[0] // 2
+        base_x = WIDTH // 2 - TEXT.size(BIGFONT, title_text)[0] // 2
         
         for i, char in enumerate(title_text):
             wave_y = math.sin(math.radians(self.menu_time * 3 + i * 20)) * 5
@@ -1593,16 +4476,14 @@ class App:
             else:
                 color = (255, 200, 100)
             
-            char_surf = BIGFONT.render(char, True, color)
-            SCREEN.blit(char_surf, (base_x + x_offset, title_y + wave_y))
-            x_offset += BIGFONT.size(char)[0]
+            # Tiap huruf hanya punya 3 varian warna, jadi semuanya cepat masuk cache
+            SCREEN.blit(TEXT.render(BIGFONT, char, color), (base_x + x_offset, title_y + wave_y))
+            x_offset += TEXT.size(BIGFONT, char)[0]
         
         # ===== SUBTITLE =====
-        subtitle = MEDFONT.render("Kota Cerdas • Menanam Pohon • Kota Hijau", True, (255, 255, 255))
-        subtitle_shadow = MEDFONT.render("Kota Cerdas • Menanam Pohon • Kota Hijau", True, (0, 0, 0))
-        
-        subtitle_shadow.set_alpha(100)
-        SCREEN.blit(subtitle_shadow, (WIDTH//2 - subtitle.get_width()//2 + 2, 202))
+        subtitle = TEXT.render(MEDFONT, "Kota Cerdas • Menanam Pohon • Kota Hijau", (255, 255, 255))
+        TEXT.blit(SCREEN, MEDFONT, "Kota Cerdas • Menanam Pohon • Kota Hijau", (0, 0, 0),
+                  (WIDTH//2 - subtitle.get_width()//2 + 2, 202), 100)
         SCREEN.blit(subtitle, (WIDTH//2 - subtitle.get_width()//2, 200))
         
         # ===== DECORATIVE ELEMENTS =====
@@ -1645,35 +4526,269 @@ class App:
         
         # ===== FOOTER WITH ANIMATED HINT =====
         footer_alpha = int((math.sin(math.radians(self.menu_time * 3)) * 0.3 + 0.7) * 255)
-        footer = FONT.render("Gunakan mouse untuk memilih • Tekan ESC untuk kembali", True, (220, 240, 255))
-        footer.set_alpha(footer_alpha)
-        SCREEN.blit(footer, (WIDTH//2 - footer.get_width()//2, HEIGHT - 50))
+        footer_text = "Gunakan mouse untuk memilih • Tekan ESC untuk kembali"
+        footer_w = TEXT.size(FONT, footer_text)[0]
+        TEXT.blit(SCREEN, FONT, footer_text, (220, 240, 255), (WIDTH//2 - footer_w//2, HEIGHT - 50), footer_alpha)
         
         # Sparkle effect on footer
         if self.menu_time % 30 == 0:
             for _ in range(5):
                 sparkle_x = random.randint(WIDTH//2 - 200, WIDTH//2 + 200)
                 sparkle_y = HEIGHT - 50 + random.randint(-5, 5)
-                self.particles.append(Particle(sparkle_x, sparkle_y, (255, 255, 200), 
-                                              vx=random.uniform(-1, 1), vy=random.uniform(-2, -1)))
+                self.particles.emit(sparkle_x, sparkle_y, (255, 255, 200),
+                                    vx=(-1, 1), vy=(-2, -1))
+
+    def draw(self, alpha=1.0):
+        with PROFILER.span("draw"):
+            self.draw_state(alpha)
+        if PROFILER.overlay:
+            PROFILER.draw_overlay(SCREEN)
 
-    def draw(self):
+    def draw_state(self, alpha):
+        # Menu beranimasi di seluruh layar; pergantian state juga mengganti seluruh layar
+        if self.state == "menu" or self.state != self.drawn_state:
+            DIRTY.mark_full()
+            self.drawn_state = self.state
         if self.state == "menu":
             self.draw_menu()
+            return
         elif self.state == "smart":
-            self.smart.draw(SCREEN)
+            self.smart.draw(SCREEN, alpha)
         elif self.state == "plant":
-            self.plant.draw(SCREEN)
+            self.plant.draw(SCREEN, alpha)
         elif self.state == "green":
-            self.green.draw(SCREEN)
+            self.green.draw(SCREEN, alpha)
+
+        # Penanda fast-forward di pojok kanan atas (area selalu ditandai agar hilang saat kembali x1)
+        badge = pygame.Rect(WIDTH - 110, 110, 90, 32)
+        DIRTY.add(badge)
+        if self.time_scale > 1:
+            pygame.draw.rect(SCREEN, (20, 20, 40), badge, border_radius=8)
+            pygame.draw.rect(SCREEN, (255, 200, 0), badge, 2, border_radius=8)
+            label = TEXT.render(FONT_BOLD, f"⏩ x{self.time_scale}", (255, 220, 120))
+            SCREEN.blit(label, (badge.centerx - label.get_width()//2, badge.centery - label.get_height()//2))
             
+# ========== Input Recording ==========
+RECORDING_VERSION = 1
+
+class InputRecorder:
+    """Merekam input App ke file JSON Lines.
+
+    Baris pertama header (versi, seed, grid kota), lalu satu baris per event keyboard/klik
+    dengan indeks tick (event diproses sebelum update() ke-`tick` + 1) dan
+    waktu nyata sejak rekaman dimulai. Baris terakhir berisi jumlah tick dan
+    digest state App, yang dicek ulang oleh replay_recording().
+    """
+    def __init__(self, path, seed, city_grid=None):
+        self.file = open(path, "w")
+        self.start = time.perf_counter()
+        self.write({"type": "header", "version": RECORDING_VERSION, "seed": seed, "city_grid": city_grid})
+
+    def write(self, entry):
+        self.file.write(json.dumps(entry) + "\n")
+
+    def record(self, tick, event):
+        t = round(time.perf_counter() - self.start, 3)
+        if event.type == pygame.KEYDOWN:
+            self.write({"type": "key", "tick": tick, "t": t, "key": event.key,
+                        "mod": event.mod & pygame.KMOD_SHIFT})
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            self.write({"type": "click", "tick": tick, "t": t, "pos": list(event.pos), "button": event.button})
+
+    def close(self, tick, digest):
+        self.write({"type": "end", "tick": tick, "digest": digest})
+        self.file.close()
+
+def load_recording(path):
+    """(header, daftar event, entri akhir) dari file InputRecorder"""
+    with open(path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    if not entries or entries[0].get("type") != "header":
+        raise ValueError("bukan rekaman input NeoTerra")
+    if entries[0]["version"] != RECORDING_VERSION:
+        raise ValueError(f"versi rekaman {entries[0]['version']} tidak didukung")
+    end = entries[-1] if entries[-1]["type"] == "end" else None
+    events = [e for e in entries[1:] if e["type"] in ("key", "click")]
+    return entries[0], events, end
+
+def recorded_event(entry):
+    if entry["type"] == "key":
+        return pygame.event.Event(pygame.KEYDOWN, key=entry["key"], mod=entry.get("mod", 0), unicode="")
+    return pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=tuple(entry["pos"]), button=entry["button"])
+
+def replay_recording(path, render=False, speed=0.0):
+    """Putar ulang rekaman ke App baru dan bandingkan digest akhirnya.
+
+    Tanpa render, tick dijalankan secepat mungkin (tanpa window). Dengan
+    render, satu frame digambar tiap langkah tampilan; `speed` = kelipatan
+    waktu nyata (0 = secepat mungkin). Kembalikan dict hasil, dengan "match"
+    None jika rekaman tidak punya entri akhir (misalnya proses terhenti).
+    """
+    header, events, end = load_recording(path)
+    last_tick = end["tick"] if end else (events[-1]["tick"] if events else 0)
+    if render:
+        init_display()
+    app = App(seed=header["seed"], city_grid=header.get("city_grid"))
+    # Tombol Keluar di rekaman tidak menutup proses replay
+    app.quit = lambda: None
+    start = time.perf_counter()
+    i = 0
+
+    def step_to(tick):
+        nonlocal i
+        while app.ticks < tick:
+            while i < len(events) and events[i]["tick"] <= app.ticks:
+                app.handle_event(recorded_event(events[i]))
+                i += 1
+            app.update()
+
+    if not render:
+        step_to(last_tick)
+    else:
+        while app.ticks < last_tick:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    last_tick = app.ticks
+            if speed > 0:
+                target = int((time.perf_counter() - start) * SIM_HZ * speed)
+                if target <= app.ticks:
+                    CLOCK.tick(FPS)
+                    continue
+                step_to(min(target, last_tick))
+            else:
+                step_to(min(app.ticks + SIM_HZ, last_tick))
+            app.draw()
+            DIRTY.present()
+    # Event setelah tick terakhir (misalnya klik Keluar) tetap diterapkan
+    for entry in events[i:]:
+        app.handle_event(recorded_event(entry))
+
+    elapsed = time.perf_counter() - start
+    digest = app.state_digest()
+    return {"ticks": app.ticks, "events": len(events), "seconds": elapsed,
+            "speedup": app.ticks / SIM_HZ / elapsed if elapsed > 0 else None,
+            "digest": digest, "expected": end and end["digest"],
+            "match": None if end is None else digest == end["digest"]}
+
+# ========== Headless ==========
+SIMULATIONS = {"smart": SmartCitySim, "plant": PlantingSim, "green": GreenCitySim}
+
+def save_snapshot(sim, path):
+    with open(path, "wb") as f:
+        f.write(sim.snapshot())
+
+def load_snapshot(path, kind=None):
+    """Simulasi dari file snapshot; jenisnya dibaca dari header file"""
+    with open(path, "rb") as f:
+        data = f.read()
+    return SIMULATIONS[SnapshotReader(data, kind).kind].restore(data)
+
+def run_headless(sim, ticks=None, until=None, checkpoint=None, checkpoint_every=0):
+    """Jalankan sim.update() secepat mungkin (tanpa surface, font, atau CLOCK.tick).
+
+    Berhenti setelah `ticks` langkah atau ketika `until(sim)` bernilai True,
+    lalu kembalikan sim.metrics() ditambah jumlah tick yang dijalankan.
+    Dengan `checkpoint`, snapshot ditulis ke path itu setiap `checkpoint_every` tick.
+    """
+    if ticks is None and until is None:
+        raise ValueError("run_headless butuh ticks atau until")
+    n = 0
+    while ticks is None or n < ticks:
+        sim.update()
+        PROFILER.end_frame()
+        n += 1
+        if checkpoint and checkpoint_every and n % checkpoint_every == 0:
+            save_snapshot(sim, checkpoint)
+        if until is not None and until(sim):
+            break
+    result = sim.metrics()
+    result["ticks"] = n
+    return result
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NeoTerra: A Sustainable Future City Simulation")
+    parser.add_argument("--headless", choices=sorted(SIMULATIONS),
+                        help="jalankan simulasi tanpa window dan cetak metrik dalam JSON")
+    parser.add_argument("--ticks", type=int, default=10000,
+                        help="jumlah tick untuk mode headless (default: 10000)")
+    parser.add_argument("--seed", type=int,
+                        help="seed RNG simulasi; seed + input yang sama mengulang simulasi persis sama")
+    parser.add_argument("--engine", choices=["objects", "numpy"], default="objects",
+                        help="engine kendaraan SmartCitySim (default: objects)")
+    parser.add_argument("--city-grid", nargs=2, type=int, metavar=("ROWS", "COLS"),
+                        help="kota cerdas berupa grid ROWS jalan x COLS persimpangan yang lebih besar "
+                             "dari layar (geser dengan panah, zoom dengan +/-)")
+    parser.add_argument("--fps", type=int, default=FPS,
+                        help=f"batas FPS render, 0 = tanpa batas (default: {FPS}); simulasi tetap {SIM_HZ} tick/detik")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="ukur waktu tiap fase dan tulis ringkasan ke PATH (.csv atau .json) saat keluar")
+    parser.add_argument("--full-flip", action="store_true",
+                        help="selalu flip seluruh layar, bukan hanya area yang berubah")
+    parser.add_argument("--prewarm", action="store_true",
+                        help="bangun ketiga simulasi di thread latar saat menu tampil")
+    parser.add_argument("--record", metavar="PATH",
+                        help="rekam input keyboard/klik beserta indeks tick ke PATH (JSON Lines)")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="putar ulang rekaman tanpa window lalu cek digest akhir (kode keluar 1 jika beda)")
+    parser.add_argument("--replay-render", action="store_true",
+                        help="tampilkan replay di window")
+    parser.add_argument("--replay-speed", type=float, default=0.0,
+                        help="kecepatan replay yang ditampilkan, kelipatan waktu nyata (0 = secepat mungkin)")
+    parser.add_argument("--load-snapshot", metavar="PATH",
+                        help="mode headless: mulai dari snapshot tersimpan, bukan dari awal")
+    parser.add_argument("--save-snapshot", metavar="PATH",
+                        help="mode headless: tulis snapshot state akhir ke PATH")
+    parser.add_argument("--checkpoint-every", type=int, default=0, metavar="TICKS",
+                        help="mode headless: tulis juga --save-snapshot setiap TICKS tick")
+    return parser.parse_args(argv)
+
 # ========== Main Loop ==========
-def main():
-    app = App()
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile:
+        PROFILER.enabled = True
+        PROFILER.export_path = args.profile
+    if args.headless:
+        if args.load_snapshot:
+            # Seed dan engine ikut tersimpan di snapshot
+            try:
+                sim = load_snapshot(args.load_snapshot, args.headless)
+            except ValueError as e:
+                sys.exit(f"{args.load_snapshot}: {e}")
+        elif args.headless == "smart":
+            network = RoadNetwork.grid(*args.city_grid) if args.city_grid else None
+            sim = SmartCitySim(engine=args.engine, seed=args.seed, network=network)
+        else:
+            sim = SIMULATIONS[args.headless](seed=args.seed)
+        result = run_headless(sim, ticks=args.ticks, checkpoint=args.save_snapshot,
+                              checkpoint_every=args.checkpoint_every)
+        if args.save_snapshot:
+            save_snapshot(sim, args.save_snapshot)
+        result["seed"] = sim.seed
+        result["digest"] = sim.state_digest()
+        print(json.dumps(result, indent=2))
+        if args.profile:
+            PROFILER.export(args.profile)
+        return
+    if args.replay:
+        result = replay_recording(args.replay, render=args.replay_render, speed=args.replay_speed)
+        print(json.dumps(result, indent=2))
+        if args.profile:
+            PROFILER.export(args.profile)
+        sys.exit(1 if result["match"] is False else 0)
+
+    init_display()
+    DIRTY.enabled = not args.full_flip
+    if args.record and args.seed is None:
+        # Replay butuh seed yang sama, jadi pilih dan simpan seed di rekaman
+        args.seed = random.randrange(2**32)
+    app = App(seed=args.seed, prewarm=args.prewarm, city_grid=args.city_grid)
+    if args.record:
+        app.recorder = InputRecorder(args.record, args.seed, args.city_grid)
     running = True
     
     while running:
-        dt = CLOCK.tick(FPS)
+        dt = CLOCK.tick(args.fps) / 1000.0
         
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -1681,10 +4796,15 @@ def main():
             else:
                 app.handle_event(event)
         
-        app.update()
-        app.draw()
-        pygame.display.flip()
+        alpha = app.advance(dt)
+        app.draw(alpha)
+        with PROFILER.span("present"):
+            DIRTY.present()
+        PROFILER.end_frame()
     
+    app.stop_recording()
+    if args.profile:
+        PROFILER.export(args.profile)
     pygame.quit()
     sys.exit()
 
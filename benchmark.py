@@ -0,0 +1,287 @@
+"""Benchmark NeoTerra: ticks/detik (update saja) dan frame/detik (update + draw)
+untuk ketiga simulasi dengan jumlah entitas terkontrol dan RNG ber-seed.
+
+Contoh:
+    python benchmark.py --out hasil.json
+    python benchmark.py --counts 10 100 1000 --baseline baseline.json --threshold 0.25
+
+Dengan --baseline, setiap hasil dibandingkan dengan baseline; jika ada yang
+lebih lambat dari ambang batas, skrip keluar dengan kode 1.
+
+Waktu start (proses Python baru sampai menu pertama tampil) juga diukur;
+dengan --startup-budget, skrip keluar dengan kode 1 jika median melewatinya.
+Pemeriksaan budget start (hanya beberapa detik, tanpa skenario):
+    python benchmark.py --scenarios --startup-budget 1500
+
+Jika budget start dan --baseline sama-sama gagal, keduanya dilaporkan sebelum keluar.
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+import argparse
+import platform
+
+# Render ke surface offscreen dengan driver SDL dummy (tanpa window)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+import NeoTerra as nt
+
+COUNTS = [10, 100, 1000, 10000, 100000]
+
+# ========== Skenario ==========
+# Setiap skenario membangun simulasi ber-seed dengan `count` entitas dari RNG simulasi itu.
+
+def smart_vehicles(count, seed, engine, network=None):
+    sim = nt.SmartCitySim(engine=engine, seed=seed, network=network)
+    sim.spawn_auto = False
+    rng = np.random.default_rng(seed)
+    # Disebar rata di semua lajur; diurutkan per (lajur, x) agar add() menyisip di ujung array
+    lanes = rng.choice(sim.network.lane_ys, size=count)
+    xs = rng.uniform(-150, sim.network.x_max + 150, size=count)
+    kinds = np.where(rng.random(count) < 0.5, "car", "bus")
+    order = np.lexsort((xs, lanes))
+    for i in order.tolist():
+        kind, x, y = str(kinds[i]), float(xs[i]), int(lanes[i])
+        speed = sim.rng.uniform(1.5, 3.0) if kind == "car" else sim.rng.uniform(1.2, 2.0)
+        if sim.traffic is not None:
+            sim.traffic.add(kind, x, y, speed, sim.rng.randrange(len(nt.Vehicle.CAR_COLORS)))
+        else:
+            v = nt.Vehicle(kind=kind, x=x, y=y, speed=speed, particles=sim.particles, rng=sim.rng)
+            sim.vehicles.append(v)
+            sim.lanes.add(v)
+        sim.stats.vehicle_added(kind)
+    return sim
+
+def smart_trees(count, seed):
+    sim = nt.SmartCitySim(seed=seed)
+    sim.spawn_auto = False
+    for _ in range(count):
+        t = nt.Tree(sim.rng.randint(50, nt.WIDTH - 50), sim.road_y - 60,
+                    stage=sim.rng.choice([1, 2]), particles=sim.particles, rng=sim.rng,
+                    scheduler=sim.scheduler)
+        sim.place_tree(t)
+    return sim
+
+def green_people(count, seed):
+    sim = nt.GreenCitySim(seed=seed)
+    rng = sim.rng
+    sim.pedestrians = [nt.Pedestrian(rng.randint(0, nt.WIDTH), nt.HEIGHT - 170 + rng.randint(-10, 10), rng)
+                       for _ in range(count // 2)]
+    sim.cyclists = [nt.Cyclist(rng.randint(0, nt.WIDTH), nt.HEIGHT - 200 + rng.randint(-8, 8), rng)
+                    for _ in range(count - count // 2)]
+    return sim
+
+class ParticleLoad:
+    """PlantingSim dengan `count` partikel hidup yang diisi ulang setiap tick"""
+    def __init__(self, count, seed):
+        self.sim = nt.PlantingSim(seed=seed)
+        self.count = count
+        self.sim.particles = nt.ParticleSystem(capacity=count, seed=seed)
+        self.rng = np.random.default_rng(seed + 1)
+        self.top_up()
+
+    def top_up(self):
+        missing = self.count - len(self.sim.particles)
+        if missing > 0:
+            self.sim.particles.emit_many(self.rng.uniform(0, nt.WIDTH, missing),
+                                         self.rng.uniform(100, nt.HEIGHT - 100, missing),
+                                         (120, 200, 120), vx=(-1, 1), vy=(-2, 0))
+
+    def update(self):
+        self.top_up()
+        self.sim.update()
+
+    def draw(self, surf):
+        self.sim.draw(surf)
+
+class ForestLoad:
+    """PlantingSim mode hutan dengan `count` petak yang semuanya ditanam; setiap tick
+    satu pita baris disiram, sehingga seluruh hutan tersiram kira-kira sekali per detik.
+    Jam dimulai di LONG_RUN_TICK agar draw setelah sesi panjang ikut teruji."""
+    LONG_RUN_TICK = 1 << 20
+
+    def __init__(self, count, seed):
+        cols = min(count, 1000)
+        self.sim = nt.PlantingSim(seed=seed, forest=(max(1, count // cols), cols))
+        self.sim.scheduler.reset(self.LONG_RUN_TICK)
+        self.forest = self.sim.forest
+        self.forest.plant()
+        self.band = max(1, self.forest.rows // nt.SIM_HZ)
+        self.row = 0
+
+    def update(self):
+        self.forest.water((self.row, 0, self.row + self.band, self.forest.cols))
+        self.row = (self.row + self.band) % self.forest.rows
+        self.sim.update()
+
+    def draw(self, surf):
+        self.sim.draw(surf)
+
+SCENARIOS = {
+    "smart.vehicles.objects": lambda n, seed: smart_vehicles(n, seed, "objects"),
+    "smart.vehicles.numpy": lambda n, seed: smart_vehicles(n, seed, "numpy"),
+    # Grid kota 20 x 20 persimpangan = 400 lampu
+    "smart.grid.numpy": lambda n, seed: smart_vehicles(n, seed, "numpy",
+                                                       nt.RoadNetwork.grid(20, 20, green_wave=20)),
+    "smart.trees": smart_trees,
+    "green.people": green_people,
+    "plant.particles": ParticleLoad,
+    "plant.forest": ForestLoad,
+}
+
+# ========== Pengukuran ==========
+
+# Dijalankan di proses baru: waktu tiap fase sejak interpreter mulai sampai frame menu pertama
+STARTUP_CODE = """
+import json, time
+t0 = time.perf_counter()
+import NeoTerra as nt
+t1 = time.perf_counter()
+nt.init_display()
+t2 = time.perf_counter()
+app = nt.App()
+t3 = time.perf_counter()
+app.draw()
+t4 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "display": t2 - t1, "app": t3 - t2, "first_frame": t4 - t3}))
+"""
+
+def measure_startup(runs):
+    """Median (ms) dari waktu total start dan tiap fasenya, masing-masing di proses baru"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", STARTUP_CODE], cwd=here, env=dict(os.environ),
+                             capture_output=True, text=True, check=True).stdout
+        total = time.perf_counter() - start
+        phases = json.loads(out.strip().splitlines()[-1])
+        phases["total"] = total
+        samples.append(phases)
+    return {name: 1000.0 * float(np.median([s[name] for s in samples])) for name in samples[0]}
+
+def measure(step, min_time, max_iters, warmup=2, min_iters=3):
+    """Panggil step() berulang; kembalikan (iterasi/detik, iterasi)"""
+    for _ in range(warmup):
+        step()
+    iters = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while iters < min_iters or (elapsed < min_time and iters < max_iters):
+        step()
+        iters += 1
+        elapsed = time.perf_counter() - start
+    return iters / elapsed, iters
+
+def run(scenarios, counts, seed, min_time, max_iters, modes):
+    surface = pygame.Surface((nt.WIDTH, nt.HEIGHT))
+    results = []
+    for name in scenarios:
+        for count in counts:
+            for mode in modes:
+                sim = SCENARIOS[name](count, seed)
+                if mode == "update":
+                    step = sim.update
+                else:
+                    def step(sim=sim):
+                        sim.update()
+                        sim.draw(surface)
+                rate, iters = measure(step, min_time, max_iters)
+                row = {"scenario": name, "count": count, "mode": mode,
+                       "rate": rate, "ms": 1000.0 / rate, "iters": iters}
+                results.append(row)
+                unit = "tick/s" if mode == "update" else "fps"
+                print(f"{name:<24} {count:>7} {mode:<6} {rate:12.1f} {unit:<6} ({row['ms']:.3f} ms)", flush=True)
+    return results
+
+def compare(results, baseline, threshold):
+    """Bandingkan dengan baseline; kembalikan daftar regresi (lebih lambat > threshold)"""
+    base = {(r["scenario"], r["count"], r["mode"]): r["rate"] for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = base.get((r["scenario"], r["count"], r["mode"]))
+        if old is None:
+            continue
+        change = r["rate"] / old - 1.0
+        flag = "REGRESI" if change < -threshold else ""
+        print(f"{r['scenario']:<24} {r['count']:>7} {r['mode']:<6} {old:12.1f} -> {r['rate']:12.1f} {change:+7.1%} {flag}")
+        if flag:
+            regressions.append(dict(r, baseline_rate=old, change=change))
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark simulasi NeoTerra")
+    parser.add_argument("--scenarios", nargs="*", choices=sorted(SCENARIOS), default=sorted(SCENARIOS),
+                        help="skenario yang diukur; kosong = hanya waktu start")
+    parser.add_argument("--counts", nargs="+", type=int, default=COUNTS,
+                        help="jumlah entitas per skenario (default: 10 100 1000 10000 100000)")
+    parser.add_argument("--modes", nargs="+", choices=["update", "frame"], default=["update", "frame"],
+                        help="update = ticks/detik tanpa render, frame = update + draw")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--min-time", type=float, default=0.5,
+                        help="lama pengukuran minimum per kasus dalam detik (default: 0.5)")
+    parser.add_argument("--max-iters", type=int, default=2000)
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="file hasil sebelumnya untuk dibandingkan")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="batas perlambatan relatif sebelum dianggap regresi (default: 0.25)")
+    parser.add_argument("--startup-runs", type=int, default=3,
+                        help="jumlah proses baru untuk mengukur waktu start, 0 = lewati (default: 3)")
+    parser.add_argument("--startup-budget", type=float, metavar="MS",
+                        help="gagal (kode 1) jika median waktu start sampai menu melebihi MS milidetik")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    nt.init_display()
+    # Yang diukur adalah render ke surface, bukan pengiriman ke display
+    nt.DIRTY.enabled = False
+
+    startup = None
+    if args.startup_runs > 0:
+        startup = measure_startup(args.startup_runs)
+        print("start (ms): " + "  ".join(f"{name} {ms:.1f}" for name, ms in startup.items()), flush=True)
+
+    results = run(args.scenarios, args.counts, args.seed, args.min_time, args.max_iters, args.modes)
+    report = {
+        "meta": {"seed": args.seed, "python": platform.python_version(), "pygame": pygame.version.ver,
+                 "numpy": np.__version__, "platform": platform.platform(), "min_time": args.min_time},
+        "startup": startup,
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"hasil ditulis ke {args.out}")
+
+    # Semua pemeriksaan dijalankan dulu agar satu run melaporkan setiap kegagalan
+    failed = False
+    if args.startup_budget is not None:
+        if startup is None:
+            raise SystemExit("--startup-budget butuh --startup-runs > 0")
+        if startup["total"] > args.startup_budget:
+            print(f"waktu start {startup['total']:.1f} ms melewati budget {args.startup_budget:.0f} ms")
+            failed = True
+        else:
+            print(f"waktu start {startup['total']:.1f} ms dalam budget {args.startup_budget:.0f} ms")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regresi melewati ambang {args.threshold:.0%}")
+            failed = True
+        else:
+            print("tidak ada regresi")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
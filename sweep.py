@@ -0,0 +1,134 @@
+"""Sweep parameter SmartCitySim: setiap kombinasi grid dijalankan headless di
+process pool (default satu proses per core) dengan seed sendiri, lalu
+air_score, kemacetan dan throughput kondisi tunak dikumpulkan ke satu tabel CSV.
+
+Contoh:
+    python sweep.py --spawn-interval 30 50 80 --car-ratio 0.3 0.7 --trees 0 10 20 --out sweep.csv
+    python sweep.py --grid grid.json --replicates 5 --workers 8
+
+File --grid berisi objek JSON {parameter: daftar nilai}, misalnya
+{"spawn_interval": [30, 50], "green": [3, 5, 8]}, yang menimpa opsi baris perintah.
+Setiap baris CSV menyimpan seed-nya, sehingga satu konfigurasi bisa diulang persis.
+"""
+import os
+import csv
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import NeoTerra as nt
+
+# Urutan kolom parameter di CSV; nilai default = nilai bawaan SmartCitySim/TrafficLight
+PARAMS = {
+    "spawn_interval": [50],     # tick antar kendaraan baru
+    "car_ratio": [0.5],         # peluang kendaraan baru berupa mobil (sisanya bus)
+    "trees": [0],               # jumlah pohon awal
+    "tree_stage": [None],       # tahap pohon awal; None = acak 1/2 seperti tombol Tambah Pohon
+    "max_congestion": [18],     # jumlah kendaraan saat kemacetan = 100%
+    "green": [5.0],             # durasi lampu (detik simulasi)
+    "yellow": [2.0],
+    "red": [5.0],
+}
+METRICS = ("air_score", "air_score_min", "congestion", "congestion_max", "throughput", "vehicles")
+
+def build_sim(config, seed, engine):
+    sim = nt.SmartCitySim(engine=engine, seed=seed)
+    sim.spawn_interval = config["spawn_interval"]
+    sim.car_ratio = config["car_ratio"]
+    sim.max_congestion = config["max_congestion"]
+    for light in sim.network.lights:
+        light.set_durations({state: int(config[state.lower()] * nt.SIM_HZ)
+                             for state in ("GREEN", "YELLOW", "RED")})
+    for _ in range(config["trees"]):
+        sim.add_tree(stage=config["tree_stage"])
+    return sim
+
+def run_config(job):
+    """Jalankan satu konfigurasi (dipanggil di proses pekerja); kembalikan satu baris tabel"""
+    config, seed, engine, warmup, ticks = job
+    sim = build_sim(config, seed, engine)
+    for _ in range(warmup):
+        sim.update()
+
+    stats = sim.stats
+    exited_start = stats.exited
+    air_sum = congestion_sum = 0.0
+    air_min, congestion_max = 1.0, 0.0
+    for _ in range(ticks):
+        sim.update()
+        air, congestion = stats.air_score, stats.congestion
+        air_sum += air
+        congestion_sum += congestion
+        air_min = min(air_min, air)
+        congestion_max = max(congestion_max, congestion)
+
+    row = dict(config, seed=seed)
+    row.update(air_score=air_sum / ticks, air_score_min=air_min,
+               congestion=congestion_sum / ticks, congestion_max=congestion_max,
+               # Kendaraan yang keluar di ujung kanan jalan per menit waktu simulasi
+               throughput=(stats.exited - exited_start) * 60.0 * nt.SIM_HZ / ticks,
+               vehicles=stats.total)
+    return row
+
+def make_jobs(grid, replicates, base_seed, engine, warmup, ticks):
+    names = list(PARAMS)
+    jobs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        config = dict(zip(names, values))
+        for _ in range(replicates):
+            jobs.append((config, base_seed + len(jobs), engine, warmup, ticks))
+    return jobs
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep parameter SmartCitySim di process pool")
+    for name, default in PARAMS.items():
+        kind = int if name in ("spawn_interval", "trees", "tree_stage", "max_congestion") else float
+        parser.add_argument("--" + name.replace("_", "-"), dest=name, nargs="+", type=kind, default=default)
+    parser.add_argument("--grid", help="file JSON {parameter: daftar nilai} yang menimpa opsi di atas")
+    parser.add_argument("--replicates", type=int, default=1,
+                        help="jumlah seed berbeda per konfigurasi (default: 1)")
+    parser.add_argument("--seed", type=int, default=1234, help="seed pertama; job ke-i memakai seed + i")
+    parser.add_argument("--engine", choices=["objects", "numpy"], default="numpy")
+    parser.add_argument("--warmup", type=int, default=30 * nt.SIM_HZ,
+                        help="tick sebelum pengukuran dimulai (default: 30 detik simulasi)")
+    parser.add_argument("--ticks", type=int, default=120 * nt.SIM_HZ,
+                        help="tick yang diukur per konfigurasi (default: 120 detik simulasi)")
+    parser.add_argument("--workers", type=int, default=None, help="jumlah proses (default: jumlah core)")
+    parser.add_argument("--out", default="sweep_results.csv")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    grid = {name: getattr(args, name) for name in PARAMS}
+    if args.grid:
+        with open(args.grid) as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(PARAMS)
+        if unknown:
+            raise SystemExit(f"parameter tidak dikenal di {args.grid}: {', '.join(sorted(unknown))}")
+        grid.update(overrides)
+
+    jobs = make_jobs(grid, args.replicates, args.seed, args.engine, args.warmup, args.ticks)
+    workers = args.workers or os.cpu_count() or 1
+    # Job dikirim per potongan agar overhead antar-proses kecil untuk grid besar
+    chunksize = max(1, min(64, len(jobs) // (workers * 4)))
+    print(f"{len(jobs)} konfigurasi, {workers} proses", flush=True)
+
+    start = time.perf_counter()
+    with open(args.out, "w", newline="") as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.DictWriter(f, fieldnames=list(PARAMS) + ["seed"] + list(METRICS))
+        writer.writeheader()
+        # map() menjaga urutan job, jadi CSV sama untuk jumlah proses berapa pun
+        for done, row in enumerate(pool.map(run_config, jobs, chunksize=chunksize), 1):
+            writer.writerow(row)
+            if done % 100 == 0 or done == len(jobs):
+                print(f"{done}/{len(jobs)} ({time.perf_counter() - start:.1f} s)", flush=True)
+    print(f"hasil ditulis ke {args.out}")
+
+if __name__ == "__main__":
+    main()